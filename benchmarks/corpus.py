@@ -0,0 +1,87 @@
+"""Synthetic chat corpora for the benchmarks.
+
+    python benchmarks/corpus.py --messages 100000 --users 500 --channels 20 \
+        --toxic 0.08 --sarcastic 0.10 --crisis 0.002 --out /tmp/chat.jsonl
+
+Rows have the run.py input schema (timestamp, user_id, channel, text) and are
+written as CSV or NDJSON depending on the --out suffix. User activity is
+Zipf-skewed so a few users post most messages, like real servers.
+"""
+import argparse, csv, datetime as dt, json, random
+from pathlib import Path
+from typing import Dict, Iterator
+
+CLEAN = [
+    "meeting at {h}pm ok?", "anyone has notes for lecture {n}?", "the lab is open till {h}",
+    "thanks for the help with the assignment", "see you at the mess", "good luck for the quiz tomorrow",
+    "who is up for football at {h}?", "can someone share the slides from week {n}",
+]
+TOXIC = [
+    "you are an idiot", "shut up, nobody asked you", "you are worthless and stupid",
+    "get lost loser", "i will find you and hurt you", "what a pathetic excuse for a human",
+]
+SARCASTIC = [
+    "lol great job team, totally not a disaster", "oh wow, another 8am lab, just what i needed",
+    "sure, because that worked so well last time", "amazing, the wifi died again, love it",
+]
+CRISIS = [
+    "i can't go on anymore", "i want to end my life", "i'm done, nothing matters",
+]
+NOISE = ["", "!", "!!", " 🙃", " 😂", " lol", " fr", " ...", " @everyone"]
+
+
+def generate(n: int, users: int = 200, channels: int = 10, toxic: float = 0.05,
+             sarcastic: float = 0.08, crisis: float = 0.001, seed: int = 0) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    user_w = [1.0 / (i + 1) for i in range(users)]  # Zipf(1)
+    t = dt.datetime(2025, 9, 1, 8, 0, 0)
+    for i in range(n):
+        t += dt.timedelta(seconds=rng.expovariate(1 / 4.0))
+        r = rng.random()
+        if r < crisis:
+            pool = CRISIS
+        elif r < crisis + toxic:
+            pool = TOXIC
+        elif r < crisis + toxic + sarcastic:
+            pool = SARCASTIC
+        else:
+            pool = CLEAN
+        text = rng.choice(pool).format(h=rng.randint(1, 12), n=rng.randint(1, 14)) + rng.choice(NOISE)
+        yield {
+            "timestamp": t.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "user_id": f"u_{rng.choices(range(users), weights=user_w)[0]}",
+            "channel": f"ch_{rng.randrange(channels)}",
+            "text": text,
+        }
+
+
+def write(rows, out: Path):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        if out.suffix.lower() == ".csv":
+            w = csv.DictWriter(f, fieldnames=["timestamp", "user_id", "channel", "text"])
+            w.writeheader()
+            w.writerows(rows)
+        else:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=10000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--channels", type=int, default=10)
+    ap.add_argument("--toxic", type=float, default=0.05)
+    ap.add_argument("--sarcastic", type=float, default=0.08)
+    ap.add_argument("--crisis", type=float, default=0.001)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True, help=".csv or .jsonl")
+    args = ap.parse_args()
+    write(generate(args.messages, args.users, args.channels, args.toxic, args.sarcastic,
+                   args.crisis, args.seed), Path(args.out))
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
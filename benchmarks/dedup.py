@@ -0,0 +1,120 @@
+"""Spam-wave dedup (app.dedup): inference skipped vs. false merges on synthetic raids.
+
+    python benchmarks/dedup.py --messages 20000 --raid 0.3 --thresholds 0.5,0.6,0.7,0.8
+
+Normal chat comes from corpus.py's templates plus free-form sentences over a
+small shared vocabulary; raids post mutated variants of a few toxic lines (emoji, repeated letters, mentions, an extra word). Every
+message carries its source template, and the pipeline is a stub whose action
+depends only on that template. A false merge is a follower whose template
+differs from its cluster representative's; an action mismatch is one that
+would have changed the decision. The stub also counts how often "inference"
+ran.
+"""
+import argparse, json, random, sys, time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "peersupport"))
+import corpus  # noqa: E402
+from app.dedup import SpamWaves  # noqa: E402
+
+EMOJI = ["😂", "🤡", "💀", "🔥", "<:pepe:123456789012345678>", "!!!", "??"]
+FILLER = ["lol", "bro", "fr", "literally", "honestly", "ngl"]
+WORDS = ("i you we the a is are was not so very what who when lab exam class notes today tomorrow "
+         "good bad late early help need want going come see meet quiz mess hostel wifi bus food "
+         "assignment deadline prof ok yes no maybe please thanks sorry").split()
+
+
+def _mutate(rng, text):
+    words = text.split()
+    for _ in range(rng.randint(1, 3)):
+        r = rng.random()
+        if r < 0.3:
+            words.append(rng.choice(EMOJI))
+        elif r < 0.5:
+            words.insert(0, f"<@{rng.randint(10**17, 10**18)}>")
+        elif r < 0.75:
+            i = rng.randrange(len(words))
+            words[i] = words[i] + words[i][-1] * rng.randint(2, 5)
+        else:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(FILLER))
+    return " ".join(words)
+
+
+def stream(n, raid, guilds, unique=0.2, seed=0):
+    rng = random.Random(seed)
+    pools = [("clean", corpus.CLEAN), ("toxic", corpus.TOXIC), ("sarcastic", corpus.SARCASTIC)]
+    t = 0.0
+    for _ in range(n):
+        t += rng.expovariate(20)
+        guild = f"g{rng.randrange(guilds)}"
+        if rng.random() < raid:
+            i = rng.randrange(len(corpus.TOXIC))
+            yield t, guild, ("toxic", i), _mutate(rng, corpus.TOXIC[i])
+        elif rng.random() < unique:  # free-form chat over a small vocabulary: the hard case for false merges
+            yield t, guild, ("unique", t), " ".join(rng.choices(WORDS, k=rng.randint(3, 10)))
+        else:
+            kind, pool = rng.choice(pools)
+            i = rng.randrange(len(pool))
+            text = pool[i].format(h=rng.randint(1, 12), n=rng.randint(1, 14)) + rng.choice(corpus.NOISE)
+            yield t, guild, (kind, i), text
+
+
+def _action(template):
+    kind, _ = template
+    return "serious" if kind == "toxic" else "none"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--raid", type=float, default=0.3, help="fraction of raid messages")
+    ap.add_argument("--unique", type=float, default=0.2, help="fraction of non-raid messages that are free-form")
+    ap.add_argument("--guilds", type=int, default=5)
+    ap.add_argument("--thresholds", default="0.5,0.6,0.7,0.8")
+    ap.add_argument("--window", type=float, default=600)
+    ap.add_argument("--max-clusters", type=int, default=10000)
+    args = ap.parse_args()
+
+    msgs = list(stream(args.messages, args.raid, args.guilds, args.unique))
+    rows = []
+    for th in map(float, args.thresholds.split(",")):
+        now = [0.0]
+        waves = SpamWaves(threshold=th, window_s=args.window, max_clusters=args.max_clusters,
+                          audit_rate=0.0, clock=lambda: now[0])
+        reps, calls, false_merge, mismatch = {}, [0], 0, 0
+        peak = 0
+        t0 = time.perf_counter()
+        for ts, guild, template, text in msgs:
+            now[0] = ts
+
+            def fn(state, template=template):
+                calls[0] += 1
+                return {**state, "sarcasm": 0.0, "tox_max": 0.0, "seriousness": 0.0,
+                        "action": _action(template), "reply": "", "template": template}
+            new_before = waves.counts["new"]
+            res = waves.run(guild, {"text": text}, fn)
+            if "dup_of" in res:
+                rep = reps[res["dup_of"]]
+                false_merge += rep != template
+                mismatch += _action(rep) != _action(template)
+            elif waves.counts["new"] > new_before:  # a new cluster is the most recent one
+                reps[next(reversed(waves._clusters))] = template
+            peak = max(peak, len(waves))
+        secs = time.perf_counter() - t0
+        st = waves.stats()
+        followers = st["hit"]
+        rows.append({
+            "threshold": th, "inference_calls": calls[0], "inference_skipped": 1 - calls[0] / len(msgs),
+            "followers": followers, "false_merges": false_merge,
+            "false_merge_rate": false_merge / followers if followers else 0.0,
+            "action_mismatch_rate": mismatch / followers if followers else 0.0,
+            "bypass_short": st["bypass"], "peak_clusters": peak, "evicted": st["evicted"],
+            "us_per_msg": secs / len(msgs) * 1e6,
+        })
+    print(json.dumps({"benchmark": "dedup", "config": vars(args), "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
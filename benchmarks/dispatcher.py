@@ -0,0 +1,91 @@
+"""Raid simulation: inline awaits (old on_message) vs. app.dispatcher.ActionDispatcher.
+
+Both run against benchmarks/fake_discord.FakeDiscord, so no network or token
+is needed:
+
+    python benchmarks/dispatcher.py --messages 300 --channels 3 --users 40 --crisis 0.05
+
+Reports makespan, HTTP calls, 429s, and how long crisis DMs waited.
+"""
+import argparse, asyncio, json, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "peersupport"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from app.dispatcher import ActionDispatcher, PRIORITY_CRISIS, PRIORITY_DM, TransientError  # noqa: E402
+from fake_discord import FakeChannel, FakeDiscord, FakeMessage, FakeUser  # noqa: E402
+
+
+def _raid(n, channels, users, crisis, seed=0):
+    rng = random.Random(seed)
+    chans = [FakeChannel(1000 + i) for i in range(channels)]
+    people = [FakeUser(2000 + i) for i in range(users)]
+    return [(FakeMessage(i, rng.choice(chans), rng.choice(people)), rng.random() < crisis) for i in range(n)]
+
+
+async def _retrying(call):
+    while True:  # what discord.py does for us inline: sleep through the 429
+        try:
+            return await call()
+        except TransientError as e:
+            await asyncio.sleep(e.retry_after or 0.5)
+
+
+async def run_inline(raid, **fake_kw):
+    api = FakeDiscord(**fake_kw)
+    t0 = time.monotonic()
+    crisis_done = []
+    for msg, is_crisis in raid:
+        await _retrying(lambda: api.redact(msg.channel, [msg]))
+        await _retrying(lambda: api.send_dm(msg.author, "reply"))
+        if is_crisis:
+            crisis_done.append(time.monotonic() - t0)
+    return api, time.monotonic() - t0, crisis_done
+
+
+async def run_dispatcher(raid, **fake_kw):
+    api = FakeDiscord(**fake_kw)
+    disp = ActionDispatcher(api, max_inflight=8)
+    t0 = time.monotonic()
+    crisis_done, futs = [], []
+    for msg, is_crisis in raid:
+        futs.append(disp.redact(msg))
+        f = disp.dm(msg.author, "reply", priority=PRIORITY_CRISIS if is_crisis else PRIORITY_DM)
+        if is_crisis:
+            f.add_done_callback(lambda _f: crisis_done.append(time.monotonic() - t0))
+        futs.append(f)
+    ok = await asyncio.gather(*futs)
+    return api, time.monotonic() - t0, crisis_done, all(ok)
+
+
+def _summary(api, elapsed, crisis_done):
+    return {
+        "makespan_s": elapsed,
+        "http_calls": len(api.calls),
+        "rate_limited_429": api.rate_limited,
+        "crisis_dm_max_s": max(crisis_done) if crisis_done else None,
+        "crisis_dm_mean_s": sum(crisis_done) / len(crisis_done) if crisis_done else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--channels", type=int, default=3)
+    ap.add_argument("--users", type=int, default=30)
+    ap.add_argument("--crisis", type=float, default=0.05)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--skip-inline", action="store_true", help="inline baseline can take minutes")
+    args = ap.parse_args()
+
+    raid = _raid(args.messages, args.channels, args.users, args.crisis)
+    out = {"benchmark": "dispatcher", "config": vars(args)}
+    api, elapsed, crisis, ok = asyncio.run(run_dispatcher(raid, latency=args.latency))
+    out["dispatcher"] = {**_summary(api, elapsed, crisis), "all_succeeded": ok}
+    if not args.skip_inline:
+        out["inline"] = _summary(*asyncio.run(run_inline(raid, latency=args.latency)))
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
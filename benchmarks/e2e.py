@@ -0,0 +1,197 @@
+"""End-to-end moderation benchmark (offline, tiny stand-in models).
+
+Stages, each reported in one JSON document:
+  run_py   - moderation-agent run.py scoring loop (--batch-size): msgs/sec, per-message p50/p95/p99, digest time
+  db       - run.py SQLite write rate (messages + predictions + decisions rows, one transaction per batch)
+  graph    - peersupport pipeline latency via app_graph.invoke and the direct fast path
+  reports  - archivist channel/user report generation over a large incidents table
+
+    python benchmarks/e2e.py --messages 2000 --incidents 200000 --out results.json
+    python benchmarks/e2e.py --stages reports         # needs only sqlalchemy
+
+Everything (models, DBs, outputs) lives in a temp dir; nothing touches the
+network. LLM replies are replaced by their templated fallbacks.
+"""
+import argparse, json, os, platform, random, sqlite3, sys, tempfile, time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent / "moderation-agent" / "agent"
+PEER_DIR = BENCH_DIR.parent / "peersupport"
+sys.path.insert(0, str(BENCH_DIR))
+
+import corpus  # noqa: E402
+
+
+def pct(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q / 100 * (len(s) - 1))))]
+
+
+def latency_summary(ms):
+    return {"p50_ms": pct(ms, 50), "p95_ms": pct(ms, 95), "p99_ms": pct(ms, 99), "max_ms": max(ms) if ms else None}
+
+
+def _agent_modules():
+    if str(AGENT_DIR) not in sys.path:
+        sys.path.insert(0, str(AGENT_DIR))
+    import run
+    return run
+
+
+def bench_run_py(messages, paths, work: Path, batch_size: int = 1, lazy_sarcasm: bool = False):
+    run = _agent_modules()
+    import toxicity_infer, sarcasm_infer
+    toxicity_infer.ADAPTER_DIR, toxicity_infer.BASE_DIR = paths["toxic_lora"], paths["toxic_base"]
+    sarcasm_infer.SARC_DIR = paths["sarcasm"]
+    run.OUT_DIR = work / "outputs"; run.OUT_DIR.mkdir(exist_ok=True)
+
+    t0 = time.perf_counter()
+    tox, sar = run.ToxicModel(), run.SarcasmModel()
+    load_s = time.perf_counter() - t0
+    run.warm_up(tox, sar)
+
+    conn = sqlite3.connect(work / "moderation.db")
+    run.db_init(conn)
+    lat = []  # per message, amortised over its batch
+    t0 = time.perf_counter()
+    digest = run.score_messages(messages, tox, sar, conn, verbose=False, batch_size=batch_size,
+                                lazy_sarcasm=lazy_sarcasm, on_batch=lambda n, secs: lat.extend([secs * 1000 / n] * n))
+    elapsed = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    run.write_digest(digest)
+    digest_s = time.perf_counter() - t1
+    conn.close()
+    return {"messages": len(messages), "batch_size": batch_size, "lazy_sarcasm": lazy_sarcasm,
+            "sarcasm_skipped_fraction": 1 - digest.sarcasm_run / max(1, digest.total),
+            "load_s": load_s, "elapsed_s": elapsed,
+            "msgs_per_s": len(messages) / elapsed, "digest_s": digest_s,
+            **latency_summary(lat)}
+
+
+def bench_db(n, work: Path, batch_size: int = 256):
+    run = _agent_modules()
+    conn = sqlite3.connect(work / "db_writes.db")
+    run.db_init(conn)
+    probs = {k: random.random() for k in ("toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate")}
+    msg = {"timestamp": "2025-09-01T00:00:00Z", "user_id": "u_1", "channel": "ch_0", "text": "benchmark row"}
+    t0 = time.perf_counter()
+    for lo in range(0, n, batch_size):
+        k = min(batch_size, n - lo)
+        run.db_insert_batch(conn, run.to_batch([msg] * k), [probs] * k, [0.3] * k, [0.4] * k, [0.1] * k,
+                            [["log_only"]] * k, [msg["text"]] * k)
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return {"messages": n, "batch_size": batch_size, "elapsed_s": elapsed, "msgs_per_s": n / elapsed}
+
+
+def _peer_modules(paths):
+    if paths:
+        os.environ["SARCASM_MODEL_PATH"] = str(paths["sarcasm"])
+        os.environ["TOXICITY_BASE_MODEL"] = str(paths["toxic_base"])
+        os.environ["TOXICITY_ADAPTER_PATH"] = str(paths["toxic_lora"])
+    os.environ["OPENAI_API_KEY"] = ""
+    if str(PEER_DIR) not in sys.path:
+        sys.path.insert(0, str(PEER_DIR))
+
+
+def bench_graph(messages, paths):
+    _peer_modules(paths)
+    from app import graph_pipeline as gp, models
+    gp.craft_serious_reply = lambda *a, **k: "Please stop — this violates our community guidelines."
+    gp.craft_crisis_reply = lambda *a, **k: "You matter, and help is available right now."
+    models.load_all(); models.warm_up()
+    out = {}
+    for mode, fn in (("graph", gp.run_graph), ("fast", gp.run_fast)):
+        gp.NODE_STATS.clear()
+        lat = []
+        t0 = time.perf_counter()
+        for m in messages:
+            t = time.perf_counter()
+            fn({"text": m["text"], "user_id": m["user_id"], "channel_id": m["channel"], "sarcasm": 0.0,
+                "tox_max": 0.0, "seriousness": 0.0, "action": "none", "reply": ""})
+            lat.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - t0
+        out[mode] = {"msgs_per_s": len(messages) / elapsed, **latency_summary(lat), "nodes": gp.node_timings()}
+    out["sarcasm"] = models.sarcasm_stats()  # both modes together; SARCASM_LAZY=0 for the eager baseline
+    return out
+
+
+def bench_reports(n_incidents, channels, users):
+    _peer_modules(None)
+    import datetime as dt
+    from sqlalchemy import insert
+    from app.db import init_db, SessionLocal, Incident
+    from app.archivist import generate_report_for_channel, generate_user_report
+    from app.policy import anon_user_id
+    init_db()
+    rng = random.Random(0)
+    start = dt.datetime(2025, 1, 1)
+    t0 = time.perf_counter()
+    with SessionLocal() as s:
+        for lo in range(0, n_incidents, 10000):
+            s.execute(insert(Incident), [{
+                "platform": "discord", "channel_id": f"ch_{rng.randrange(channels)}",
+                "user_id_hash": anon_user_id(f"u_{rng.randrange(users)}"), "message_id": str(i),
+                "text_excerpt": "x" * 240, "sarcasm": rng.random(), "tox_max": rng.random(),
+                "seriousness": rng.random(), "action": rng.choice(["serious", "crisis"]), "reply": "y" * 120,
+                "created_at": start + dt.timedelta(seconds=30 * i),
+            } for i in range(lo, min(n_incidents, lo + 10000))])
+        s.commit()
+    load_s = time.perf_counter() - t0
+    t0 = time.perf_counter(); generate_report_for_channel("ch_0"); channel_s = time.perf_counter() - t0
+    t0 = time.perf_counter(); generate_user_report(anon_user_id("u_0")); user_s = time.perf_counter() - t0
+    return {"incidents": n_incidents, "insert_s": load_s, "channel_report_s": channel_s, "user_report_s": user_s}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--channels", type=int, default=10)
+    ap.add_argument("--toxic", type=float, default=0.05)
+    ap.add_argument("--incidents", type=int, default=100000)
+    ap.add_argument("--db-rows", type=int, default=5000)
+    ap.add_argument("--batch-size", type=int, default=1, help="run_py: >1 uses the pipelined tokenizer")
+    ap.add_argument("--lazy-sarcasm", action="store_true", help="run_py: sarcasm model only where it can matter")
+    ap.add_argument("--stages", default="run_py,db,graph,reports")
+    ap.add_argument("--out", help="also write the JSON results here")
+    args = ap.parse_args()
+    stages = set(args.stages.split(","))
+    out_path = Path(args.out).resolve() if args.out else None
+
+    work = Path(tempfile.mkdtemp(prefix="modbench-"))
+    os.chdir(work)  # archivist writes to ./outputs
+    os.environ["DATABASE_URL"] = f"sqlite:///{work / 'peersupport.db'}"
+    os.environ["WEIGHTS_CACHE"] = str(work / "weights_cache")
+
+    messages = list(corpus.generate(args.messages, args.users, args.channels, toxic=args.toxic))
+    paths = None
+    if stages & {"run_py", "graph"}:
+        from fixtures import build_tiny_models
+        paths = build_tiny_models(work / "models")
+
+    results = {}
+    if "run_py" in stages: results["run_py"] = bench_run_py(messages, paths, work, args.batch_size, args.lazy_sarcasm)
+    if "db" in stages: results["db"] = bench_db(args.db_rows, work, max(args.batch_size, 256))
+    if "graph" in stages: results["graph"] = bench_graph(messages, paths)
+    if "reports" in stages: results["reports"] = bench_reports(args.incidents, args.channels, args.users)
+
+    doc = {
+        "benchmark": "e2e",
+        "env": {"python": platform.python_version(), "machine": platform.machine(),
+                "torch": sys.modules["torch"].__version__ if "torch" in sys.modules else None},
+        "config": vars(args),
+        "workdir": str(work),
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2)
+    print(text)
+    if out_path:
+        out_path.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""In-process stand-in for Discord's HTTP API, for dispatcher tests and benchmarks.
+
+Emulates what matters for outbound pacing: per-route buckets (deletes and
+sends per channel, DMs per user) plus a global limit, a fixed round-trip
+latency, 429s with retry_after when a bucket is exhausted, remaining/reset
+hints on success, and the 100-message bulk-delete cap. It implements the
+transport interface of app.dispatcher (redact / send_dm / send_channel) and
+records every call. It replaces DiscordTransport, so the real transport's
+error translation, 429 hints and bulk-delete rules are covered separately by
+peersupport/tests/test_dispatcher.py against discord.py's exceptions.
+"""
+import asyncio, time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from app.dispatcher import PermanentError, RateLimit, TransientError
+
+
+@dataclass(eq=False)
+class FakeChannel:
+    id: int
+
+
+@dataclass(eq=False)
+class FakeUser:
+    id: int
+    dm_blocked: bool = False
+
+
+@dataclass(eq=False)
+class FakeMessage:
+    id: int
+    channel: FakeChannel
+    author: FakeUser
+    content: str = ""
+
+
+@dataclass
+class _Window:
+    limit: int
+    per: float
+    used: int = 0
+    reset_at: float = 0.0
+
+
+class FakeDiscord:
+    def __init__(self, latency: float = 0.05, route_limit: Tuple[int, float] = (5, 5.0),
+                 global_limit: Tuple[int, float] = (50, 1.0)):
+        self.latency = latency
+        self.route_limit = route_limit
+        self._global = _Window(*global_limit)
+        self._routes: Dict[Tuple[str, int], _Window] = {}
+        self.calls: List[Tuple[float, str, int, int]] = []  # (t, kind, route id, items)
+        self.rate_limited = 0
+        self.t0 = time.monotonic()
+
+    def _hit(self, w: _Window, now: float):
+        if now >= w.reset_at:
+            w.used, w.reset_at = 0, now + w.per
+        if w.used >= w.limit:
+            self.rate_limited += 1
+            raise TransientError("429 Too Many Requests", retry_after=w.reset_at - now)
+        w.used += 1
+        return w
+
+    async def _request(self, kind: str, route_id: int, items: int) -> RateLimit:
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        self._hit(self._global, now)
+        w = self._routes.setdefault((kind, route_id), _Window(*self.route_limit))
+        self._hit(w, now)
+        self.calls.append((now - self.t0, kind, route_id, items))
+        return RateLimit(remaining=w.limit - w.used, reset_after=max(0.0, w.reset_at - now))
+
+    # ---- transport interface
+    async def redact(self, channel, messages):
+        if len(messages) > 100:
+            raise PermanentError("400 bulk delete accepts at most 100 messages")
+        return await self._request("delete", channel.id, len(messages))
+
+    async def send_dm(self, user, content):
+        if user.dm_blocked:
+            raise PermanentError("403 Cannot send messages to this user")
+        return await self._request("dm", user.id, 1)
+
+    async def send_channel(self, channel, content):
+        return await self._request("send", channel.id, 1)
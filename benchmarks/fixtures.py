@@ -0,0 +1,63 @@
+"""Tiny randomly initialised stand-ins for the real checkpoints.
+
+Builds a 2-layer DistilBERT toxicity base + LoRA adapter (+ classifier_head.bin,
+labels.json, thresholds.json) and a 2-layer sarcasm classifier with a small
+word-level vocab, laid out exactly like the real model directories, so the
+benchmarks exercise the real loading / tokenization / forward code offline.
+Scores are meaningless; timings and code paths are what matter.
+"""
+import json
+from pathlib import Path
+from typing import Dict
+
+JIGSAW_LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+
+def _tokenizer(root: Path):
+    from transformers import BertTokenizerFast
+    from corpus import CLEAN, TOXIC, SARCASTIC, CRISIS
+    words = sorted({w.strip(".,!?'") for s in CLEAN + TOXIC + SARCASTIC + CRISIS for w in s.lower().split()})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [w for w in words if w] + list("abcdefghijklmnopqrstuvwxyz0123456789")
+    root.mkdir(parents=True, exist_ok=True)
+    vf = root / "vocab.txt"
+    vf.write_text("\n".join(dict.fromkeys(vocab)), encoding="utf-8")
+    return BertTokenizerFast(vocab_file=str(vf), do_lower_case=True)
+
+
+def _tiny(tok, num_labels: int, seed: int):
+    import torch
+    from transformers import DistilBertConfig, DistilBertForSequenceClassification
+    torch.manual_seed(seed)
+    cfg = DistilBertConfig(vocab_size=len(tok), dim=64, hidden_dim=128, n_layers=2, n_heads=2,
+                           max_position_embeddings=512, num_labels=num_labels, pad_token_id=0)
+    return DistilBertForSequenceClassification(cfg).eval()
+
+
+def build_tiny_models(root: Path) -> Dict[str, Path]:
+    """Create (or reuse) the stand-in model dirs under root; returns their paths."""
+    import torch
+    from peft import LoraConfig, get_peft_model
+    root = Path(root)
+    paths = {
+        "toxic_base": root / "toxic_base",
+        "toxic_lora": root / "toxic_lora",
+        "sarcasm": root / "sarcasm_berttweet",
+    }
+    if all((p / "config.json").exists() or (p / "adapter_config.json").exists() for p in paths.values()):
+        return paths
+
+    tok = _tokenizer(root / "_vocab")
+
+    base = _tiny(tok, len(JIGSAW_LABELS), seed=1)
+    base.save_pretrained(paths["toxic_base"]); tok.save_pretrained(paths["toxic_base"])
+    head = {k: v.clone() for k, v in base.classifier.state_dict().items()}
+    # no task_type: keeps the classifier a plain module, as the real adapter expects
+    lora = get_peft_model(base, LoraConfig(r=4, lora_alpha=8, target_modules=["q_lin", "v_lin"]))
+    lora.save_pretrained(paths["toxic_lora"]); tok.save_pretrained(paths["toxic_lora"])
+    torch.save(head, paths["toxic_lora"] / "classifier_head.bin")
+    (paths["toxic_lora"] / "labels.json").write_text(json.dumps({"labels": JIGSAW_LABELS}))
+    (paths["toxic_lora"] / "thresholds.json").write_text(json.dumps({"thresholds": {k: 0.5 for k in JIGSAW_LABELS}}))
+
+    sar = _tiny(tok, 2, seed=2)
+    sar.save_pretrained(paths["sarcasm"]); tok.save_pretrained(paths["sarcasm"])
+    return paths
@@ -0,0 +1,73 @@
+"""Raid burst through app.ingress.IngressQueue, per shed policy.
+
+The handler sleeps for a fixed "model" time, so no models are needed:
+
+    python benchmarks/ingress.py --messages 2000 --rate 400 --service-ms 10 --max 200
+
+Reports how long crisis / repeat-offender / default messages waited, how
+many were shed, and what happened to them (cheap path, deferred, dropped).
+"""
+import argparse, asyncio, json, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "peersupport"))
+from app.ingress import IngressQueue, LANE_CRISIS, LANE_DEFAULT, LANE_NAMES, LANE_REPEAT  # noqa: E402
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else None
+
+
+async def run(policy, args):
+    rng = random.Random(0)
+    waits = {n: [] for n in LANE_NAMES}
+    done = {"full": 0, "cheap": 0}
+
+    async def full(item):
+        t_in, lane = item
+        waits[LANE_NAMES[lane]].append(time.monotonic() - t_in)
+        await asyncio.sleep(args.service_ms / 1000)
+        done["full"] += 1
+
+    async def cheap(item):
+        done["cheap"] += 1
+
+    q = IngressQueue(full, cheap_handler=cheap, maxsize=args.max, policy=policy, workers=args.workers)
+    t0 = time.monotonic()
+    for _ in range(args.messages):
+        r = rng.random()
+        lane = LANE_CRISIS if r < args.crisis else LANE_REPEAT if r < args.crisis + args.repeat else LANE_DEFAULT
+        q.submit((time.monotonic(), lane), lane)
+        await asyncio.sleep(1 / args.rate)
+    while q.depth or q.stats()["deferred"]:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(args.service_ms / 1000 * 2)
+    return {
+        "makespan_s": time.monotonic() - t0,
+        "handled": done,
+        "stats": q.stats(),
+        "wait_p50_ms": {n: (_pct(w, 0.5) or 0) * 1000 for n, w in waits.items()},
+        "wait_max_ms": {n: (max(w) if w else 0) * 1000 for n, w in waits.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--rate", type=float, default=400, help="arrivals per second")
+    ap.add_argument("--service-ms", type=float, default=10, help="simulated full-pipeline time")
+    ap.add_argument("--max", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--crisis", type=float, default=0.01)
+    ap.add_argument("--repeat", type=float, default=0.10)
+    ap.add_argument("--policies", default="cheap,defer,drop")
+    args = ap.parse_args()
+    out = {"benchmark": "ingress", "config": vars(args)}
+    for policy in args.policies.split(","):
+        out[policy] = asyncio.run(run(policy, args))
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
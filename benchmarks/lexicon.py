@@ -0,0 +1,60 @@
+"""Crisis lexicon scaling: Aho-Corasick (app.lexicon) vs. one big regex alternation.
+
+    python benchmarks/lexicon.py --sizes 10,100,1000,10000 --messages 2000
+
+Patterns are random 2-4 word phrases over a synthetic vocabulary; messages
+are random ~20-word chats with a small fraction of planted hits. Both
+matchers must agree on which messages hit.
+"""
+import argparse, json, random, re, string, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "peersupport"))
+from app.lexicon import Lexicon, normalize  # noqa: E402
+
+
+def _vocab(rng, n=5000):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,1000,10000")
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--hit-rate", type=float, default=0.01)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    vocab = _vocab(rng)
+    rows = []
+    for size in map(int, args.sizes.split(",")):
+        phrases = list({" ".join(rng.choices(vocab, k=rng.randint(2, 4))) for _ in range(size)})
+        msgs = []
+        for _ in range(args.messages):
+            words = rng.choices(vocab, k=20)
+            if rng.random() < args.hit_rate:
+                words.insert(rng.randrange(20), rng.choice(phrases))
+            msgs.append(" ".join(words))
+
+        t0 = time.perf_counter(); lx = Lexicon(phrases); lx_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rx = re.compile(r"\b(?:" + "|".join(map(re.escape, phrases)) + r")\b", re.IGNORECASE)
+        rx_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter(); lx_hits = [lx.search(m) is not None for m in msgs]; lx_s = time.perf_counter() - t0
+        t0 = time.perf_counter(); rx_hits = [bool(rx.search(normalize(m))) for m in msgs]; rx_s = time.perf_counter() - t0
+
+        rows.append({
+            "patterns": len(phrases),
+            "automaton_build_ms": lx_build * 1000,
+            "automaton_us_per_msg": lx_s / len(msgs) * 1e6,
+            "regex_build_ms": rx_build * 1000,
+            "regex_us_per_msg": rx_s / len(msgs) * 1e6,
+            "hits": sum(lx_hits),
+            "agree": lx_hits == rx_hits,
+        })
+    print(json.dumps({"benchmark": "lexicon", "messages": args.messages, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
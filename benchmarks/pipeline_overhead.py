@@ -0,0 +1,89 @@
+"""LangGraph overhead vs. the direct fast path (app.graph_pipeline.run_fast).
+
+Models and LLM replies are replaced by constant-time stand-ins so the numbers
+isolate framework cost: total time per message minus the time spent inside
+the nodes themselves. Also checks that both paths reach the same decisions.
+
+    python benchmarks/pipeline_overhead.py --messages 20000 --flag-rate 0.03
+"""
+import argparse, json, os, random, sys, time
+from pathlib import Path
+
+PEER_DIR = Path(__file__).resolve().parents[1] / "peersupport"
+
+
+class _StubSarcasm:
+    def score(self, text):
+        return (hash(text) % 100) / 400  # 0 .. 0.25, low so flagged rows stay "serious"
+
+
+class _StubTox:
+    def scores(self, text):
+        hot = text.startswith("!")
+        return {"toxic": 0.95 if hot else 0.05, "insult": 0.9 if hot else 0.02}
+
+
+def _corpus(n, flag_rate, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        r = rng.random()
+        if r < flag_rate / 3:
+            out.append(f"i want to end my life {i}")
+        elif r < flag_rate:
+            out.append(f"! you are worthless {i}")
+        else:
+            out.append(f"see you at the lab at {i % 12}pm")
+    return out
+
+
+def _bench(run, texts):
+    from app.graph_pipeline import NODE_STATS, node_timings
+    NODE_STATS.clear()
+    actions = []
+    t0 = time.perf_counter()
+    for i, text in enumerate(texts):
+        out = run({"text": text, "user_id": f"u{i % 50}", "channel_id": "c", "sarcasm": 0.0,
+                   "tox_max": 0.0, "seriousness": 0.0, "action": "none", "reply": ""})
+        actions.append(out["action"])
+    total = time.perf_counter() - t0
+    nodes = node_timings()
+    in_nodes = sum(v["total_s"] for v in nodes.values())
+    return actions, {
+        "total_s": total,
+        "per_message_us": total / len(texts) * 1e6,
+        "overhead_per_message_us": (total - in_nodes) / len(texts) * 1e6,
+        "nodes": nodes,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=5000)
+    ap.add_argument("--flag-rate", type=float, default=0.03)
+    args = ap.parse_args()
+
+    os.chdir(PEER_DIR)
+    sys.path.insert(0, str(PEER_DIR))
+    from app import models, graph_pipeline as gp
+    models.sarcasm = models.LazyModel("sarcasm", _StubSarcasm)
+    models.toxicity = models.LazyModel("toxicity", _StubTox)
+    gp.craft_serious_reply = lambda *a, **k: "stop"
+    gp.craft_crisis_reply = lambda *a, **k: "help"
+
+    texts = _corpus(args.messages, args.flag_rate)
+    graph_actions, graph = _bench(gp.run_graph, texts)
+    fast_actions, fast = _bench(gp.run_fast, texts)
+    print(json.dumps({
+        "benchmark": "pipeline_overhead",
+        "messages": args.messages,
+        "flag_rate": args.flag_rate,
+        "decisions_match": graph_actions == fast_actions,
+        "graph": graph,
+        "fast": fast,
+        "speedup": graph["total_s"] / fast["total_s"] if fast["total_s"] else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
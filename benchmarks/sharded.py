@@ -0,0 +1,152 @@
+"""Sharded deployment on one box: N fake-gateway shards + one shared inference service.
+
+Starts app.inference_service on a unix socket and N shard processes. Each
+shard replays a synthetic gateway stream (corpus.generate) at --rate msgs/s
+through the real pipeline (app.graph_pipeline.run_fast) with INFERENCE_SOCKET
+set, so scoring goes over the socket and the shard never imports torch.
+
+    python benchmarks/sharded.py --shards 4 --messages 2000 --rate 200           # stub scorer, no torch
+    python benchmarks/sharded.py --shards 4 --messages 2000 --rate 200 --models  # tiny real models (fixtures.py)
+
+Reports per-shard throughput / latency / RSS, whether torch was loaded in the
+shard, and the service's mean batch size (i.e. how much it batched across shards).
+"""
+import argparse, asyncio, json, os, random, subprocess, sys, tempfile, time, zlib
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PEER_DIR = BENCH_DIR.parent / "peersupport"
+sys.path.insert(0, str(BENCH_DIR))
+
+JIGSAW = ("toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate")
+
+
+def _stub_scorer(base_ms: float, per_text_ms: float):
+    """Deterministic scores with a batched-forward cost model: base + per-text."""
+    def score(texts):
+        time.sleep((base_ms + per_text_ms * len(texts)) / 1000)
+        out = []
+        for t in texts:
+            h = zlib.crc32(t.encode())
+            tox = (h % 1000) / 1000 if any(w in t.lower() for w in ("idiot", "hate", "stupid", "kill")) else 0.05
+            out.append(((h >> 10) % 100 / 100, {k: tox if k in ("toxic", "insult") else tox / 4 for k in JIGSAW}))
+        return out
+    return score
+
+
+def run_service(args):
+    os.chdir(PEER_DIR)
+    sys.path.insert(0, str(PEER_DIR))
+    if args.models:
+        from fixtures import build_tiny_models
+        paths = build_tiny_models(Path(args.work) / "models")
+        os.environ["SARCASM_MODEL_PATH"] = str(paths["sarcasm"])
+        os.environ["TOXICITY_BASE_MODEL"] = str(paths["toxic_base"])
+        os.environ["TOXICITY_ADAPTER_PATH"] = str(paths["toxic_lora"])
+    os.environ.pop("INFERENCE_SOCKET", None)  # the service scores locally
+    from app.inference_service import InferenceServer, score_local
+    if args.models:
+        from app import models
+        models.load_all(local=True); models.warm_up(local=True)
+        score_fn = score_local
+    else:
+        score_fn = _stub_scorer(args.stub_base_ms, args.stub_per_text_ms)
+    asyncio.run(InferenceServer(args.socket, score_fn, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms).serve())
+
+
+async def _gateway(args, gp):
+    import corpus
+    events = list(corpus.generate(args.messages, seed=args.shard_id))
+    sem = asyncio.Semaphore(args.concurrency)
+    lat, actions = [], {}
+    rng = random.Random(args.shard_id)
+
+    async def handle(m):
+        async with sem:
+            t = time.perf_counter()
+            res = await asyncio.to_thread(gp.run_fast, {
+                "text": m["text"], "user_id": m["user_id"], "channel_id": m["channel"], "sarcasm": 0.0,
+                "tox_max": 0.0, "seriousness": 0.0, "action": "none", "reply": ""})
+            lat.append((time.perf_counter() - t) * 1000)
+            actions[res["action"]] = actions.get(res["action"], 0) + 1
+
+    tasks = []
+    t0 = time.perf_counter()
+    for m in events:  # Poisson arrivals, like a busy gateway
+        tasks.append(asyncio.create_task(handle(m)))
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - t0, lat, actions
+
+
+def run_shard(args):
+    os.environ["INFERENCE_SOCKET"] = args.socket
+    os.environ.setdefault("OPENAI_API_KEY", "")
+    os.chdir(Path(args.work))  # keep any outputs/ out of the repo
+    sys.path.insert(0, str(PEER_DIR))
+    from app import graph_pipeline as gp, models
+    from app.weights import process_memory
+    gp.craft_serious_reply = lambda *a, **k: "Please keep our space safe and respectful."
+    gp.craft_crisis_reply = lambda *a, **k: "You're not alone. Help is available."
+    waited = models.load_all()["inference_service_wait"]
+    elapsed, lat, actions = asyncio.run(_gateway(args, gp))
+    lat.sort()
+    print(json.dumps({
+        "shard": args.shard_id, "messages": len(lat), "elapsed_s": elapsed, "msgs_per_s": len(lat) / elapsed,
+        "p50_ms": lat[len(lat) // 2], "p95_ms": lat[int(len(lat) * 0.95)], "max_ms": lat[-1],
+        "service_wait_s": waited, "actions": actions,
+        "torch_loaded": "torch" in sys.modules, **process_memory(),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("role", nargs="?", default="run", choices=("run", "service", "shard"))
+    ap.add_argument("--shards", type=int, default=4)
+    ap.add_argument("--messages", type=int, default=1000, help="per shard")
+    ap.add_argument("--rate", type=float, default=100, help="msgs/s per shard")
+    ap.add_argument("--concurrency", type=int, default=8, help="pipeline threads per shard")
+    ap.add_argument("--max-batch", type=int, default=32)
+    ap.add_argument("--max-wait-ms", type=float, default=5)
+    ap.add_argument("--models", action="store_true", help="tiny real models instead of the stub scorer")
+    ap.add_argument("--stub-base-ms", type=float, default=4.0)
+    ap.add_argument("--stub-per-text-ms", type=float, default=0.3)
+    ap.add_argument("--socket")
+    ap.add_argument("--work")
+    ap.add_argument("--shard-id", type=int, default=0)
+    args = ap.parse_args()
+    if args.role == "service":
+        return run_service(args)
+    if args.role == "shard":
+        return run_shard(args)
+
+    with tempfile.TemporaryDirectory(prefix="sharded-") as work:
+        sock = os.path.join(work, "infer.sock")
+        common = [sys.executable, __file__, "--socket", sock, "--work", work]
+        svc_flags = ["--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms),
+                     "--stub-base-ms", str(args.stub_base_ms), "--stub-per-text-ms", str(args.stub_per_text_ms)]
+        service = subprocess.Popen(common + ["service"] + svc_flags + (["--models"] if args.models else []))
+        try:
+            shards = [subprocess.Popen(common + ["shard", "--shard-id", str(i), "--messages", str(args.messages),
+                                                 "--rate", str(args.rate), "--concurrency", str(args.concurrency)],
+                                       stdout=subprocess.PIPE, text=True) for i in range(args.shards)]
+            results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in shards]
+            sys.path.insert(0, str(PEER_DIR))
+            from app.inference_service import InferenceClient
+            stats = InferenceClient(sock).ping()
+        finally:
+            service.terminate()
+            service.wait()
+    total = sum(r["messages"] for r in results)
+    print(json.dumps({
+        "benchmark": "sharded", "config": {k: v for k, v in vars(args).items() if k not in ("role", "socket", "work", "shard_id")},
+        "messages": total,
+        "aggregate_msgs_per_s": total / max(r["elapsed_s"] for r in results),
+        "service_batches": stats["batches"],
+        "mean_batch_size": stats["texts"] / max(1, stats["batches"]),
+        "shards": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
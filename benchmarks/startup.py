@@ -0,0 +1,59 @@
+"""Import-to-ready startup benchmark for the peersupport bot.
+
+Each run happens in a fresh interpreter (so nothing is cached in sys.modules)
+with cwd=peersupport/, exactly like `python bot.py`. Prints one JSON object:
+
+    python benchmarks/startup.py --runs 5            # import + model load + first message
+    python benchmarks/startup.py --runs 5 --no-load  # import cost only (no checkpoints needed)
+"""
+import argparse, json, os, statistics, subprocess, sys
+from pathlib import Path
+
+PEER_DIR = Path(__file__).resolve().parents[1] / "peersupport"
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.graph_pipeline as gp
+t_import = time.perf_counter() - t0
+heavy = sorted(m for m in ("torch", "transformers", "peft", "openai") if m in sys.modules)
+out = {"import_s": t_import, "heavy_modules_after_import": heavy}
+if LOAD:
+    from app import models
+    t1 = time.perf_counter()
+    out["load_s"] = models.load_all()
+    out["ready_s"] = time.perf_counter() - t0
+    t2 = time.perf_counter()
+    gp.node_sentinel({"text": "hello there", "user_id": "u", "channel_id": "c"})
+    out["first_message_s"] = time.perf_counter() - t2
+print("__RESULT__" + json.dumps(out))
+"""
+
+
+def run_once(load: bool) -> dict:
+    code = PROBE.replace("LOAD", "True" if load else "False")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=PEER_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("__RESULT__"):
+            return json.loads(line[len("__RESULT__"):])
+    raise RuntimeError(f"probe failed:\n{proc.stderr}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--no-load", action="store_true", help="only time the import")
+    args = ap.parse_args()
+
+    runs = [run_once(not args.no_load) for _ in range(args.runs)]
+    summary = {"benchmark": "startup", "runs": runs,
+               "import_s_median": statistics.median(r["import_s"] for r in runs),
+               "heavy_modules_after_import": runs[0]["heavy_modules_after_import"]}
+    if not args.no_load:
+        summary["ready_s_median"] = statistics.median(r["ready_s"] for r in runs)
+        summary["first_message_s_median"] = statistics.median(r["first_message_s"] for r in runs)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Multi-worker load / warm-up benchmark for the peersupport models.
+
+Starts N worker processes on this host that each load both models (via the
+mmap'd snapshots in app.weights), optionally warm up, then score one message.
+All workers hold their models until everyone has reported, so the RSS/PSS
+numbers show how much of the weights is shared through the page cache.
+
+    python benchmarks/warmup.py --workers 4
+    python benchmarks/warmup.py --workers 4 --no-warmup      # first-message cost without warm-up
+    MMAP_WEIGHTS=0 python benchmarks/warmup.py --workers 4   # private heap copies, for comparison
+"""
+import argparse, json, multiprocessing as mp, os, statistics, sys, time
+from pathlib import Path
+
+PEER_DIR = Path(__file__).resolve().parents[1] / "peersupport"
+
+
+def _worker(warm: bool, barrier, results):
+    os.chdir(PEER_DIR)
+    sys.path.insert(0, str(PEER_DIR))
+    from app import models
+    from app.graph_pipeline import node_sentinel
+    from app.weights import process_memory
+
+    t0 = time.perf_counter()
+    models.load_all()
+    out = {"load_s": time.perf_counter() - t0}
+    if warm:
+        out["warmup_s"] = models.warm_up()
+    t1 = time.perf_counter()
+    node_sentinel({"text": "you are all useless, honestly", "user_id": "u", "channel_id": "c"})
+    out["first_message_ms"] = (time.perf_counter() - t1) * 1000
+    barrier.wait()  # everyone resident before measuring memory
+    out.update(process_memory())
+    results.put(out)
+    barrier.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--no-warmup", action="store_true")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(not args.no_warmup, barrier, results)) for _ in range(args.workers)]
+    for p in procs: p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs: p.join()
+
+    summary = {
+        "benchmark": "warmup",
+        "workers": args.workers,
+        "mmap_weights": os.getenv("MMAP_WEIGHTS", "1"),
+        "warmup": not args.no_warmup,
+        "per_worker": rows,
+        "first_message_ms_median": statistics.median(r["first_message_ms"] for r in rows),
+    }
+    if all("pss_mb" in r for r in rows):
+        summary["total_rss_mb"] = sum(r["rss_mb"] for r in rows)
+        summary["total_pss_mb"] = sum(r["pss_mb"] for r in rows)  # what the host really pays
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
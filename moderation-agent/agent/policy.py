@@ -1,33 +1,52 @@
 # Simple severity/seriousness + policy decisions
 from typing import Dict, List, Tuple
 
+# All tunables in one place so replay.py can sweep candidates without rescoring
+POLICY = {
+    # base severity = max(weight * prob) over labels
+    "severity_weights": {"threat": 0.80, "severe_toxic": 0.75, "identity_hate": 0.70,
+                         "toxic": 0.55, "insult": 0.50, "obscene": 0.45},
+    "user_weight": 0.10,       # mean severity of the user's last K messages
+    "chan_weight": 0.05,       # mean severity of the channel's last K messages
+    "sarcasm_relief": 0.25,
+    "threat_override": 0.50,   # threat prob that forces escalation
+    "severe_override": 0.60,   # severe_toxic prob that forces escalation
+    "override_floor": 0.80,    # seriousness floor when an override fires
+    "escalate": 0.65,          # seriousness thresholds
+    "warn": 0.45,
+    "context_k": 5,            # rolling window per user / channel
+}
+
 def compute_seriousness(p: Dict[str, float], p_sarcasm: float,
-                        recent_user: List[float], recent_chan: List[float]) -> Tuple[float, float]:
+                        recent_user: List[float], recent_chan: List[float],
+                        policy: Dict = POLICY) -> Tuple[float, float]:
     # base severity from toxicity only
-    severity = max(
-        0.80 * p.get("threat", 0.0),
-        0.75 * p.get("severe_toxic", 0.0),
-        0.70 * p.get("identity_hate", 0.0),
-        0.55 * p.get("toxic", 0.0),
-        0.50 * p.get("insult", 0.0),
-        0.45 * p.get("obscene", 0.0),
-    )
+    severity = max(w * p.get(k, 0.0) for k, w in policy["severity_weights"].items())
     u = sum(recent_user) / max(1, len(recent_user))
     c = sum(recent_chan) / max(1, len(recent_chan))
-    banter_relief = 0.25 * p_sarcasm
-    seriousness = max(0.0, min(1.0, severity + 0.10*u + 0.05*c - banter_relief))
+    banter_relief = policy["sarcasm_relief"] * p_sarcasm
+    seriousness = max(0.0, min(1.0, severity + policy["user_weight"]*u + policy["chan_weight"]*c - banter_relief))
     # safety overrides
-    if p.get("threat", 0.0) >= 0.50 or p.get("severe_toxic", 0.0) >= 0.60:
-        seriousness = max(seriousness, 0.80)
+    if p.get("threat", 0.0) >= policy["threat_override"] or p.get("severe_toxic", 0.0) >= policy["severe_override"]:
+        seriousness = max(seriousness, policy["override_floor"])
     return severity, seriousness
 
-def decide(p: Dict[str, float], seriousness: float):
-    if p.get("threat", 0.0) >= 0.50 or p.get("severe_toxic", 0.0) >= 0.60 or seriousness >= 0.65:
+def decide(p: Dict[str, float], seriousness: float, policy: Dict = POLICY):
+    if p.get("threat", 0.0) >= policy["threat_override"] or p.get("severe_toxic", 0.0) >= policy["severe_override"] \
+            or seriousness >= policy["escalate"]:
         return ["escalate", "redact"]
-    if seriousness >= 0.45:
+    if seriousness >= policy["warn"]:
         return ["warn", "redact"]
     return ["log_only"]
 
+def sarcasm_can_matter(p: Dict[str, float], recent_user: List[float], recent_chan: List[float],
+                       policy: Dict = POLICY) -> bool:
+    # seriousness only falls as p_sarcasm rises (banter_relief <= sarcasm_relief), so if the two
+    # extremes give the same actions, every p_sarcasm does and the sarcasm model can be skipped
+    _, lo = compute_seriousness(p, 1.0, recent_user, recent_chan, policy)
+    _, hi = compute_seriousness(p, 0.0, recent_user, recent_chan, policy)
+    return decide(p, lo, policy) != decide(p, hi, policy)
+
 def redact_text(text: str) -> str:
     # simple, safe redaction: mask vowels to remove sting without changing meaning too much
     trans = str.maketrans("aeiouAEIOU", "*"*10)
@@ -0,0 +1,184 @@
+# Policy replay: re-run decide()/compute_seriousness() over scores already in
+# moderation.db, vectorised with numpy, and diff against the recorded actions.
+# No model is loaded; a threshold grid over millions of messages takes seconds.
+#   python replay.py --since 2025-09-01 --grid warn=0.40,0.45,0.50 --grid escalate=0.60,0.65,0.70
+#   python run.py replay ...   (same flags)
+# Caveat: run.py resets the rolling user/channel context at the start of every
+# run, replay carries it across the whole selected range, so messages right
+# after a run boundary can differ even under the recorded policy.
+# Runs with --lazy-sarcasm store NULL sarcasm where it could not change the
+# recorded actions; replay reads those as 0 (no banter relief), so looser
+# candidates may over-count on such runs.
+import copy, itertools, json, sqlite3, time, argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+from policy import POLICY
+from report import DB_PATH, ensure_indexes, stored_labels, where_clause
+
+ACTIONS = ("log_only", "warn", "escalate")
+ACTION_SQL = ("CASE WHEN d.actions_json LIKE '%\"escalate\"%' THEN 2 "
+              "WHEN d.actions_json LIKE '%\"warn\"%' THEN 1 ELSE 0 END")
+
+class StoredScores:
+    """Per-message columns in message order: label probs (n x labels), sarcasm, recorded action, user/channel codes."""
+
+    def __init__(self, conn: sqlite3.Connection, since: Optional[str] = None, until: Optional[str] = None,
+                 channels: Optional[List[str]] = None, chunk: int = 100_000):
+        self.labels = stored_labels(conn, {})
+        if not self.labels:
+            raise SystemExit("no stored predictions to replay")
+        where, params = where_clause(since, until, channels or [])
+        # pivot predictions to one row per message inside SQLite, then stream it in chunks
+        pivot = ", ".join("MAX(CASE WHEN p.label = ? THEN p.prob END)" for _ in self.labels)
+        cur = conn.execute(
+            f"SELECT m.user_id, m.channel, d.sarcasm_prob, {ACTION_SQL}, {pivot} "
+            f"FROM messages m JOIN decisions d ON d.message_id = m.id JOIN predictions p ON p.message_id = m.id "
+            f"{where} GROUP BY m.id ORDER BY m.id", list(self.labels) + params)
+        users, chans, sarcasm, recorded, probs = {}, {}, [], [], []
+        user_codes, chan_codes = [], []
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            cols = list(zip(*rows))
+            user_codes.append(np.fromiter((users.setdefault(u, len(users)) for u in cols[0]), np.int64, len(rows)))
+            chan_codes.append(np.fromiter((chans.setdefault(c, len(chans)) for c in cols[1]), np.int64, len(rows)))
+            sarcasm.append(np.asarray(cols[2], dtype=np.float64))
+            recorded.append(np.asarray(cols[3], dtype=np.int8))
+            probs.append(np.asarray([r[4:] for r in rows], dtype=np.float64).reshape(len(rows), len(self.labels)))
+        n_labels = len(self.labels)
+        self.user = np.concatenate(user_codes) if user_codes else np.zeros(0, np.int64)
+        self.chan = np.concatenate(chan_codes) if chan_codes else np.zeros(0, np.int64)
+        self.sarcasm = np.nan_to_num(np.concatenate(sarcasm)) if sarcasm else np.zeros(0)
+        self.recorded = np.concatenate(recorded) if recorded else np.zeros(0, np.int8)
+        self.probs = np.nan_to_num(np.concatenate(probs)) if probs else np.zeros((0, n_labels))
+        # group orderings for the rolling context, computed once and reused for every candidate
+        self._user_order = _group_order(self.user)
+        self._chan_order = _group_order(self.chan)
+
+    def __len__(self):
+        return len(self.recorded)
+
+    def prob(self, label: str) -> np.ndarray:
+        return self.probs[:, self.labels.index(label)] if label in self.labels else np.zeros(len(self))
+
+    def decide(self, policy: Dict = POLICY) -> np.ndarray:
+        """Vectorised compute_seriousness + decide; returns action codes (index into ACTIONS)."""
+        severity = np.zeros(len(self))
+        for k, w in policy["severity_weights"].items():
+            np.maximum(severity, w * self.prob(k), out=severity)
+        k = policy["context_k"]
+        u = _prev_mean(severity, self._user_order, k)
+        c = _prev_mean(severity, self._chan_order, k)
+        seriousness = np.clip(severity + policy["user_weight"] * u + policy["chan_weight"] * c
+                              - policy["sarcasm_relief"] * self.sarcasm, 0.0, 1.0)
+        override = (self.prob("threat") >= policy["threat_override"]) | (self.prob("severe_toxic") >= policy["severe_override"])
+        seriousness = np.where(override, np.maximum(seriousness, policy["override_floor"]), seriousness)
+        return np.where(override | (seriousness >= policy["escalate"]), 2,
+                        np.where(seriousness >= policy["warn"], 1, 0)).astype(np.int8)
+
+def _group_order(group: np.ndarray):
+    # stable sort keeps message order inside each group; pos = index within the group
+    order = np.argsort(group, kind="stable")
+    g = group[order]
+    pos = np.arange(len(g)) - np.searchsorted(g, g, side="left")
+    return order, pos
+
+def _prev_mean(values: np.ndarray, group_order, k: int) -> np.ndarray:
+    """Mean of up to k previous values in the same group (0 when there are none), like the deques in run.py.
+
+    Summed oldest first over the window, as sum(deque) does, so the result is
+    bit-identical to run.py (a running cumsum drifts as the corpus grows and
+    flips messages sitting on a threshold).
+    """
+    order, pos = group_order
+    v = values[order]
+    idx = np.arange(len(v))
+    cnt = np.minimum(pos, k)
+    total = np.zeros(len(v))
+    for j in range(k):  # k = context_k, a handful of vector adds
+        take = j < cnt
+        total[take] += v[(idx - cnt + j)[take]]
+    mean = np.divide(total, cnt, out=np.zeros(len(v)), where=cnt > 0)
+    out = np.empty_like(mean)
+    out[order] = mean
+    return out
+
+def diff(recorded: np.ndarray, candidate: np.ndarray) -> Dict:
+    counts = np.bincount(candidate, minlength=len(ACTIONS))
+    base = np.bincount(recorded, minlength=len(ACTIONS))
+    moves = np.bincount(recorded.astype(np.int64) * len(ACTIONS) + candidate, minlength=len(ACTIONS) ** 2)
+    return {
+        "actions": dict(zip(ACTIONS, counts.tolist())),
+        "delta": {a: int(c - b) for a, c, b in zip(ACTIONS, counts, base)},
+        "changed": int((recorded != candidate).sum()),
+        "moves": {f"{ACTIONS[i // len(ACTIONS)]}->{ACTIONS[i % len(ACTIONS)]}": int(n)
+                  for i, n in enumerate(moves) if n and i // len(ACTIONS) != i % len(ACTIONS)},
+    }
+
+def with_overrides(policy: Dict, overrides: Dict[str, float]) -> Dict:
+    """Copy of policy with keys replaced; 'severity_weights.threat' reaches into the nested dict."""
+    out = copy.deepcopy(policy)
+    for key, v in overrides.items():
+        head, _, sub = key.partition(".")
+        if head not in out or isinstance(out[head], dict) != bool(sub) or (sub and sub not in out[head]):
+            raise SystemExit(f"unknown policy key: {key}")
+        if sub:
+            out[head][sub] = v
+        else:
+            out[head] = int(v) if head == "context_k" else v
+    return out
+
+def sweep(scores: StoredScores, grid: Dict[str, List[float]], base: Dict = POLICY) -> List[Dict]:
+    keys = list(grid)
+    rows = []
+    for values in itertools.product(*(grid[k] for k in keys)) if keys else [()]:
+        point = dict(zip(keys, values))
+        rows.append({"policy": point, **diff(scores.recorded, scores.decide(with_overrides(base, point)))})
+    return rows
+
+def _kv(arg: str):
+    key, _, vals = arg.partition("=")
+    if not vals:
+        raise argparse.ArgumentTypeError(f"expected key=value[,value...], got {arg!r}")
+    return key.strip(), [float(v) for v in vals.split(",")]
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="run.py replay", description="re-apply a candidate policy to stored scores")
+    ap.add_argument("--db", default=str(DB_PATH))
+    ap.add_argument("--since", help="inclusive, ISO date/time")
+    ap.add_argument("--until", help="exclusive, ISO date/time")
+    ap.add_argument("--channel", action="append", default=[], help="repeatable")
+    ap.add_argument("--set", action="append", default=[], type=_kv, metavar="KEY=V",
+                    help="fixed override, e.g. warn=0.5 or severity_weights.insult=0.6")
+    ap.add_argument("--grid", action="append", default=[], type=_kv, metavar="KEY=V1,V2,...",
+                    help="sweep these values (cartesian product over all --grid)")
+    ap.add_argument("--out", help="write the sweep as JSON")
+    args = ap.parse_args(argv)
+    assert Path(args.db).exists(), f"not found: {args.db}"
+
+    conn = sqlite3.connect(args.db)
+    ensure_indexes(conn)
+    t0 = time.perf_counter()
+    scores = StoredScores(conn, args.since, args.until, args.channel)
+    conn.close()
+    t_load = time.perf_counter() - t0
+    base = with_overrides(POLICY, {k: v[0] for k, v in args.set})
+    t0 = time.perf_counter()
+    rows = sweep(scores, dict(args.grid), base)
+    t_sweep = time.perf_counter() - t0
+
+    recorded = dict(zip(ACTIONS, np.bincount(scores.recorded, minlength=len(ACTIONS)).tolist()))
+    print(f"[replay] {len(scores)} messages | load {t_load:.2f}s | {len(rows)} candidate(s) in {t_sweep:.2f}s")
+    print(f"recorded: {recorded}")
+    for r in rows:
+        delta = " ".join(f"{a}={r['actions'][a]}({r['delta'][a]:+d})" for a in ACTIONS)
+        print(f"{json.dumps(r['policy'])}  {delta}  changed={r['changed']}  {r['moves']}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"recorded": recorded, "messages": len(scores), "candidates": rows}, indent=2))
+        print(f"wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
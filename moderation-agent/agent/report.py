@@ -0,0 +1,151 @@
+# moderation_report.md straight from moderation.db (no rescoring)
+# Everything is a set-based aggregate or a LIMITed top-K query, so memory stays
+# flat no matter how many rows are stored.
+#   python report.py --since 2025-09-01 --until 2025-09-08 --channel general
+#   python run.py report ...   (same flags)
+import json, sqlite3, datetime as dt, argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "moderation.db"
+OUT_DIR = ROOT / "outputs"
+ADAPTER_DIR = ROOT / "models" / "toxic_lora"  # same as toxicity_infer, without importing torch
+
+INDEXES = (
+    # covering: per-message label lookups and top-k-by-prob without touching the table
+    "CREATE INDEX IF NOT EXISTS idx_predictions_message_prob ON predictions(message_id, prob DESC, label)",
+    "CREATE INDEX IF NOT EXISTS idx_decisions_message ON decisions(message_id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_channel_ts ON messages(channel, timestamp)",
+)
+
+WARN = "d.actions_json LIKE '%\"warn\"%'"
+ESCALATE = "d.actions_json LIKE '%\"escalate\"%'"
+
+def ensure_indexes(conn: sqlite3.Connection):
+    for stmt in INDEXES:
+        conn.execute(stmt)
+    conn.commit()
+
+def load_thresholds() -> Dict[str, float]:
+    try:
+        return json.load(open(ADAPTER_DIR / "thresholds.json"))["thresholds"]
+    except Exception:
+        return {}
+
+def stored_labels(conn, thresholds: Dict[str, float]) -> List[str]:
+    try:
+        return json.load(open(ADAPTER_DIR / "labels.json"))["labels"]
+    except Exception:
+        pass
+    # every message gets the same label set; read it off one message (index lookup, not a scan)
+    rows = conn.execute("SELECT label FROM predictions WHERE message_id = (SELECT MIN(message_id) FROM predictions) ORDER BY rowid").fetchall()
+    return [r[0] for r in rows] or list(thresholds)
+
+def where_clause(since: Optional[str], until: Optional[str], channels: List[str]) -> Tuple[str, list]:
+    # timestamps are stored as ISO-8601 text, so range filters are plain string comparisons
+    clauses, params = [], []
+    if since:
+        clauses.append("m.timestamp >= ?"); params.append(since)
+    if until:
+        clauses.append("m.timestamp < ?"); params.append(until)
+    if channels:
+        clauses.append(f"m.channel IN ({','.join('?' * len(channels))})"); params.extend(channels)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def label_counts(conn, where: str, params: list, thresholds: Dict[str, float]) -> Dict[str, int]:
+    """Same rule as run.write_digest: a label counts if it is in the message's top 2 and over its threshold.
+
+    Top 2 = fewer than two labels rank above it, one index seek per candidate
+    instead of a window function over every prediction row. Ties go to the
+    earlier row, i.e. label order, as in the digest's stable sort, so a tie
+    for second place still gives exactly two labels.
+    """
+    if thresholds:
+        thr = "thr(label, t) AS (VALUES " + ",".join("(?, ?)" for _ in thresholds) + ")"
+        thr_params = [x for kv in thresholds.items() for x in kv]
+    else:
+        thr, thr_params = "thr(label, t) AS (SELECT NULL, NULL WHERE 0)", []
+    sql = f"""
+        WITH {thr}
+        SELECT p.label, COUNT(*)
+        FROM messages m JOIN predictions p ON p.message_id = m.id LEFT JOIN thr ON thr.label = p.label
+        {where} {'AND' if where else 'WHERE'} p.prob >= COALESCE(thr.t, 0.5)
+          AND (SELECT COUNT(*) FROM predictions q WHERE q.message_id = p.message_id
+               AND (q.prob > p.prob OR (q.prob = p.prob AND q.rowid < p.rowid))) < 2
+        GROUP BY p.label"""
+    return dict(conn.execute(sql, thr_params + params).fetchall())
+
+def build_report(conn: sqlite3.Connection, since: Optional[str] = None, until: Optional[str] = None,
+                 channels: Optional[List[str]] = None, top: int = 5,
+                 thresholds: Optional[Dict[str, float]] = None) -> str:
+    channels = channels or []
+    thresholds = load_thresholds() if thresholds is None else thresholds
+    where, params = where_clause(since, until, channels)
+    base = f"FROM messages m JOIN decisions d ON d.message_id = m.id {where}"
+
+    total, flagged, escalated = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM({WARN} OR {ESCALATE}), 0), COALESCE(SUM({ESCALATE}), 0) {base}", params).fetchone()
+    counts = label_counts(conn, where, params, thresholds)
+
+    now = dt.datetime.now().strftime("%Y-%m-%d %H:%M")
+    scope = f"Range: {since or 'start'} → {until or 'now'}"
+    if channels:
+        scope += f"  |  Channels: {', '.join(channels)}"
+    lines = [f"# Moderation Report — {now}", scope,
+             f"Total messages: {total}  |  Flagged: {flagged}  |  Escalated: {escalated}\n"]
+
+    lines.append("## Counts by label")
+    for k in stored_labels(conn, thresholds):
+        lines.append(f"- {k}: {counts.get(k, 0)}")
+    lines.append("")
+
+    if len(channels) != 1:
+        lines.append(f"## Channels (top {top} by flagged)")
+        for ch, n, f, e in conn.execute(
+                f"SELECT m.channel, COUNT(*), SUM({WARN} OR {ESCALATE}) AS flagged, SUM({ESCALATE}) {base} "
+                "GROUP BY m.channel ORDER BY flagged DESC, m.channel LIMIT ?", params + [top]):
+            lines.append(f"- {ch}: {n} messages, {f} flagged, {e} escalated")
+        lines.append("")
+
+    lines.append(f"## Escalated (top {top} by seriousness)")
+    prob = "(SELECT prob FROM predictions WHERE message_id = m.id AND label = '{}')"
+    rows = conn.execute(
+        f"SELECT m.channel, m.user_id, m.text, d.seriousness, {prob.format('threat')}, {prob.format('severe_toxic')} "
+        f"{base} {'AND' if where else 'WHERE'} {ESCALATE} ORDER BY d.seriousness DESC, m.id LIMIT ?", params + [top])
+    for i, (ch, uid, txt, ser, threat, severe) in enumerate(rows, 1):
+        lines.append(f"{i}) [{ch}] {uid} — \"{txt[:100]}\" "
+                     f"(threat={threat or 0:.2f}, severe={severe or 0:.2f}, seriousness={ser:.2f})")
+    lines.append("")
+
+    lines.append("## Recent warnings (redacted)")
+    for uid, red in conn.execute(
+            f"SELECT m.user_id, d.redacted_text {base} {'AND' if where else 'WHERE'} {WARN} "
+            "ORDER BY m.id DESC LIMIT 10", params):
+        lines.append(f"- {uid}: \"{red}\"")
+    lines.append("")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="run.py report", description="moderation_report.md from moderation.db")
+    ap.add_argument("--db", default=str(DB_PATH))
+    ap.add_argument("--since", help="inclusive, ISO date/time (e.g. 2025-09-01)")
+    ap.add_argument("--until", help="exclusive, ISO date/time")
+    ap.add_argument("--channel", action="append", default=[], help="repeatable")
+    ap.add_argument("--top", type=int, default=5)
+    ap.add_argument("--out", default=str(OUT_DIR / "moderation_report.md"))
+    args = ap.parse_args(argv)
+    assert Path(args.db).exists(), f"not found: {args.db}"
+
+    conn = sqlite3.connect(args.db)
+    ensure_indexes(conn)  # one-off on databases written before the indexes existed
+    text = build_report(conn, args.since, args.until, args.channel, args.top)
+    conn.close()
+    out = Path(args.out)
+    out.parent.mkdir(exist_ok=True, parents=True)
+    out.write_text(text, encoding="utf-8")
+    print(f"wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
-import os, csv, json, sqlite3, datetime as dt, argparse
+import os, sys, csv, heapq, json, queue, sqlite3, threading, time, datetime as dt, argparse
 from pathlib import Path
 from collections import defaultdict, deque
-from typing import List, Dict
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 
-from policy import compute_seriousness, decide, redact_text
+from policy import POLICY, compute_seriousness, decide, redact_text, sarcasm_can_matter
 from toxicity_infer import ToxicModel
 from sarcasm_infer import SarcasmModel
+from weights import process_memory
+import report, replay
 
 ROOT = Path(__file__).resolve().parents[1]
 DB_PATH = ROOT / "moderation.db"
@@ -44,6 +46,71 @@ def read_ndjson(path: Path) -> List[Dict]:
             })
     return out
 
+# ---- Parquet / Arrow (optional: pip install pyarrow)
+PARQUET_COLUMNS = ("timestamp", "user_id", "channel", "text")
+
+# Scoring works on column batches: {column: [values]} for PARQUET_COLUMNS, one list per
+# column (no per-row dicts). CSV/NDJSON rows are chunked into the same shape.
+Batch = Dict[str, List]
+
+def to_batch(rows: List[Dict]) -> Batch:
+    return {c: [r[c] for r in rows] for c in PARQUET_COLUMNS}
+
+def _pyarrow():
+    try:
+        import pyarrow, pyarrow.compute, pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Parquet input/output needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+def read_parquet(path: Path, batch_size: int = 1024) -> Iterator[Batch]:
+    """Stream record batches, reading only the four columns we use; one record batch = one inference batch."""
+    pa = _pyarrow()
+    pf = pa.parquet.ParquetFile(path)
+    names = set(pf.schema_arrow.names)
+    if "text" not in names:
+        raise SystemExit(f"{path}: no 'text' column")
+    cols = [c for c in PARQUET_COLUMNS if c in names]
+    for rb in pf.iter_batches(batch_size=batch_size, columns=cols):
+        text = pa.compute.utf8_trim_whitespace(rb.column("text").cast(pa.string()))
+        keep = pa.compute.fill_null(pa.compute.greater(pa.compute.utf8_length(text), 0), False)
+        data = {c: (text if c == "text" else rb.column(c).cast(pa.string())).filter(keep) for c in cols}
+        n = len(data["text"])
+        if not n:
+            continue
+        yield {c: data[c].fill_null("").to_pylist() if c in data else [""] * n for c in PARQUET_COLUMNS}
+
+class ParquetSink:
+    """Per-message scores as a Parquet file, one row group per scored batch."""
+
+    def __init__(self, path: Path, labels: List[str]):
+        self.pa = _pyarrow()
+        self.path, self.labels = Path(path), list(labels)
+        pa = self.pa
+        self.schema = pa.schema(
+            [(c, pa.string()) for c in PARQUET_COLUMNS]
+            + [(f"p_{k}", pa.float32()) for k in self.labels]
+            + [("sarcasm", pa.float32()), ("severity", pa.float32()), ("seriousness", pa.float32()),
+               ("actions", pa.list_(pa.string())), ("redacted", pa.string())])
+        self.writer = pa.parquet.ParquetWriter(str(self.path), self.schema, compression="zstd")
+        self.rows = 0
+
+    def write(self, batch: Batch, probs: List[Dict[str, float]], sarcasm: List[Optional[float]],
+              severity: List[float], seriousness: List[float], actions: List[List[str]], redacted: List[str]):
+        n = len(batch["text"])
+        if not n:
+            return
+        cols = {c: batch[c] for c in PARQUET_COLUMNS}
+        for k in self.labels:
+            cols[f"p_{k}"] = [p.get(k, 0.0) for p in probs]
+        cols.update(sarcasm=sarcasm, severity=severity, seriousness=seriousness, actions=actions, redacted=redacted)
+        self.writer.write_table(self.pa.Table.from_pydict(cols, schema=self.schema))
+        self.rows += n
+
+    def close(self):
+        self.writer.close()
+        print(f"wrote {self.path} ({self.rows} rows)")
+
 def db_init(conn: sqlite3.Connection):
     cur = conn.cursor()
     cur.execute("""CREATE TABLE IF NOT EXISTS messages(
@@ -55,115 +122,291 @@ def db_init(conn: sqlite3.Connection):
         message_id INTEGER, severity REAL, seriousness REAL,
         sarcasm_prob REAL, actions_json TEXT, redacted_text TEXT)""")
     conn.commit()
+    report.ensure_indexes(conn)
 
-def db_insert(conn, msg, probs, sev, ser, p_sar, actions, redacted):
-    cur = conn.cursor()
-    cur.execute("INSERT INTO messages(timestamp,user_id,channel,text) VALUES(?,?,?,?)",
-                (msg["timestamp"], msg["user_id"], msg["channel"], msg["text"]))
-    mid = cur.lastrowid
-    for k,v in probs.items():
-        cur.execute("INSERT INTO predictions(message_id,label,prob) VALUES(?,?,?)", (mid, k, float(v)))
-    cur.execute("INSERT INTO decisions(message_id,severity,seriousness,sarcasm_prob,actions_json,redacted_text) "
-                "VALUES(?,?,?,?,?,?)",
-                (mid, float(sev), float(ser), float(p_sar), json.dumps(actions), redacted))
-    conn.commit()
-    return mid
+def db_insert_batch(conn, batch: Batch, probs, sev, ser, sarcasm, actions, redacted) -> range:
+    """One transaction per scored batch, executemany into all three tables; returns the message ids."""
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")  # no other writer can take ids between reading the sequence and inserting
+    try:
+        last = conn.execute("SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'messages'), 0), "
+                            "COALESCE((SELECT MAX(id) FROM messages), 0))").fetchone()[0]
+        ids = range(last + 1, last + 1 + len(batch["text"]))
+        conn.executemany("INSERT INTO messages(id,timestamp,user_id,channel,text) VALUES(?,?,?,?,?)",
+                         zip(ids, batch["timestamp"], batch["user_id"], batch["channel"], batch["text"]))
+        conn.executemany("INSERT INTO predictions(message_id,label,prob) VALUES(?,?,?)",
+                         ((mid, k, float(v)) for mid, p in zip(ids, probs) for k, v in p.items()))
+        conn.executemany("INSERT INTO decisions(message_id,severity,seriousness,sarcasm_prob,actions_json,redacted_text) "
+                         "VALUES(?,?,?,?,?,?)",
+                         ((mid, float(a), float(b), None if p_s is None else float(p_s), json.dumps(acts), red)
+                          for mid, a, b, p_s, acts, red in zip(ids, sev, ser, sarcasm, actions, redacted)))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return ids
 
-def write_digest(rows: List[Dict]):
+class Digest:
+    """moderation_report.md aggregates, updated batch by batch: counters plus the top escalations
+    and first warnings only, so memory does not grow with the input."""
+
+    def __init__(self, labels: List[str], thresholds: Dict[str, float], top: int = 5, warnings: int = 10):
+        self.labels, self.thresholds, self.top, self.max_warnings = list(labels), thresholds, top, warnings
+        self.total = self.flagged = self.escalated = self.sarcasm_run = 0
+        self.counts = defaultdict(int)
+        self._escalations = []  # min-heap of (seriousness, -seq, row): the `top` most serious, earliest on ties
+        self.warnings = []
+
+    def add(self, batch: Batch, probs, sarcasm, ser, actions, redacted):
+        for i, (p, acts) in enumerate(zip(probs, actions)):
+            self.total += 1
+            self.sarcasm_run += sarcasm[i] is not None
+            self.flagged += any(a in ("warn", "escalate") for a in acts)
+            # counts by top labels
+            for lab, prob in sorted(p.items(), key=lambda kv: -kv[1])[:2]:
+                if prob >= self.thresholds.get(lab, 0.5): self.counts[lab] += 1
+            if "escalate" in acts:
+                self.escalated += 1
+                item = (ser[i], -self.total, (batch["channel"][i], batch["user_id"][i], batch["text"][i],
+                                              p.get("threat", 0), p.get("severe_toxic", 0)))
+                if len(self._escalations) < self.top:
+                    heapq.heappush(self._escalations, item)
+                else:
+                    heapq.heappushpop(self._escalations, item)
+            if "warn" in acts and len(self.warnings) < self.max_warnings:
+                self.warnings.append((batch["user_id"][i], redacted[i]))
+
+    def top_escalations(self):
+        return [(ser, *row) for ser, _, row in sorted(self._escalations, key=lambda x: (-x[0], -x[1]))]
+
+def write_digest(digest: Digest):
     now = dt.datetime.now().strftime("%Y-%m-%d %H:%M")
     path = OUT_DIR / "moderation_report.md"
-    total = len(rows)
-    flagged = sum(1 for r in rows if any(a in ("warn","escalate") for a in r["actions"]))
-    escalated = sum(1 for r in rows if "escalate" in r["actions"])
-
-    # counts by top labels
-    counts = defaultdict(int)
-    for r in rows:
-        for lab, p in sorted(r["probs"].items(), key=lambda kv:-kv[1])[:2]:
-            if p >= r["thresholds"].get(lab,0.5): counts[lab]+=1
 
     lines = []
     lines.append(f"# Moderation Report — {now}")
-    lines.append(f"Total messages: {total}  |  Flagged: {flagged}  |  Escalated: {escalated}\n")
+    lines.append(f"Total messages: {digest.total}  |  Flagged: {digest.flagged}  |  Escalated: {digest.escalated}\n")
 
     lines.append("## Counts by label")
-    for k in r["probs"].keys():
-        lines.append(f"- {k}: {counts.get(k,0)}")
+    for k in (digest.labels if digest.total else []):
+        lines.append(f"- {k}: {digest.counts.get(k,0)}")
     lines.append("")
 
     # top escalations
-    top_escalations = [r for r in rows if "escalate" in r["actions"]]
-    top_escalations.sort(key=lambda x: -x["seriousness"])
-    lines.append("## Escalated (top 5 by seriousness)")
-    for i, r in enumerate(top_escalations[:5], 1):
-        txt = r["text"]
-        lines.append(f"{i}) [{r['channel']}] {r['user_id']} — \"{txt[:100]}\" "
-                     f"(threat={r['probs'].get('threat',0):.2f}, severe={r['probs'].get('severe_toxic',0):.2f}, seriousness={r['seriousness']:.2f})")
+    lines.append(f"## Escalated (top {digest.top} by seriousness)")
+    for i, (ser, ch, uid, txt, threat, severe) in enumerate(digest.top_escalations(), 1):
+        lines.append(f"{i}) [{ch}] {uid} — \"{txt[:100]}\" "
+                     f"(threat={threat:.2f}, severe={severe:.2f}, seriousness={ser:.2f})")
     lines.append("")
 
     # recent warnings (redacted)
-    warns = [r for r in rows if "warn" in r["actions"]]
     lines.append("## Recent warnings (redacted)")
-    for r in warns[:10]:
-        lines.append(f"- {r['user_id']}: \"{r['redacted']}\"")
+    for uid, red in digest.warnings:
+        lines.append(f"- {uid}: \"{red}\"")
     lines.append("")
     path.write_text("\n".join(lines), encoding="utf-8")
     print(f"wrote {path}")
 
+def warm_up(tox: ToxicModel, sar: SarcasmModel, shapes=((1, 16), (1, 64), (8, 32), (8, 128))) -> float:
+    """Push representative (batch, tokens) shapes through both models once."""
+    t0 = time.perf_counter()
+    for batch, tokens in shapes:
+        texts = [" ".join(["warm"] * tokens)] * batch
+        tox.probs_batch(texts)
+        sar.prob_batch(texts)
+    return time.perf_counter() - t0
+
+def sequential_scores(messages: List[Dict], tox: ToxicModel, sar: SarcasmModel,
+                      lazy: bool = False) -> Iterator[Tuple]:
+    """One message at a time: yield (batch of 1, [tox probs], [sarcasm prob or None if lazy], seconds)."""
+    for m in messages:
+        t0 = time.perf_counter()
+        p, p_s = tox.probs(m["text"]), None if lazy else sar.prob(m["text"])
+        yield to_batch([m]), [p], [p_s], time.perf_counter() - t0
+
+def pipelined_scores(batches: Iterable[Batch], tox: ToxicModel, sar: SarcasmModel,
+                     workers: int = 1, depth: int = 4, lazy: bool = False) -> Iterator[Tuple]:
+    """Batched two-stage pipeline: yield (batch, tox probs, sarcasm probs, seconds) in input order.
+
+    Tokenizer worker thread(s) encode whole batches for both models and park
+    the tensors in a bounded queue (depth batches); the calling thread runs
+    the forward passes. Fast tokenizers and torch both release the GIL, so
+    batch n+1 is tokenized while batch n is in the encoder. batches may be a
+    lazy reader (e.g. read_parquet); it is only advanced by the workers.
+    lazy=True skips the sarcasm model here (sarcasm probs are None).
+    """
+    jobs, lock = enumerate(batches), threading.Lock()
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    workers = max(1, workers)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                return ready.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+
+    def tokenize():
+        while not stop.is_set():
+            try:
+                with lock:
+                    job = next(jobs, None)
+                if job is None:
+                    break
+                i, batch = job
+                texts = batch["text"]
+                put((i, batch, tox.encode(texts), None if lazy else sar.encode(texts)))
+            except Exception as e:  # surfaced on the model thread
+                put(e)
+                break
+        put(None)  # this worker is done
+
+    for n in range(workers):
+        threading.Thread(target=tokenize, name=f"tokenize-{n}", daemon=True).start()
+    pending, nxt, finished = {}, 0, 0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            while nxt not in pending:  # workers may finish out of order
+                if finished == workers:
+                    return
+                item = ready.get()
+                if item is None:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    pending[item[0]] = item[1:]
+            batch, x_tox, x_sar = pending.pop(nxt)
+            # seconds = wait for tokens + forward passes
+            sarcasm = [None] * len(batch["text"]) if lazy else sar.forward(x_sar)
+            yield batch, tox.forward(x_tox), sarcasm, time.perf_counter() - t0
+            nxt += 1
+    finally:
+        stop.set()
+
+def score_messages(messages, tox: ToxicModel, sar: SarcasmModel,
+                   conn: sqlite3.Connection, verbose: bool = True,
+                   batch_size: int = 1, tokenizer_workers: int = 1,
+                   sink: Optional[ParquetSink] = None, lazy_sarcasm: bool = False,
+                   on_batch: Optional[Callable[[int, float], None]] = None) -> Digest:
+    """messages: a list of rows, or an iterator of column batches (read_parquet), which is always pipelined.
+
+    Each scored batch goes to the DB (one transaction), the sink and the digest as
+    columns and is then dropped. lazy_sarcasm: run the sarcasm model only for
+    messages where it can change the actions (policy.sarcasm_can_matter); skipped
+    ones keep sarcasm=None. on_batch(n, seconds) is called per scored batch.
+    """
+    # rolling context
+    K = POLICY["context_k"]
+    hist_user = defaultdict(lambda: deque(maxlen=K))
+    hist_chan = defaultdict(lambda: deque(maxlen=K))
+
+    batched = not isinstance(messages, list) or batch_size > 1
+    if not isinstance(messages, list):
+        scored = pipelined_scores(messages, tox, sar, tokenizer_workers, lazy=lazy_sarcasm)
+    elif batch_size > 1:
+        chunks = (to_batch(messages[i:i + batch_size]) for i in range(0, len(messages), batch_size))
+        scored = pipelined_scores(chunks, tox, sar, tokenizer_workers, lazy=lazy_sarcasm)
+    else:
+        scored = sequential_scores(messages, tox, sar, lazy=lazy_sarcasm)
+    digest = Digest(tox.labels, tox.thresholds)
+    for batch, probs, sarcasm, secs in scored:
+        users, chans, n = batch["user_id"], batch["channel"], len(batch["text"])
+        # context only depends on severity (no sarcasm), so it can be taken for the whole batch up front
+        ctx = []
+        for u_id, c_id, p in zip(users, chans, probs):
+            u, c = list(hist_user[u_id]), list(hist_chan[c_id])
+            ctx.append((u, c))
+            sev, _ = compute_seriousness(p, 0.0, u, c)
+            hist_user[u_id].append(sev)
+            hist_chan[c_id].append(sev)
+        if lazy_sarcasm:
+            t0 = time.perf_counter()
+            need = [i for i, (p, (u, c)) in enumerate(zip(probs, ctx)) if sarcasm_can_matter(p, u, c)]
+            for i, p_s in zip(need, sar.prob_batch([batch["text"][i] for i in need])):
+                sarcasm[i] = p_s
+            secs += time.perf_counter() - t0
+        if not digest.total and verbose:
+            print(f"[latency] first {'batch' if batched else 'message'} scored in {secs * 1000:.1f} ms\n")
+        # p_s None: sarcasm was skipped because it cannot change the actions (scored as 0)
+        sev, ser = map(list, zip(*(compute_seriousness(p, p_s or 0.0, u, c)
+                                   for p, p_s, (u, c) in zip(probs, sarcasm, ctx))))
+        actions = [decide(p, x) for p, x in zip(probs, ser)]
+        redacted = [redact_text(t) if "redact" in a else t for t, a in zip(batch["text"], actions)]
+
+        db_insert_batch(conn, batch, probs, sev, ser, sarcasm, actions, redacted)
+        if sink is not None:
+            sink.write(batch, probs, sarcasm, sev, ser, actions, redacted)
+        digest.add(batch, probs, sarcasm, ser, actions, redacted)
+        if on_batch is not None:
+            on_batch(n, secs)
+        if verbose:
+            for i in range(n):
+                _print_decision(batch, i, probs[i], sarcasm[i], sev[i], ser[i], actions[i], tox.thresholds)
+    if lazy_sarcasm and digest.total:
+        skipped = digest.total - digest.sarcasm_run
+        print(f"[sarcasm] lazy: ran on {digest.sarcasm_run}, skipped {skipped} of {digest.total} ({skipped / digest.total:.1%})")
+    return digest
+
+def _print_decision(batch: Batch, i, p, p_s, sev, ser, actions, thresholds):
+    # pretty print small summary
+    tops = ", ".join([f"{k}={v:.2f}{'✓' if v>=thresholds.get(k,0.5) else ''}"
+                      for k,v in sorted(p.items(), key=lambda kv:-kv[1])[:3]])
+    print(f"[{batch['channel'][i]}] {batch['user_id'][i]} — {batch['text'][i]}")
+    print(f"  tox: {tops}")
+    print(f"  sarcasm: {'skipped' if p_s is None else f'{p_s:.2f}'} | severity: {sev:.2f} | seriousness: {ser:.2f} → actions: {actions}\n")
+
 def main():
+    # `run.py report ...` / `run.py replay ...`: work off moderation.db, no rescoring
+    if sys.argv[1:2] == ["report"]:
+        return report.main(sys.argv[2:])
+    if sys.argv[1:2] == ["replay"]:
+        return replay.main(sys.argv[2:])
     ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True, help="path to CSV or NDJSON (.jsonl)")
+    ap.add_argument("--input", required=True, help="path to CSV, NDJSON (.jsonl) or Parquet")
+    ap.add_argument("--out", help="also write per-message scores to this Parquet file")
+    ap.add_argument("--batch-size", type=int, default=1,
+                    help=">1 scores in batches, tokenizing ahead on worker threads (Parquet: rows per record batch, default 256)")
+    ap.add_argument("--tokenizer-workers", type=int, default=1)
+    ap.add_argument("--lazy-sarcasm", action="store_true",
+                    help="skip the sarcasm model where it cannot change the actions (stored as NULL, see replay.py)")
     args = ap.parse_args()
     in_path = Path(args.input)
     assert in_path.exists(), f"not found: {in_path}"
 
     # load data
-    if in_path.suffix.lower() == ".csv":
+    suffix = in_path.suffix.lower()
+    if suffix == ".csv":
         messages = read_csv(in_path)
-    elif in_path.suffix.lower() in (".jsonl", ".ndjson"):
+    elif suffix in (".jsonl", ".ndjson"):
         messages = read_ndjson(in_path)
+    elif suffix in (".parquet", ".pq"):
+        messages = read_parquet(in_path, args.batch_size if args.batch_size > 1 else 256)
     else:
-        raise SystemExit("input must be .csv or .jsonl/.ndjson")
+        raise SystemExit("input must be .csv, .jsonl/.ndjson or .parquet")
+    if args.out:
+        _pyarrow()  # fail before loading the models
 
+    t0 = time.perf_counter()
     tox = ToxicModel()
     sar = SarcasmModel()
-
-    # rolling context
-    K = 5
-    hist_user = defaultdict(lambda: deque(maxlen=K))
-    hist_chan = defaultdict(lambda: deque(maxlen=K))
+    t_load = time.perf_counter() - t0
+    t_warm = warm_up(tox, sar)
+    print(f"[ready] load {t_load:.2f}s | warm-up {t_warm:.2f}s | mem {process_memory()}\n")
 
     conn = sqlite3.connect(DB_PATH)
     db_init(conn)
-
-    results = []
-    for m in messages:
-        p = tox.probs(m["text"])
-        p_s = sar.prob(m["text"])
-        sev, ser = compute_seriousness(p, p_s, list(hist_user[m["user_id"]]), list(hist_chan[m["channel"]]))
-        actions = decide(p, ser)
-        redacted = redact_text(m["text"]) if "redact" in actions else m["text"]
-
-        # update context
-        hist_user[m["user_id"]].append(sev)
-        hist_chan[m["channel"]].append(sev)
-
-        db_insert(conn, m, p, sev, ser, p_s, actions, redacted)
-        result = {
-            "timestamp": m["timestamp"], "user_id": m["user_id"], "channel": m["channel"],
-            "text": m["text"], "probs": p, "sarcasm": p_s, "severity": sev, "seriousness": ser,
-            "actions": actions, "redacted": redacted, "thresholds": tox.thresholds
-        }
-        results.append(result)
-
-        # pretty print small summary
-        tops = ", ".join([f"{k}={v:.2f}{'✓' if v>=tox.thresholds.get(k,0.5) else ''}"
-                          for k,v in sorted(p.items(), key=lambda kv:-kv[1])[:3]])
-        print(f"[{m['channel']}] {m['user_id']} — {m['text']}")
-        print(f"  tox: {tops}")
-        print(f"  sarcasm: {p_s:.2f} | severity: {sev:.2f} | seriousness: {ser:.2f} → actions: {actions}\n")
-
-    write_digest(results)
+    sink = ParquetSink(Path(args.out), tox.labels) if args.out else None
+    try:
+        digest = score_messages(messages, tox, sar, conn, batch_size=args.batch_size,
+                                tokenizer_workers=args.tokenizer_workers, sink=sink, lazy_sarcasm=args.lazy_sarcasm)
+    finally:
+        if sink is not None:
+            sink.close()
+    write_digest(digest)
     conn.close()
 
 if __name__ == "__main__":
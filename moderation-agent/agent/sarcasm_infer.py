@@ -1,8 +1,9 @@
 # BERTweet sarcasm loader (your fully fine-tuned model)
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 import os, torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from weights import load_model
 
 ROOT = Path(__file__).resolve().parents[1]
 SARC_DIR = ROOT / "models" / "sarcasm_berttweet"
@@ -18,10 +19,21 @@ class SarcasmModel:
         path = Path(model_dir) if model_dir else SARC_DIR
         assert path.exists(), f"Missing sarcasm model at {path}"
         self.tok = AutoTokenizer.from_pretrained(str(path), use_fast=True)
-        self.mdl = AutoModelForSequenceClassification.from_pretrained(str(path)).eval().to(_device())
+        self.mdl = load_model("sarcasm", [str(path)],
+                              lambda: AutoModelForSequenceClassification.from_pretrained(str(path))).to(_device())
 
     def prob(self, text: str, max_len: int = 128) -> float:
-        x = self.tok(text, return_tensors="pt", truncation=True, max_length=max_len).to(self.mdl.device)
+        return self.prob_batch([text], max_len)[0]
+
+    def prob_batch(self, texts: List[str], max_len: int = 128) -> List[float]:
+        if not texts:
+            return []
+        return self.forward(self.encode(texts, max_len))
+
+    def encode(self, texts: List[str], max_len: int = 128):
+        return self.tok(texts, return_tensors="pt", truncation=True, max_length=max_len, padding=True)
+
+    def forward(self, x) -> List[float]:
         with torch.no_grad():
-            p = self.mdl(**x).logits[0].softmax(-1).tolist()
-        return float(p[1])  # 1 = sarcasm
+            p = self.mdl(**x.to(self.mdl.device)).logits.softmax(-1)[:, 1].tolist()
+        return [float(v) for v in p]  # 1 = sarcasm
@@ -1,9 +1,10 @@
 # M1-safe toxicity loader (LoRA + head + thresholds)
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 import os, json, numpy as np, torch
 from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
 from peft import PeftModel
+from weights import load_model
 
 ROOT = Path(__file__).resolve().parents[1]
 ADAPTER_DIR = ROOT / "models" / "toxic_lora"
@@ -28,30 +29,45 @@ class ToxicModel:
             except Exception:
                 pass
 
+        self.tok = AutoTokenizer.from_pretrained(str(ADAPTER_DIR), use_fast=True)
+        base_src = str(BASE_DIR if BASE_DIR.exists() else "distilbert-base-uncased")
+        # LoRA + classifier_head.bin are folded into one mmap'd snapshot after the first load
+        self.mdl = load_model("toxic", [base_src, str(ADAPTER_DIR)], lambda: self._build(base_src, labels)).to(_device())
+
+    @staticmethod
+    def _build(base_src: str, labels: List[str]):
         cfg = AutoConfig.from_pretrained(
-            str(BASE_DIR if BASE_DIR.exists() else "distilbert-base-uncased"),
+            base_src,
             num_labels=len(labels),
             id2label={i:k for i,k in enumerate(labels)},
             label2id={k:i for i,k in enumerate(labels)},
             problem_type="multi_label_classification",
         )
-        self.tok = AutoTokenizer.from_pretrained(str(ADAPTER_DIR), use_fast=True)
-        base = AutoModelForSequenceClassification.from_pretrained(
-            str(BASE_DIR if BASE_DIR.exists() else "distilbert-base-uncased"), config=cfg
-        )
+        base = AutoModelForSequenceClassification.from_pretrained(base_src, config=cfg)
         mdl = PeftModel.from_pretrained(base, str(ADAPTER_DIR)).eval()
         head = ADAPTER_DIR / "classifier_head.bin"
         if head.exists():
             sd = torch.load(head, map_location="cpu")
             mdl.base_model.classifier.load_state_dict(sd)
-        self.mdl = mdl.to(_device())
+        return mdl
 
     def probs(self, text: str, max_len: int = 256) -> Dict[str, float]:
-        x = self.tok(text, return_tensors="pt", truncation=True, max_length=max_len).to(self.mdl.device)
+        return self.probs_batch([text], max_len)[0]
+
+    def probs_batch(self, texts: List[str], max_len: int = 256) -> List[Dict[str, float]]:
+        if not texts:
+            return []
+        return self.forward(self.encode(texts, max_len))
+
+    # split so run.py can tokenize on another thread while the model runs
+    def encode(self, texts: List[str], max_len: int = 256):
+        return self.tok(texts, return_tensors="pt", truncation=True, max_length=max_len, padding=True)
+
+    def forward(self, x) -> List[Dict[str, float]]:
         with torch.no_grad():
-            logits = self.mdl(**x).logits[0].float().cpu().numpy()
+            logits = self.mdl(**x.to(self.mdl.device)).logits.float().cpu().numpy()
         p = 1 / (1 + np.exp(-logits))
-        return {k: float(v) for k, v in zip(self.labels, p)}
+        return [{k: float(v) for k, v in zip(self.labels, row)} for row in p]
 
     def flags(self, probs: Dict[str, float]):
         return [k for k, v in probs.items() if v >= self.thresholds.get(k, 0.5)]
@@ -0,0 +1,4 @@
+import os, sys
+
+# the agent uses flat imports (python run.py from moderation-agent/agent); make them importable from anywhere
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent"))
@@ -0,0 +1,54 @@
+import random, sqlite3, sys, types
+
+import pytest
+
+import replay
+from policy import POLICY
+
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+
+class StubToxic:
+    labels, thresholds = LABELS, {}
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def probs(self, text):
+        # coarse steps put many seriousness values exactly on warn/escalate, where drift would flip them
+        return {k: self.rng.choice((0.0, 0.1, 0.3, 0.5, 0.7, 0.9)) * (k not in ("threat", "severe_toxic")) for k in LABELS}
+
+
+class StubSarcasm:
+    def prob(self, text):
+        return 0.2
+
+
+@pytest.fixture
+def run(monkeypatch):
+    # run.py imports the torch model loaders at module level; the scoring loop itself needs no model
+    monkeypatch.setitem(sys.modules, "toxicity_infer", types.SimpleNamespace(ToxicModel=StubToxic))
+    monkeypatch.setitem(sys.modules, "sarcasm_infer", types.SimpleNamespace(SarcasmModel=StubSarcasm))
+    monkeypatch.delitem(sys.modules, "run", raising=False)
+    import run
+    return run
+
+
+def test_replaying_the_recorded_policy_changes_nothing(run):
+    rng = random.Random(1)
+    messages = [{"timestamp": f"2025-09-01T00:00:{i:08d}Z", "user_id": f"u{rng.randrange(3)}",
+                 "channel": f"c{rng.randrange(2)}", "text": "x"} for i in range(20000)]
+    conn = sqlite3.connect(":memory:")
+    run.db_init(conn)
+    run.score_messages(messages, StubToxic(), StubSarcasm(), conn, verbose=False)
+
+    scores = replay.StoredScores(conn)
+    assert len(scores) == len(messages)
+    assert replay.diff(scores.recorded, scores.decide(POLICY))["changed"] == 0
+
+
+def test_overrides_reject_unknown_keys():
+    assert replay.with_overrides(POLICY, {"severity_weights.threat": 2})["severity_weights"]["threat"] == 2
+    for key in ("warnn", "severity_weights.thraet", "warn.threat", "severity_weights"):
+        with pytest.raises(SystemExit, match="unknown policy key"):
+            replay.with_overrides(POLICY, {key: 2})
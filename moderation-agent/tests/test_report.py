@@ -0,0 +1,28 @@
+import sqlite3
+
+import report
+
+
+def _db(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE messages(id INTEGER PRIMARY KEY, timestamp TEXT, user_id TEXT, channel TEXT, text TEXT)")
+    conn.execute("CREATE TABLE predictions(message_id INTEGER, label TEXT, prob REAL)")
+    conn.execute("CREATE TABLE decisions(message_id INTEGER, severity REAL, seriousness REAL, sarcasm_prob REAL, "
+                 "actions_json TEXT, redacted_text TEXT)")
+    report.ensure_indexes(conn)
+    for mid, probs in enumerate(rows, 1):
+        conn.execute("INSERT INTO messages VALUES(?, '2025-09-01T00:00:00Z', 'u', 'c', 't')", (mid,))
+        conn.executemany("INSERT INTO predictions VALUES(?, ?, ?)", ((mid, k, v) for k, v in probs.items()))
+    return conn
+
+
+def test_label_counts_take_exactly_two_labels_on_ties():
+    rows = [{"toxic": 0.9, "insult": 0.7, "obscene": 0.7, "threat": 0.7},
+            {"toxic": 0.8, "insult": 0.8, "obscene": 0.8, "threat": 0.1},
+            {"toxic": 0.6, "insult": 0.95, "obscene": 0.2, "threat": 0.55}]
+    expected = {}
+    for p in rows:  # run.Digest: stable sort by prob, top 2, over threshold (0.5 default)
+        for lab, prob in sorted(p.items(), key=lambda kv: -kv[1])[:2]:
+            if prob >= 0.5:
+                expected[lab] = expected.get(lab, 0) + 1
+    assert report.label_counts(_db(rows), "", [], {}) == expected == {"toxic": 3, "insult": 3}
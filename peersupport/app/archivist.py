@@ -1,8 +1,10 @@
 from __future__ import annotations
 import os, datetime as dt
+from collections import Counter
 from sqlalchemy import select, func
-from .db import SessionLocal, Incident, ReportMeta
+from .db import SessionLocal, Incident, IncidentRollup, ReportMeta, UserRollup
 from .utils_time import now_local
+from . import metrics
 
 OUT_DIR = os.path.join(os.getcwd(), "outputs")
 os.makedirs(OUT_DIR, exist_ok=True)
@@ -17,6 +19,7 @@ def _sparkline(counts):
     return "".join(glyphs[int(c/m*(len(glyphs)-1))] for c in counts)
 
 
+@metrics.timed("archivist_seconds", op="channel_report")
 def generate_report_for_channel(channel_id: str) -> str:
     with SessionLocal() as s:
         meta = s.execute(select(ReportMeta).where(ReportMeta.channel_id == channel_id)).scalar_one_or_none()
@@ -27,19 +30,29 @@ def generate_report_for_channel(channel_id: str) -> str:
         incidents = s.execute(
             select(Incident).where(Incident.channel_id == channel_id, Incident.created_at > since).order_by(Incident.created_at)
         ).scalars().all()
-        if not incidents:
+        # incidents app.retention already moved out of the live table (hourly, no excerpts); an
+        # archived hour that straddles `since` is left out rather than counted twice
+        archived = s.execute(
+            select(IncidentRollup.hour, IncidentRollup.action, IncidentRollup.incidents)
+            .where(IncidentRollup.channel_id == channel_id, IncidentRollup.hour > since).order_by(IncidentRollup.hour)
+        ).all()
+        if not incidents and not archived:
             return ""
 
-        serious = [i for i in incidents if i.action == "serious"]
-        crisis = [i for i in incidents if i.action == "crisis"]
-        total = len(incidents)
+        counts = Counter(i.action for i in incidents)
+        for _, action, n in archived:
+            counts[action] += n
+        total = sum(counts.values())
 
         # Hourly buckets (UTC)
         buckets = [0]*24
         for i in incidents:
             buckets[i.created_at.hour] += 1
+        for hour, _, n in archived:
+            buckets[hour.hour] += n
 
-        start = incidents[0].created_at; end = incidents[-1].created_at
+        times = [i.created_at for i in incidents] + [hour for hour, _, _ in archived]
+        start = min(times); end = max(times)
         title = f"report_{channel_id}_{end.strftime('%Y%m%d_%H%M')}.md"
         path = os.path.join(OUT_DIR, title)
 
@@ -48,7 +61,9 @@ def generate_report_for_channel(channel_id: str) -> str:
         lines.append(f"**Channel:** {channel_id}\n")
         lines.append(f"**Window (UTC):** {start} → {end}\n")
         lines.append(f"**Generated (local):** {now_local()}\n\n")
-        lines.append(f"**Incidents:** {total}  |  **Serious DMs:** {len(serious)}  |  **Crisis DMs:** {len(crisis)}\n")
+        lines.append(f"**Incidents:** {total}  |  **Serious DMs:** {counts['serious']}  |  **Crisis DMs:** {counts['crisis']}\n")
+        if archived:
+            lines.append(f"**Archived (counted, no excerpts):** {sum(n for _, _, n in archived)}\n")
         lines.append(f"**Hourly trend:** {_sparkline(buckets)}\n")
         lines.append("\n---\n\n## Notable Incidents (anonymized)\n")
         for i in incidents[:10]:
@@ -68,6 +83,7 @@ def generate_report_for_channel(channel_id: str) -> str:
         return path
 
 
+@metrics.timed("archivist_seconds", op="bump_rolling")
 def bump_and_maybe_rolling_report(channel_id: str) -> str:
     with SessionLocal() as s:
         meta = s.execute(select(ReportMeta).where(ReportMeta.channel_id == channel_id)).scalar_one_or_none()
@@ -81,22 +97,35 @@ def bump_and_maybe_rolling_report(channel_id: str) -> str:
 
 # Special per-user report for moderators
 
+@metrics.timed("archivist_seconds", op="user_report")
 def generate_user_report(user_id_hash: str) -> str:
     with SessionLocal() as s:
         incidents = s.execute(
             select(Incident).where(Incident.user_id_hash == user_id_hash).order_by(Incident.created_at)
         ).scalars().all()
-    if not incidents:
+        # incidents app.retention already moved out of the live table (monthly, no excerpts)
+        archived = s.execute(
+            select(UserRollup.month, UserRollup.action, UserRollup.incidents, UserRollup.seriousness_max)
+            .where(UserRollup.user_id_hash == user_id_hash).order_by(UserRollup.month, UserRollup.action)
+        ).all()
+    if not incidents and not archived:
         return ""
-    start = incidents[0].created_at; end = incidents[-1].created_at
+    end = incidents[-1].created_at if incidents else dt.datetime.strptime(archived[-1].month, "%Y-%m")
+    start = archived[0].month if archived else incidents[0].created_at
     title = f"user_report_{user_id_hash}_{end.strftime('%Y%m%d_%H%M')}.md"
     path = os.path.join(OUT_DIR, title)
     lines = [
         f"# User Special Report\n",
         f"**User (anon):** {user_id_hash}\n",
         f"**Window (UTC):** {start} → {end}\n\n",
-        "## Violations\n",
     ]
+    if archived:
+        lines.append("## Archived violations (counts only)\n")
+        for month, action, n, ser_max in archived:
+            if action in {"serious","crisis"}:
+                lines.append(f"- {month} — action={action} — {n} incident(s), max ser={ser_max:.2f}\n")
+        lines.append("")
+    lines.append("## Violations\n")
     for i in incidents:
         if i.action in {"serious","crisis"}:
             excerpt = i.text_excerpt.replace("\n"," ")[:200]
@@ -0,0 +1,254 @@
+from __future__ import annotations
+import argparse, asyncio, csv, datetime as dt, json, os, time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, insert
+from .db import SessionLocal, Incident, BackfillCheckpoint
+from .policy import anon_user_id, crisis_match, seriousness_score, triage_action
+from . import metrics, models, user_state
+
+# Channel history backfill: review messages posted while the bot was offline.
+#
+# Pages through a channel oldest-first, starting after the channel's
+# checkpoint (or `since`), up to `until` (default: now, so live on_message
+# traffic is not scanned twice). Each page is scored in one batch per model
+# (models.score_batch), decided like the live pipeline (lexicon -> triage, no
+# LLM reply) and written in one transaction: Incident rows and the new
+# checkpoint together, so an interrupted run resumes exactly where it stopped.
+# Violation counts then go through app.user_state's cache (journaled at once,
+# flushed per page), so the live bot's warnings and repeat-offender lane see
+# them straight away.
+# Throttling: BACKFILL_PAUSE_S between pages, and no new page while `busy()`
+# (e.g. live messages waiting in ingress) says so.
+#
+#   python -m app.backfill --fake chat.jsonl --days 0              # offline, corpus.py output
+#   python -m app.backfill --channel 123456789012345678 --days 7   # Discord REST, DISCORD_BOT_TOKEN
+
+BACKFILL_DAYS = int(os.getenv("BACKFILL_DAYS", 14))
+BACKFILL_PAGE = int(os.getenv("BACKFILL_PAGE", 100))  # Discord returns at most 100 per history request
+BACKFILL_PAUSE_S = float(os.getenv("BACKFILL_PAUSE_S", 0.5))
+
+ScoreFn = Callable[[List[str]], List[Tuple[float, Dict[str, float]]]]
+
+
+@dataclass
+class HistoryMessage:
+    id: int
+    author_id: str
+    text: str
+    created_at: dt.datetime  # naive UTC, like Incident.created_at
+    bot: bool = False
+    raw: object = None  # discord.Message, for redaction
+
+
+class DiscordHistory:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def page(self, channel_id: str, after: Optional[int], since: Optional[dt.datetime],
+                   until: dt.datetime, limit: int) -> List[HistoryMessage]:
+        import discord
+        start = max(after or 0, discord.utils.time_snowflake(since.replace(tzinfo=dt.timezone.utc)) if since else 0)
+        out = []
+        async for m in self.channel.history(limit=limit, after=discord.Object(id=start) if start else None,
+                                            before=until.replace(tzinfo=dt.timezone.utc), oldest_first=True):
+            out.append(HistoryMessage(m.id, str(m.author.id), m.content or "",
+                                      m.created_at.astimezone(dt.timezone.utc).replace(tzinfo=None), m.author.bot, m))
+        return out
+
+
+class FakeHistory:
+    """Local history source: corpus.py rows (timestamp, user_id, channel, text), ids in time order."""
+
+    def __init__(self, rows: Iterable[dict], latency: float = 0.0):
+        self.latency = latency
+        self._by_channel: Dict[str, List[HistoryMessage]] = defaultdict(list)
+        rows = sorted(rows, key=lambda r: r["timestamp"])
+        for i, r in enumerate(rows, 1):
+            ts = dt.datetime.fromisoformat(r["timestamp"].replace("Z", "+00:00")).replace(tzinfo=None)
+            self._by_channel[str(r["channel"])].append(HistoryMessage(i, str(r["user_id"]), r["text"], ts))
+
+    @classmethod
+    def load(cls, path: str, **kw) -> "FakeHistory":
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f)) if path.endswith(".csv") else [json.loads(l) for l in f if l.strip()]
+        return cls(rows, **kw)
+
+    @property
+    def channels(self) -> List[str]:
+        return sorted(self._by_channel)
+
+    async def page(self, channel_id: str, after: Optional[int], since: Optional[dt.datetime],
+                   until: dt.datetime, limit: int) -> List[HistoryMessage]:
+        await asyncio.sleep(self.latency)  # stands in for the API round trip
+        out = []
+        for m in self._by_channel.get(channel_id, ()):
+            if (after and m.id <= after) or (since and m.created_at < since):
+                continue
+            if m.created_at >= until or len(out) == limit:
+                break
+            out.append(m)
+        return out
+
+
+def decide(texts: List[str], score_fn: ScoreFn) -> List[Tuple[str, float, float, float]]:
+    """(action, seriousness, tox_max, sarcasm) per text; crisis-lexicon hits skip the models like node_lexicon."""
+    out: List[Optional[Tuple[str, float, float, float]]] = [None] * len(texts)
+    todo = []
+    for i, t in enumerate(texts):
+        if crisis_match(t):
+            out[i] = ("crisis", 1.0, 0.0, 0.0)
+        else:
+            todo.append(i)
+    if todo:
+        for i, (sarcasm, tox) in zip(todo, score_fn([texts[i] for i in todo])):
+            tox_max = max(tox.values()) if tox else 0.0
+            ser = seriousness_score(tox_max, sarcasm)
+            out[i] = (triage_action(ser, tox_max, sarcasm), ser, tox_max, sarcasm)
+    return out
+
+
+def _checkpoint(s, channel_id: str) -> BackfillCheckpoint:
+    cp = s.execute(select(BackfillCheckpoint).where(BackfillCheckpoint.channel_id == channel_id)).scalar_one_or_none()
+    if cp is None:
+        cp = BackfillCheckpoint(channel_id=channel_id, last_message_id="", scanned=0, flagged=0)
+        s.add(cp)
+    return cp
+
+
+def _write_page(channel_id: str, page: List[HistoryMessage],
+                flagged: List[Tuple[HistoryMessage, tuple]]) -> List[Tuple[HistoryMessage, tuple]]:
+    """Incidents + checkpoint in one transaction, then violation counts via user_state; returns the flagged
+    messages actually inserted (not the ones already handled live or by an earlier run)."""
+    with metrics.timer("db_seconds", op="backfill_page"), SessionLocal() as s:
+        ids = [str(m.id) for m, _ in flagged]
+        seen = set(s.execute(select(Incident.message_id).where(
+            Incident.channel_id == channel_id, Incident.message_id.in_(ids))).scalars()) if ids else set()
+        rows, new, per_user = [], [], Counter()
+        for m, (action, ser, tox_max, sarcasm) in flagged:
+            if str(m.id) in seen:  # already handled live (or by an earlier run)
+                continue
+            new.append((m, (action, ser, tox_max, sarcasm)))
+            user_hash = anon_user_id(m.author_id)
+            per_user[user_hash] += 1
+            rows.append(dict(platform="discord", channel_id=channel_id, user_id_hash=user_hash, message_id=str(m.id),
+                             text_excerpt=m.text[:240], sarcasm=sarcasm, tox_max=tox_max, seriousness=ser,
+                             action=action, reply="", created_at=m.created_at))
+        if rows:
+            s.execute(insert(Incident), rows)
+        cp = _checkpoint(s, channel_id)
+        cp.last_message_id = str(page[-1].id)
+        cp.scanned += len(page)
+        cp.flagged += len(rows)
+        cp.updated_at = dt.datetime.utcnow()
+        s.commit()
+    for user_hash, n in per_user.items():
+        user_state.cache.record_violation(user_hash, n)
+    if per_user:
+        user_state.cache.flush()
+    return new
+
+
+async def backfill_channel(source, channel_id: str, since: Optional[dt.datetime] = None,
+                           until: Optional[dt.datetime] = None, score_fn: ScoreFn = models.score_batch,
+                           page: int = BACKFILL_PAGE, pause: float = BACKFILL_PAUSE_S,
+                           busy: Optional[Callable[[], bool]] = None,
+                           on_flagged: Optional[Callable[[List[HistoryMessage]], None]] = None) -> dict:
+    until = until or dt.datetime.utcnow()
+    with SessionLocal() as s:
+        cp = _checkpoint(s, channel_id)
+        after = int(cp.last_message_id) if cp.last_message_id else None
+    stats = {"channel": channel_id, "resumed_after": after, "pages": 0, "scanned": 0, "incidents": 0,
+             "actions": Counter(), "already_handled": 0, "busy_waits": 0, "score_seconds": 0.0}
+    t_start = time.perf_counter()
+    while True:
+        while busy is not None and busy():
+            stats["busy_waits"] += 1
+            await asyncio.sleep(pause or 0.1)
+        msgs = await source.page(channel_id, after, since, until, page)
+        if not msgs:
+            break
+        after = msgs[-1].id
+        todo = [m for m in msgs if not m.bot and m.text]
+        t0 = time.perf_counter()
+        decisions = await asyncio.to_thread(decide, [m.text for m in todo], score_fn)
+        stats["score_seconds"] += time.perf_counter() - t0
+        flagged = [(m, d) for m, d in zip(todo, decisions) if d[0] != "none"]
+        new = await asyncio.to_thread(_write_page, channel_id, msgs, flagged)
+        stats["incidents"] += len(new)
+        stats["already_handled"] += len(flagged) - len(new)
+        stats["pages"] += 1
+        stats["scanned"] += len(msgs)
+        stats["actions"]["none"] += len(decisions) - len(flagged)
+        stats["actions"].update(d[0] for _, d in new)
+        metrics.inc("backfill_messages_total", len(msgs))
+        if on_flagged is not None and new:  # only what this run inserted; the rest was acted on already
+            on_flagged([m for m, _ in new])
+        if pause:
+            await asyncio.sleep(pause)  # leave room for live traffic and the API rate limits
+    stats["seconds"] = time.perf_counter() - t_start
+    stats["msgs_per_s"] = stats["scanned"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["actions"] = dict(stats["actions"])
+    print(f"[BACKFILL] {channel_id}: {stats['scanned']} scanned, {stats['incidents']} incident(s) "
+          f"in {stats['seconds']:.1f}s ({stats['msgs_per_s']:.0f} msg/s)")
+    return stats
+
+
+def reset_checkpoint(channel_id: str):
+    with SessionLocal() as s:
+        cp = s.execute(select(BackfillCheckpoint).where(BackfillCheckpoint.channel_id == channel_id)).scalar_one_or_none()
+        if cp is not None:
+            s.delete(cp); s.commit()
+
+
+async def _run_discord(args, since, until) -> List[dict]:
+    import discord
+    client = discord.Client(intents=discord.Intents.none())
+    await client.login(os.getenv("DISCORD_BOT_TOKEN", ""))  # REST only, no gateway connection
+    try:
+        out = []
+        for cid in args.channel:
+            channel = await client.fetch_channel(int(cid))
+            out.append(await backfill_channel(DiscordHistory(channel), str(channel.id), since, until,
+                                              page=min(args.page, 100), pause=args.pause))
+        return out
+    finally:
+        await client.close()
+
+
+async def _run_fake(args, since, until) -> List[dict]:
+    source = FakeHistory.load(args.fake)
+    return [await backfill_channel(source, ch, since, until, page=args.page, pause=args.pause)
+            for ch in (args.channel or source.channels)]
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m app.backfill")
+    ap.add_argument("--channel", action="append", default=[], help="repeatable; with --fake, all channels if omitted")
+    ap.add_argument("--fake", metavar="PATH", help="corpus.py CSV/JSONL instead of Discord")
+    ap.add_argument("--days", type=int, default=BACKFILL_DAYS, help="how far back to scan; 0 = everything")
+    ap.add_argument("--page", type=int, default=BACKFILL_PAGE)
+    ap.add_argument("--pause", type=float, default=0.0, help="seconds between pages (nothing live to protect offline)")
+    ap.add_argument("--reset", action="store_true", help="forget the checkpoints and rescan")
+    args = ap.parse_args()
+    if not args.fake and not args.channel:
+        ap.error("give --channel (Discord) or --fake PATH")
+    from dotenv import load_dotenv
+    from .db import init_db
+    load_dotenv()
+    init_db()
+    # own journal: a bot running next to this CLI keeps using user_state.journal
+    user_state.cache = user_state.UserStateCache(os.path.join(os.getcwd(), "user_state.backfill.journal"))
+    until = dt.datetime.utcnow()
+    since = until - dt.timedelta(days=args.days) if args.days > 0 else None
+    if args.reset:
+        for ch in args.channel or FakeHistory.load(args.fake).channels:
+            reset_checkpoint(ch)
+    print(f"[BACKFILL] Models {models.load_all()}")
+    out = asyncio.run(_run_fake(args, since, until) if args.fake else _run_discord(args, since, until))
+    print(json.dumps(out, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,30 @@
 from __future__ import annotations
 import os, datetime as dt
-from sqlalchemy import create_engine, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, text, Integer, String, Float, DateTime, Text, Boolean, UniqueConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, Mapped, mapped_column
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///peersupport.db")
 engine = create_engine(DB_URL, echo=False, future=True)
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        # must come before journal_mode=WAL, which writes the header of a fresh file; on an
+        # existing file it only takes effect at the next full VACUUM (see app.retention)
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL: report scans and retention batches don't block hot-path inserts
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.close()
 Base = declarative_base()
 
 class Incident(Base):
     __tablename__ = "incidents"
+    # AUTOINCREMENT: once app.retention empties the table SQLite would hand out old rowids again
+    __table_args__ = {"sqlite_autoincrement": True}
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     platform: Mapped[str] = mapped_column(String(16), default="discord")
     channel_id: Mapped[str] = mapped_column(String(64))
@@ -36,6 +51,47 @@ class Cooldown(Base):
     user_id_hash: Mapped[str] = mapped_column(String(32), unique=True)
     last_dm_at: Mapped[dt.datetime] = mapped_column(DateTime, default=lambda: dt.datetime.fromtimestamp(0))
 
+class IncidentRollup(Base):
+    # hourly aggregates of incidents that app.retention archived out of the live table
+    __tablename__ = "incident_rollups"
+    __table_args__ = (UniqueConstraint("hour", "channel_id", "action"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    hour: Mapped[dt.datetime] = mapped_column(DateTime)  # UTC, truncated to the hour
+    channel_id: Mapped[str] = mapped_column(String(64))
+    action: Mapped[str] = mapped_column(String(16))
+    incidents: Mapped[int] = mapped_column(Integer, default=0)
+    seriousness_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    seriousness_max: Mapped[float] = mapped_column(Float, default=0.0)
+    tox_max_sum: Mapped[float] = mapped_column(Float, default=0.0)
+
+class UserRollup(Base):
+    # monthly per-user counts of archived incidents, for app.archivist's user reports
+    __tablename__ = "user_rollups"
+    __table_args__ = (UniqueConstraint("month", "user_id_hash", "action"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM (UTC)
+    user_id_hash: Mapped[str] = mapped_column(String(32))
+    action: Mapped[str] = mapped_column(String(16))
+    incidents: Mapped[int] = mapped_column(Integer, default=0)
+    seriousness_max: Mapped[float] = mapped_column(Float, default=0.0)
+
+class BackfillCheckpoint(Base):
+    # app.backfill resumes each channel after last_message_id (oldest-first scan)
+    __tablename__ = "backfill_checkpoints"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    channel_id: Mapped[str] = mapped_column(String(64), unique=True)
+    last_message_id: Mapped[str] = mapped_column(String(64), default="")
+    scanned: Mapped[int] = mapped_column(Integer, default=0)
+    flagged: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, default=lambda: dt.datetime.utcnow())
+
+class StateJournalMark(Base):
+    # per app.user_state journal (one per bot process): highest sequence number already applied
+    # to user_stats / cooldowns
+    __tablename__ = "state_journal_mark"
+    journal: Mapped[str] = mapped_column(String(128), primary_key=True)
+    last_seq: Mapped[int] = mapped_column(Integer, default=0)
+
 class UserStats(Base):
     __tablename__ = "user_stats"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -44,5 +100,17 @@ class UserStats(Base):
     warned: Mapped[bool] = mapped_column(Boolean, default=False)
 
 
+# create_all skips tables that already exist, so indexes are added explicitly
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_incidents_channel_created ON incidents(channel_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_incidents_created ON incidents(created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_incidents_user ON incidents(user_id_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_incident_rollups_channel_hour ON incident_rollups(channel_id, hour)",
+    "CREATE INDEX IF NOT EXISTS ix_user_rollups_user ON user_rollups(user_id_hash)",
+)
+
 def init_db():
     Base.metadata.create_all(engine)
+    with engine.begin() as c:
+        for stmt in INDEXES:
+            c.execute(text(stmt))
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import collections, itertools, os, random, re, threading, time, zlib
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+from . import metrics
+from .policy import crisis_match
+
+# Near-duplicate index for spam waves (MinHash + LSH over a sliding window).
+#
+# Raids post many small variants of one message (emoji, repeated letters,
+# swapped mentions). Each message is normalised, cut into character shingles
+# and MinHashed; LSH bands map it to recent clusters in the same guild. A
+# message whose estimated Jaccard similarity to a cluster's representative is
+# >= DEDUP_THRESHOLD joins that cluster and reuses the representative's
+# pipeline result (scores, action, reply), so only representatives pay for
+# inference and the LLM reply. Followers that arrive while the representative
+# is still being scored wait for it (up to DEDUP_WAIT_S).
+#
+# Memory is bounded: at most DEDUP_MAX_CLUSTERS clusters in total (LRU), each
+# dropped once unseen for DEDUP_WINDOW_S. Crisis-lexicon hits and very short
+# messages always go through the full pipeline.
+# False merges are measurable: DEDUP_AUDIT_RATE of followers are also scored
+# in full and the action compared (stats()["false_merge_rate"]).
+# verdict() lets the ingress cheap path reuse a finished cluster result for a
+# shed message without registering it.
+
+DEDUP = os.getenv("DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.6))
+DEDUP_WINDOW_S = float(os.getenv("DEDUP_WINDOW_S", 600))
+DEDUP_MAX_CLUSTERS = int(os.getenv("DEDUP_MAX_CLUSTERS", 10000))
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", 12))
+DEDUP_WAIT_S = float(os.getenv("DEDUP_WAIT_S", 10))
+DEDUP_AUDIT_RATE = float(os.getenv("DEDUP_AUDIT_RATE", 0.02))
+
+NUM_PERM, BANDS = 64, 16  # 16 bands x 4 rows: pairs at Jaccard 0.6 collide in >= 1 band ~89% of the time
+SHINGLE = 4
+REUSED = ("sarcasm", "tox_max", "seriousness", "action", "reply")
+
+_P = (1 << 31) - 1  # Mersenne prime; (a * x + b) stays inside uint64
+_rng = np.random.default_rng(1234)
+_A = _rng.integers(1, _P, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _P, NUM_PERM, dtype=np.uint64)
+
+_MARKUP = re.compile(r"<a?:\w+:\d+>|<[@#][!&]?\d+>|@everyone|@here")  # custom emoji, mentions
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATS = re.compile(r"(.)\1{2,}")  # "idiooooot" -> "idiot"
+
+
+def normalize(text: str) -> str:
+    text = _MARKUP.sub(" ", text.casefold())
+    return " ".join(_REPEATS.sub(r"\1", _NON_WORD.sub(" ", text)).split())
+
+
+def shingles(norm: str) -> List[str]:
+    return [norm[i:i + SHINGLE] for i in range(max(1, len(norm) - SHINGLE + 1))]
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature (NUM_PERM uint32), or None when the message is too short to dedupe safely."""
+    norm = normalize(text)
+    if len(norm) < DEDUP_MIN_CHARS:
+        return None
+    x = np.fromiter({zlib.crc32(s.encode()) & _P for s in shingles(norm)}, np.uint64)
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _P).min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _band_keys(guild: str, sig: np.ndarray) -> List[Tuple[str, int, int]]:
+    rows = NUM_PERM // BANDS
+    return [(guild, b, hash(sig[b * rows:(b + 1) * rows].tobytes())) for b in range(BANDS)]
+
+
+class Cluster:
+    __slots__ = ("id", "guild", "sig", "keys", "result", "size", "last_seen")
+
+    def __init__(self, cid: int, guild: str, sig: np.ndarray, keys, now: float):
+        self.id, self.guild, self.sig, self.keys = cid, guild, sig, keys
+        self.result: Future = Future()
+        self.size, self.last_seen = 1, now
+
+
+class SpamWaves:
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, window_s: float = DEDUP_WINDOW_S,
+                 max_clusters: int = DEDUP_MAX_CLUSTERS, wait_s: float = DEDUP_WAIT_S,
+                 audit_rate: float = DEDUP_AUDIT_RATE, clock: Callable[[], float] = time.monotonic):
+        self.threshold, self.window_s, self.max_clusters = threshold, window_s, max_clusters
+        self.wait_s, self.audit_rate, self.clock = wait_s, audit_rate, clock
+        self._clusters: "collections.OrderedDict[int, Cluster]" = collections.OrderedDict()  # LRU by last_seen
+        self._buckets: Dict[Tuple[str, int, int], int] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self.counts = collections.Counter()
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def _evict(self, now: float):
+        while self._clusters:
+            c = next(iter(self._clusters.values()))
+            if len(self._clusters) <= self.max_clusters and now - c.last_seen <= self.window_s:
+                break
+            self._drop(c)
+            self.counts["evicted"] += 1
+
+    def _drop(self, c: Cluster):
+        self._clusters.pop(c.id, None)
+        for k in c.keys:
+            if self._buckets.get(k) == c.id:
+                del self._buckets[k]
+
+    def assign(self, guild: str, sig: np.ndarray) -> Tuple[Cluster, bool]:
+        """(cluster, is_new): the best matching recent cluster in this guild, or a new one led by this message."""
+        keys = _band_keys(guild, sig)
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            best, best_sim = None, self.threshold
+            for cid in {self._buckets[k] for k in keys if k in self._buckets}:
+                c = self._clusters[cid]
+                sim = similarity(sig, c.sig)
+                if sim >= best_sim:
+                    best, best_sim = c, sim
+            if best is not None:
+                best.size += 1
+                best.last_seen = now
+                self._clusters.move_to_end(best.id)
+                return best, False
+            c = Cluster(next(self._ids), guild, sig, keys, now)
+            self._clusters[c.id] = c
+            for k in keys:
+                self._buckets[k] = c.id  # newest cluster wins a shared bucket
+            self._evict(now)
+            return c, True
+
+    def run(self, guild: str, state: dict, fn: Callable[[dict], dict]) -> dict:
+        """fn(state) for cluster representatives; a copy of the representative's result for followers."""
+        sig = None if crisis_match(state["text"]) else signature(state["text"])
+        if sig is None:
+            return self._count("bypass", fn(state))
+        cluster, is_new = self.assign(guild, sig)
+        if is_new:
+            try:
+                res = fn(state)
+            except BaseException as e:
+                cluster.result.set_exception(e)
+                with self._lock:
+                    self._drop(cluster)
+                raise
+            cluster.result.set_result({k: res.get(k) for k in REUSED})
+            return self._count("new", res)
+        try:
+            rep = cluster.result.result(timeout=self.wait_s)
+        except Exception:
+            return self._count("fallback", fn(state))
+        out = {**state, **rep, "dup_of": cluster.id}
+        if self.audit_rate and self._rng.random() < self.audit_rate:
+            full = fn(state)
+            outcome = "match" if full["action"] == rep["action"] else "mismatch"
+            self.counts[f"audit_{outcome}"] += 1
+            metrics.inc("dedup_audit_total", outcome=outcome)
+            return self._count("hit", {**full, "dup_of": cluster.id})
+        return self._count("hit", out)
+
+    def verdict(self, guild: str, text: str) -> Optional[dict]:
+        """A finished representative result for text, without joining the cluster or waiting (ingress cheap path)."""
+        sig = None if crisis_match(text) else signature(text)
+        if sig is None:
+            return None
+        now = self.clock()
+        with self._lock:
+            best, best_sim = None, self.threshold
+            for cid in {self._buckets[k] for k in _band_keys(guild, sig) if k in self._buckets}:
+                c = self._clusters.get(cid)
+                if c is None or now - c.last_seen > self.window_s or not c.result.done() or c.result.exception():
+                    continue
+                sim = similarity(sig, c.sig)
+                if sim >= best_sim:
+                    best, best_sim = c, sim
+        if best is None:
+            return None
+        self.counts["verdict"] += 1
+        metrics.inc("dedup_messages_total", outcome="verdict")
+        return {**best.result.result(), "dup_of": best.id}
+
+    def _count(self, outcome: str, res: dict) -> dict:
+        self.counts[outcome] += 1
+        metrics.inc("dedup_messages_total", outcome=outcome)
+        metrics.set_gauge("dedup_clusters", len(self._clusters))
+        return res
+
+    def stats(self) -> dict:
+        c = self.counts
+        audited = c["audit_match"] + c["audit_mismatch"]
+        seen = c["new"] + c["hit"] + c["fallback"] + c["bypass"]
+        return {
+            "messages": seen, "clusters": len(self._clusters), "buckets": len(self._buckets),
+            **{k: c[k] for k in ("new", "hit", "fallback", "bypass", "evicted", "verdict")},
+            "inference_skipped": (c["hit"] - audited) / seen if seen else 0.0,
+            "audited": audited,
+            "false_merge_rate": c["audit_mismatch"] / audited if audited else None,
+        }
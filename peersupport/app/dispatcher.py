@@ -0,0 +1,331 @@
+from __future__ import annotations
+import asyncio, contextlib, datetime, heapq, itertools, random, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+
+# Outbound action queue for redactions, DMs and channel notices.
+#
+# on_message only enqueues; per-route workers do the HTTP calls. Routes mirror
+# Discord's rate-limit buckets (deletes per channel, DMs per user, sends per
+# channel). Each route has its own token bucket, which server hints (429
+# retry_after / remaining+reset) override. A shared pool of in-flight slots
+# is handed out by priority, so crisis DMs go first during a raid. Work is
+# collapsed where Discord allows it: pending deletes in one channel become
+# one bulk delete, and pending same-priority DMs/notices to one target are
+# joined into one message.
+
+PRIORITY_CRISIS, PRIORITY_REDACT, PRIORITY_DM, PRIORITY_NOTICE = 0, 1, 2, 3
+
+MAX_BULK_DELETE = 100      # Discord bulk-delete limit
+MAX_MESSAGE_CHARS = 2000   # Discord message length limit
+MAX_IDLE_BUCKETS = 10000
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)  # Discord limit, minus clock skew
+
+# kind -> (requests, per seconds); conservative defaults below Discord's buckets
+DEFAULT_LIMITS = {"delete": (5, 5.0), "dm": (5, 5.0), "send": (5, 5.0)}
+
+
+class TransientError(Exception):
+    """Worth retrying (429, 5xx, timeouts). retry_after comes from the server if known."""
+
+    def __init__(self, msg: str = "", retry_after: Optional[float] = None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    """Retrying cannot help (403 Forbidden, 404 Not Found, 400 ...)."""
+
+
+@dataclass
+class RateLimit:
+    remaining: int
+    reset_after: float
+
+
+@dataclass(order=True)
+class _Item:
+    priority: int
+    seq: int
+    kind: str = field(compare=False)
+    target: Any = field(compare=False)  # message (delete) / user (dm) / channel (send)
+    content: str = field(compare=False, default="")
+    future: Optional[asyncio.Future] = field(compare=False, default=None)
+
+
+class _Bucket:
+    def __init__(self, rate: int, per: float):
+        self.capacity, self.per = float(rate), per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.capacity
+
+    def take(self):
+        self.tokens -= 1
+
+    def update(self, rl: RateLimit):
+        if rl.remaining <= 0:
+            self.blocked_until = time.monotonic() + rl.reset_after
+        self.tokens = min(self.tokens, float(rl.remaining))
+
+    def penalize(self, retry_after: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class _PrioritySlots:
+    """Semaphore whose waiters are woken lowest-priority-number first."""
+
+    def __init__(self, n: int):
+        self._free = n
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, priority: int):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # slot was handed to us just as we got cancelled
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over directly
+                return
+        self._free += 1
+
+
+class ActionDispatcher:
+    def __init__(self, transport, max_inflight: int = 8, route_concurrency: int = 1,
+                 limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 max_attempts: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.transport = transport
+        self.route_concurrency = route_concurrency
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_attempts, self.backoff_base, self.backoff_max = max_attempts, backoff_base, backoff_max
+        self._slots = _PrioritySlots(max_inflight)
+        self._queues: Dict[Tuple[str, str], List[_Item]] = {}
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._workers: Dict[Tuple[str, str], int] = {}
+        self._seq = itertools.count()
+        self._pending: set = set()
+        self._tasks: set = set()
+
+    # ---- public API: each returns a future resolving to True (done) / False (gave up)
+    def redact(self, message, priority: int = PRIORITY_REDACT) -> asyncio.Future:
+        return self._submit("delete", str(message.channel.id), message, "", priority)
+
+    def dm(self, user, content: str, priority: int = PRIORITY_DM) -> asyncio.Future:
+        return self._submit("dm", str(user.id), user, content, priority)
+
+    def notice(self, channel, content: str, priority: int = PRIORITY_NOTICE) -> asyncio.Future:
+        return self._submit("send", str(channel.id), channel, content, priority)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def drain(self):
+        """Wait until everything enqueued so far has finished (e.g. before shutdown)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    # ---- internals
+    def _submit(self, kind, route_id, target, content, priority) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        key = (kind, route_id)
+        heapq.heappush(self._queues.setdefault(key, []), _Item(priority, next(self._seq), kind, target, content, fut))
+        self._pending.add(fut)
+        fut.add_done_callback(self._pending.discard)
+        if key not in self._buckets:
+            if len(self._buckets) >= MAX_IDLE_BUCKETS:
+                self._sweep_buckets()
+            self._buckets[key] = _Bucket(*self.limits[kind])
+        while self._workers.get(key, 0) < self.route_concurrency:
+            self._workers[key] = self._workers.get(key, 0) + 1
+            task = asyncio.create_task(self._run_route(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        metrics.set_gauge("dispatch_queue_depth", self.depth)
+        return fut
+
+    def _sweep_buckets(self):
+        # DM routes are per user; forget buckets that are idle and fully refilled
+        for k in [k for k, b in self._buckets.items()
+                  if k not in self._queues and b.delay() == 0 and b.tokens >= b.capacity]:
+            del self._buckets[k]
+
+    def _take_batch(self, heap: List[_Item]) -> List[_Item]:
+        first = heapq.heappop(heap)
+        batch = [first]
+        if first.kind == "delete":
+            while heap and len(batch) < MAX_BULK_DELETE:
+                batch.append(heapq.heappop(heap))
+        else:
+            size = len(first.content)
+            # same priority only: a crisis DM is never merged with a warning
+            while heap and heap[0].priority == first.priority and \
+                    size + 2 + len(heap[0].content) <= MAX_MESSAGE_CHARS:
+                it = heapq.heappop(heap)
+                size += 2 + len(it.content)
+                batch.append(it)
+        metrics.set_gauge("dispatch_queue_depth", self.depth)
+        return batch
+
+    async def _run_route(self, key):
+        heap, bucket = self._queues[key], self._buckets[key]
+        try:
+            while heap:
+                batch = self._take_batch(heap)
+                ok = await self._execute(key[0], batch, bucket)
+                for it in batch:
+                    if not it.future.done():
+                        it.future.set_result(ok)
+        finally:
+            self._workers[key] -= 1
+            if not self._workers[key]:
+                del self._workers[key]
+                if not heap:
+                    self._queues.pop(key, None)
+
+    async def _execute(self, kind: str, batch: List[_Item], bucket: _Bucket) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            wait = bucket.delay()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = bucket.delay()
+            retry_in = None
+            async with self._slots.acquire(batch[0].priority):
+                bucket.take()
+                t0 = time.perf_counter()
+                try:
+                    rl = await self._call(kind, batch)
+                    if rl is not None:
+                        bucket.update(rl)
+                    metrics.observe("dispatch_seconds", time.perf_counter() - t0, kind=kind)
+                    metrics.inc("dispatch_calls_total", kind=kind, result="ok")
+                    metrics.inc("dispatch_actions_total", len(batch), kind=kind)
+                    return True
+                except TransientError as e:
+                    metrics.inc("dispatch_calls_total", kind=kind, result="retry")
+                    if e.retry_after is not None:
+                        bucket.penalize(e.retry_after)
+                        retry_in = e.retry_after
+                    else:
+                        retry_in = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1) * (1 + random.random()))
+                except PermanentError as e:
+                    metrics.inc("dispatch_calls_total", kind=kind, result="failed")
+                    print(f"[DISPATCH] {kind} gave up: {e}")
+                    return False
+                except Exception as e:
+                    metrics.inc("dispatch_calls_total", kind=kind, result="failed")
+                    print(f"[DISPATCH] {kind} unexpected error: {e!r}")
+                    return False
+            if attempt < self.max_attempts:
+                await asyncio.sleep(retry_in)  # outside the slot: others keep flowing
+        print(f"[DISPATCH] {kind} failed after {self.max_attempts} attempts")
+        return False
+
+    async def _call(self, kind: str, batch: List[_Item]) -> Optional[RateLimit]:
+        if kind == "delete":
+            msgs = [it.target for it in batch]
+            return await self.transport.redact(msgs[0].channel, msgs)
+        content = "\n\n".join(it.content for it in batch)
+        if kind == "dm":
+            return await self.transport.send_dm(batch[0].target, content)
+        return await self.transport.send_channel(batch[0].target, content)
+
+
+class DiscordTransport:
+    """discord.py-backed transport; maps its exceptions onto Transient/PermanentError.
+
+    discord.py already sleeps through most 429s itself, so this mainly turns
+    what it gives up on into retries and keeps the delete->edit fallback.
+    """
+
+    REDACTED = "[message redacted by moderator bot]"
+
+    @staticmethod
+    def _translate(e):
+        import discord
+        if isinstance(e, (discord.Forbidden, discord.NotFound)):
+            return PermanentError(str(e))
+        if isinstance(e, discord.RateLimited):  # discord.py gave up waiting out a long 429 itself
+            return TransientError(str(e), e.retry_after)
+        if isinstance(e, discord.HTTPException) and (e.status == 429 or e.status >= 500):
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get("Retry-After")
+            return TransientError(str(e), float(retry_after) if retry_after else None)
+        if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+            return TransientError(str(e))
+        return PermanentError(str(e))
+
+    async def redact(self, channel, messages) -> Optional[RateLimit]:
+        import discord
+        # Bulk delete only takes messages younger than 14 days (older ones fail the whole call
+        # with a 400) and only exists on guild channels; everything else is deleted one by one.
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        bulk = [m for m in messages if m.created_at > cutoff] if hasattr(channel, "delete_messages") else []
+        if len(bulk) < 2:
+            bulk = []
+        single = [m for m in messages if all(m is not b for b in bulk)]
+        try:
+            if bulk:
+                await channel.delete_messages(bulk)
+            for m in single:
+                try:
+                    await m.delete()
+                except discord.NotFound:
+                    pass  # already gone (deleted by a mod, or by an earlier attempt of this batch)
+            print(f"[REDACT] Deleted {len(messages)} message(s) in {channel.id}")
+            return None
+        except discord.Forbidden:
+            pass  # no Manage Messages: fall back to editing, as before
+        except Exception as e:
+            raise self._translate(e)
+        edited = 0
+        for m in messages:
+            try:
+                await m.edit(content=self.REDACTED)
+                edited += 1
+            except Exception as e:
+                print(f"[REDACT] Failed to redact message {m.id}: {e}")
+        if not edited:
+            raise PermanentError("redaction failed (check bot permissions: Manage Messages)")
+        print(f"[REDACT] Edited {edited} message(s) in {channel.id}")
+        return None
+
+    async def send_dm(self, user, content: str) -> Optional[RateLimit]:
+        try:
+            await user.send(content)
+            return None
+        except Exception as e:
+            raise self._translate(e)
+
+    async def send_channel(self, channel, content: str) -> Optional[RateLimit]:
+        try:
+            await channel.send(content)
+            return None
+        except Exception as e:
+            raise self._translate(e)
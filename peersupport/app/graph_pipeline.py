@@ -1,8 +1,12 @@
 from __future__ import annotations
-from typing import TypedDict, Literal
-from langgraph.graph import StateGraph, END
-from quickstart import SarcasmModel, ToxicityModel6, craft_serious_reply, craft_crisis_reply, PATH_SARCASM, PATH_TOX_BASE, PATH_TOX_LORA
-from app.policy import seriousness_score, is_crisis
+import os, time
+from collections import defaultdict
+from functools import lru_cache, wraps
+from typing import TypedDict, Literal, Dict, List, Optional
+from quickstart import craft_serious_reply, craft_crisis_reply
+from app.policy import seriousness_score, crisis_match, triage_action, sarcasm_can_matter
+from app import models
+from app import metrics
 
 class MsgState(TypedDict):
     text: str
@@ -14,31 +18,70 @@ class MsgState(TypedDict):
     action: Literal["none","serious","crisis"]
     reply: str
 
-sarcasm_model = SarcasmModel(PATH_SARCASM)
-tox_model = ToxicityModel6(PATH_TOX_BASE, PATH_TOX_LORA or None)
+# PIPELINE_MODE=fast (default) calls the nodes directly and stops after triage
+# when there is nothing to do; PIPELINE_MODE=graph runs the LangGraph workflow.
+# Both produce the same state for the same input.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "fast").lower()
 
+SERIOUS_REPLY_FALLBACK = "Please keep our space safe and respectful."
 
+# node -> [calls, total seconds]; cheap enough to keep on permanently
+NODE_STATS: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+
+
+def timed_node(name: str):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(state: MsgState) -> MsgState:
+            t0 = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                dt = time.perf_counter() - t0
+                st = NODE_STATS[name]
+                st[0] += 1; st[1] += dt
+                metrics.observe("pipeline_node_seconds", dt, node=name)
+        return wrapper
+    return deco
+
+
+def node_timings() -> Dict[str, Dict[str, float]]:
+    return {k: {"calls": int(c), "total_s": t, "mean_ms": (t / c * 1000) if c else 0.0}
+            for k, (c, t) in NODE_STATS.items()}
+
+
+@timed_node("lexicon")
+def node_lexicon(state: MsgState) -> MsgState:
+    # Cheap automaton scan before any model runs; a hit goes straight to the responder.
+    if crisis_match(state["text"]):
+        state.update({"action": "crisis", "seriousness": 1.0})
+    else:
+        state["action"] = "none"
+    return state
+
+
+@timed_node("sentinel")
 def node_sentinel(state: MsgState) -> MsgState:
-    s = sarcasm_model.score(state["text"])
-    tox = tox_model.scores(state["text"])  # dict of jigsaw labels
+    # models load lazily on the first message (or earlier via app.models.load_all);
+    # sharded deployments score in the shared inference service instead;
+    # with SARCASM_LAZY the sarcasm model only runs when it can change node_triage
+    s, tox = models.score(state["text"])  # tox: dict of jigsaw labels
     tox_max = max(tox.values()) if tox else 0.0
     state.update({"sarcasm": s, "tox_max": tox_max, "seriousness": seriousness_score(tox_max, s)})
     return state
 
 
+@timed_node("triage")
 def node_triage(state: MsgState) -> MsgState:
-    text = state["text"]
-    if is_crisis(text):
-        state["action"] = "crisis"
-    else:
-        # Only act on SERIOUS toxicity – ignore sarcasm-only cases
-        state["action"] = "serious" if state["seriousness"] >= 0.60 and state["tox_max"] >= 0.85 and state["sarcasm"] <= 0.40 else "none"
+    # crisis was already routed by node_lexicon; only act on SERIOUS toxicity – ignore sarcasm-only cases
+    state["action"] = triage_action(state["seriousness"], state["tox_max"], state["sarcasm"])
     return state
 
 
+@timed_node("responder")
 def node_responder(state: MsgState) -> MsgState:
     if state["action"] == "serious":
-        state["reply"] = craft_serious_reply(state["text"], state["sarcasm"], state["tox_max"], state["seriousness"]) or "Please keep our space safe and respectful."
+        state["reply"] = craft_serious_reply(state["text"], state["sarcasm"], state["tox_max"], state["seriousness"]) or SERIOUS_REPLY_FALLBACK
     elif state["action"] == "crisis":
         state["reply"] = craft_crisis_reply(state["text"]) or "You're not alone. Consider reaching out to campus support — help is available."
     else:
@@ -46,19 +89,80 @@ def node_responder(state: MsgState) -> MsgState:
     return state
 
 
+@timed_node("archivist")
 def node_archivist(state: MsgState) -> MsgState:
     # storage handled in bot after we redact + send; keep node simple
     return state
 
-workflow = StateGraph(MsgState)
-workflow.add_node("sentinel", node_sentinel)
-workflow.add_node("triage", node_triage)
-workflow.add_node("responder", node_responder)
-workflow.add_node("archivist", node_archivist)
-workflow.set_entry_point("sentinel")
-workflow.add_edge("sentinel", "triage")
-workflow.add_edge("triage", "responder")
-workflow.add_edge("responder", "archivist")
-workflow.add_edge("archivist", END)
-
-app_graph = workflow.compile()
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """Compiled LangGraph workflow (langgraph is only imported when this is used)."""
+    from langgraph.graph import StateGraph, END
+    workflow = StateGraph(MsgState)
+    workflow.add_node("lexicon", node_lexicon)
+    workflow.add_node("sentinel", node_sentinel)
+    workflow.add_node("triage", node_triage)
+    workflow.add_node("responder", node_responder)
+    workflow.add_node("archivist", node_archivist)
+    workflow.set_entry_point("lexicon")
+    workflow.add_conditional_edges("lexicon", lambda st: "responder" if st["action"] == "crisis" else "sentinel",
+                                   {"responder": "responder", "sentinel": "sentinel"})
+    workflow.add_edge("sentinel", "triage")
+    workflow.add_edge("triage", "responder")
+    workflow.add_edge("responder", "archivist")
+    workflow.add_edge("archivist", END)
+    return workflow.compile()
+
+
+def run_fast(state: MsgState) -> MsgState:
+    """Direct node calls with the graph's decisions; skips responder/archivist for action=none."""
+    state = dict(state)
+    if node_lexicon(state)["action"] == "crisis":
+        node_responder(state)
+        return node_archivist(state)
+    node_sentinel(state)
+    node_triage(state)
+    if state["action"] == "none":
+        state["reply"] = ""  # what node_responder would set
+        return state
+    node_responder(state)
+    return node_archivist(state)
+
+
+def run_cheap(state: MsgState, verdict: Optional[dict] = None) -> MsgState:
+    """Load-shedding path (see app.ingress): no sarcasm model and no LLM warning.
+
+    Lexicon first; then a finished spam-wave result for a near-duplicate (app.dedup verdict)
+    if there is one; otherwise the toxicity model alone with sarcasm taken as 0.0, so banter
+    that the sarcasm model would have let through can be acted on (cheap_unsure_total).
+    """
+    state = dict(state)
+    if node_lexicon(state)["action"] == "crisis":
+        return node_responder(state)
+    if verdict is not None:
+        state.update(verdict)
+        return state
+    tox = models.score_toxicity([state["text"]])[0]
+    tox_max = max(tox.values()) if tox else 0.0
+    ser = seriousness_score(tox_max, 0.0)
+    state.update({"sarcasm": 0.0, "tox_max": tox_max, "seriousness": ser, "action": triage_action(ser, tox_max, 0.0)})
+    if sarcasm_can_matter(tox_max):
+        metrics.inc("cheap_unsure_total")  # the full pipeline's sarcasm score could have cleared it
+    state["reply"] = SERIOUS_REPLY_FALLBACK if state["action"] == "serious" else ""
+    return state
+
+
+def run_graph(state: MsgState) -> MsgState:
+    return get_graph().invoke(state)
+
+
+def run_pipeline(state: MsgState) -> MsgState:
+    return run_graph(state) if PIPELINE_MODE == "graph" else run_fast(state)
+
+
+def __getattr__(name):
+    # keep `from app.graph_pipeline import app_graph` working without compiling at import
+    if name == "app_graph":
+        return get_graph()
+    raise AttributeError(name)
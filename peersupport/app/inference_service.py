@@ -0,0 +1,249 @@
+from __future__ import annotations
+import asyncio, json, os, socket, struct, threading, time
+from typing import Callable, Dict, List, Tuple
+
+from . import metrics
+
+# Shared local inference service for sharded deployments.
+#
+# One process owns the sarcasm + toxicity models and listens on a unix socket;
+# bot shards (app.models with INFERENCE_SOCKET set) send it one text per
+# request and never load weights themselves. Requests from all connections go
+# into one queue and are scored in micro-batches: a batch closes at
+# INFER_MAX_BATCH texts or INFER_MAX_WAIT_MS after its first text, whichever
+# comes first.
+#
+# Wire format: 4-byte big-endian length + JSON, both directions.
+#   {"id": 7, "op": "score", "text": "..."} -> {"id": 7, "sarcasm": 0.1, "tox": {...}}
+#   {"id": 9, "op": "score_batch", "texts": [...]} -> {"id": 9, "scores": [[0.1, {...}], ...]}
+#   {"id": 8, "op": "ping"}                 -> {"id": 8, "ok": true, "batches": 3, "texts": 40, "sarcasm": {...}}
+#
+#   python -m app.inference_service            # socket path from INFERENCE_SOCKET
+
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFER_MAX_BATCH = int(os.getenv("INFER_MAX_BATCH", 32))
+INFER_MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", 5))
+INFER_TIMEOUT = float(os.getenv("INFER_TIMEOUT", 30))
+
+_HEADER = struct.Struct(">I")
+Scores = Tuple[float, Dict[str, float]]
+
+
+class InferenceError(RuntimeError):
+    pass
+
+
+def score_local(texts: List[str]) -> List[Scores]:
+    from . import models
+    return models.score_local(texts)  # lazy sarcasm (SARCASM_LAZY) applies here, not in the shards
+
+
+# ---- server
+class InferenceServer:
+    def __init__(self, path: str = INFERENCE_SOCKET, score_fn: Callable[[List[str]], List[Scores]] = score_local,
+                 max_batch: int = INFER_MAX_BATCH, max_wait_ms: float = INFER_MAX_WAIT_MS):
+        if not path:
+            raise ValueError("INFERENCE_SOCKET is not set")
+        self.path, self.score_fn = path, score_fn
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000
+        self.batches = self.texts = 0
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous run
+        self._queue: asyncio.Queue = asyncio.Queue()
+        server = await asyncio.start_unix_server(self._client, path=self.path)
+        os.chmod(self.path, 0o600)
+        batcher = asyncio.create_task(self._batcher())
+        print(f"[INFER] Serving on {self.path} (batch≤{self.max_batch}, wait≤{self.max_wait * 1000:.0f}ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        metrics.add_gauge("infer_connections", 1)
+        pending = set()
+        try:
+            while True:
+                try:
+                    (n,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    req = json.loads(await reader.readexactly(n))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                if req.get("op") == "ping":
+                    from .models import sarcasm_stats
+                    _write(writer, {"id": req.get("id"), "ok": True, "batches": self.batches, "texts": self.texts,
+                                    "sarcasm": sarcasm_stats()})
+                    continue
+                texts = req.get("texts") if req.get("op") == "score_batch" else [req.get("text", "")]
+                futs = [asyncio.get_running_loop().create_future() for _ in texts]
+                for text, fut in zip(texts, futs):
+                    self._queue.put_nowait((str(text), fut, time.perf_counter()))
+                if req.get("op") == "score_batch":
+                    t = asyncio.create_task(self._reply_batch(writer, req.get("id"), futs))
+                else:
+                    t = asyncio.create_task(self._reply(writer, req.get("id"), futs[0]))
+                pending.add(t)
+                t.add_done_callback(pending.discard)
+        finally:
+            for t in pending:
+                t.cancel()
+            writer.close()
+            metrics.add_gauge("infer_connections", -1)
+
+    async def _reply(self, writer, req_id, fut):
+        try:
+            sarcasm, tox = await fut
+            _write(writer, {"id": req_id, "sarcasm": sarcasm, "tox": tox})
+        except Exception as e:
+            _write(writer, {"id": req_id, "error": repr(e)})
+
+    async def _reply_batch(self, writer, req_id, futs):
+        # return_exceptions: every future's outcome is retrieved, not just the first failure's
+        results = await asyncio.gather(*futs, return_exceptions=True)
+        err = next((r for r in results if isinstance(r, BaseException)), None)
+        if err is not None:
+            _write(writer, {"id": req_id, "error": repr(err)})
+        else:
+            _write(writer, {"id": req_id, "scores": results})
+
+    async def _batcher(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            metrics.set_gauge("infer_queue_depth", self._queue.qsize())
+            metrics.observe("infer_batch_size", len(batch), buckets=metrics.SIZE_BUCKETS)
+            t0 = time.perf_counter()
+            try:
+                results = await asyncio.to_thread(self.score_fn, [text for text, _, _ in batch])
+            except Exception as e:
+                print(f"[INFER] batch of {len(batch)} failed: {e!r}")
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            metrics.observe("infer_batch_seconds", time.perf_counter() - t0)
+            now = time.perf_counter()
+            for (_, fut, t_in), res in zip(batch, results):
+                metrics.observe("infer_request_seconds", now - t_in)
+                if not fut.done():
+                    fut.set_result(res)
+            self.batches += 1
+            self.texts += len(batch)
+
+
+def _write(writer: asyncio.StreamWriter, obj):
+    body = json.dumps(obj).encode()
+    writer.write(_HEADER.pack(len(body)) + body)
+
+
+# ---- client (blocking; pipeline nodes run in worker threads)
+class InferenceClient:
+    """One socket per calling thread; concurrent threads land in the same server-side batch."""
+
+    def __init__(self, path: str = INFERENCE_SOCKET, timeout: float = INFER_TIMEOUT):
+        self.path, self.timeout = path, timeout
+        self._local = threading.local()
+        self._ids = 0
+        self._ids_lock = threading.Lock()
+
+    def _sock(self) -> socket.socket:
+        s = getattr(self._local, "sock", None)
+        if s is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(self.timeout)
+            s.connect(self.path)
+            self._local.sock = s
+        return s
+
+    def _drop(self):
+        s = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if s is not None:
+            s.close()
+
+    def _call(self, req: dict) -> dict:
+        with self._ids_lock:
+            self._ids += 1
+            req["id"] = self._ids
+        body = json.dumps(req).encode()
+        for attempt in (1, 2):  # one reconnect, e.g. after a service restart
+            try:
+                s = self._sock()
+                s.sendall(_HEADER.pack(len(body)) + body)
+                (n,) = _HEADER.unpack(_recv_exactly(s, _HEADER.size))
+                resp = json.loads(_recv_exactly(s, n))
+                break
+            except (ConnectionError, FileNotFoundError) as e:  # refused / reset / broken pipe / socket gone
+                self._drop()
+                if attempt == 2:
+                    raise InferenceError(f"inference service at {self.path} unavailable: {e}") from e
+            except OSError as e:
+                # timeout or anything else: the service may still be scoring this request, so sending
+                # it again would only add load; the late reply would desync the stream, so drop it
+                self._drop()
+                raise InferenceError(f"inference service at {self.path} did not answer: {e!r}") from e
+        if "error" in resp:
+            raise InferenceError(resp["error"])
+        return resp
+
+    def score(self, text: str) -> Scores:
+        resp = self._call({"op": "score", "text": text})
+        return float(resp["sarcasm"]), resp["tox"]
+
+    def score_batch(self, texts: List[str]) -> List[Scores]:
+        resp = self._call({"op": "score_batch", "texts": list(texts)})
+        return [(float(sar), tox) for sar, tox in resp["scores"]]
+
+    def ping(self) -> dict:
+        return self._call({"op": "ping"})
+
+    def wait_ready(self, timeout: float = 300.0, interval: float = 0.5) -> float:
+        """Block until the service answers (it may still be loading models); returns seconds waited."""
+        t0 = time.perf_counter()
+        while True:
+            try:
+                self.ping()
+                return time.perf_counter() - t0
+            except InferenceError:
+                if time.perf_counter() - t0 > timeout:
+                    raise
+                time.sleep(interval)
+
+
+def _recv_exactly(s: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = s.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("inference service closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def main():
+    import argparse
+    from . import models
+    ap = argparse.ArgumentParser(prog="python -m app.inference_service")
+    ap.add_argument("--socket", default=INFERENCE_SOCKET or "/tmp/peersupport-infer.sock")
+    args = ap.parse_args()
+    # the service itself always scores locally, whatever INFERENCE_SOCKET says
+    load_secs = models.load_all(local=True)
+    warm_secs = models.warm_up(local=True)
+    print(f"[INFER] Loaded {load_secs} | warm-up {warm_secs:.2f}s")
+    metrics.start_server()
+    asyncio.run(InferenceServer(args.socket).serve())
+
+
+if __name__ == "__main__":
+    main()
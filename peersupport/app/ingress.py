@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio, collections, os, time
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+from . import metrics
+
+# Bounded, prioritised ingress queue in front of the moderation pipeline.
+#
+# Lanes are served strictly in order: crisis-lexicon hits, then users with
+# prior violations, then everyone else. When the queue is full, a newcomer
+# from a higher lane evicts the newest item of the lowest non-empty lower
+# lane; otherwise the newcomer itself is shed. Crisis items are never shed.
+# What happens to shed items depends on INGRESS_SHED:
+#   cheap - handled by the cheap path (graph_pipeline.run_cheap: a spam-wave
+#           verdict or the toxicity model alone, templated warning), at most
+#           INGRESS_CHEAP_WORKERS at a time; beyond INGRESS_CHEAP_MAX waiting
+#           they are dropped
+#   defer - parked in a bounded overflow buffer, fully scored once the live
+#           lanes are empty (dropped if the buffer is full)
+#   drop  - counted and discarded
+
+LANE_CRISIS, LANE_REPEAT, LANE_DEFAULT = 0, 1, 2
+LANE_NAMES = ("crisis", "repeat_offender", "default")
+SHED_POLICIES = ("cheap", "defer", "drop")
+
+INGRESS_MAX = int(os.getenv("INGRESS_MAX", 500))
+INGRESS_SHED = os.getenv("INGRESS_SHED", "cheap").lower()
+INGRESS_WORKERS = int(os.getenv("INGRESS_WORKERS", 1))
+INGRESS_DEFER_MAX = int(os.getenv("INGRESS_DEFER_MAX", 5000))
+INGRESS_CHEAP_WORKERS = int(os.getenv("INGRESS_CHEAP_WORKERS", 2))
+INGRESS_CHEAP_MAX = int(os.getenv("INGRESS_CHEAP_MAX", 1000))
+
+Handler = Callable[[object], Awaitable[None]]
+
+
+class IngressQueue:
+    def __init__(self, handler: Handler, cheap_handler: Optional[Handler] = None,
+                 maxsize: int = INGRESS_MAX, policy: str = INGRESS_SHED, workers: int = INGRESS_WORKERS,
+                 defer_max: int = INGRESS_DEFER_MAX, cheap_workers: int = INGRESS_CHEAP_WORKERS,
+                 cheap_max: int = INGRESS_CHEAP_MAX):
+        if policy not in SHED_POLICIES:
+            raise ValueError(f"INGRESS_SHED must be one of {SHED_POLICIES}, got {policy!r}")
+        if policy == "cheap" and cheap_handler is None:
+            raise ValueError("shed policy 'cheap' needs a cheap_handler")
+        self.handler, self.cheap_handler = handler, cheap_handler
+        self.maxsize, self.policy, self.workers = maxsize, policy, workers
+        self._lanes: List[Deque[Tuple[float, object]]] = [collections.deque() for _ in LANE_NAMES]
+        self._deferred: Deque[Tuple[float, object]] = collections.deque()
+        self.defer_max = defer_max
+        self.cheap_workers, self.cheap_max = cheap_workers, cheap_max
+        self._cheap_slots: Optional[asyncio.Semaphore] = None
+        self._cheap_pending = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: set = set()
+        self.admitted = [0] * len(LANE_NAMES)
+        self.shed = [0] * len(LANE_NAMES)
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._lanes)
+
+    def stats(self) -> dict:
+        return {
+            "depth": {n: len(q) for n, q in zip(LANE_NAMES, self._lanes)},
+            "deferred": len(self._deferred),
+            "cheap_pending": self._cheap_pending,
+            "admitted": dict(zip(LANE_NAMES, self.admitted)),
+            "shed": dict(zip(LANE_NAMES, self.shed)),
+            "dropped": self.dropped,
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+        }
+
+    def start(self):
+        if self._wakeup is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._cheap_slots = asyncio.Semaphore(self.cheap_workers)
+        for i in range(self.workers):
+            t = asyncio.create_task(self._worker(), name=f"ingress-{i}")
+            self._tasks.add(t)
+            t.add_done_callback(self._tasks.discard)
+
+    def submit(self, item, lane: int = LANE_DEFAULT) -> str:
+        """Admit item into a lane; returns 'queued' or 'shed'."""
+        self.start()
+        now = time.monotonic()
+        if self.depth >= self.maxsize:
+            victim_lane = next((l for l in range(len(self._lanes) - 1, lane, -1) if self._lanes[l]), None)
+            if victim_lane is None and lane != LANE_CRISIS:
+                self._shed(lane, (now, item))
+                return "shed"
+            if victim_lane is not None:
+                self._shed(victim_lane, self._lanes[victim_lane].pop())  # newest of the lowest lane
+        self._lanes[lane].append((now, item))
+        self.admitted[lane] += 1
+        metrics.inc("ingress_admitted_total", lane=LANE_NAMES[lane])
+        self._publish()
+        self._wakeup.set()
+        return "queued"
+
+    def _shed(self, lane: int, entry):
+        self.shed[lane] += 1
+        metrics.inc("ingress_shed_total", lane=LANE_NAMES[lane], policy=self.policy)
+        if self.policy == "cheap" and self._cheap_pending < self.cheap_max:
+            self._cheap_pending += 1
+            t = asyncio.create_task(self._run_cheap(entry))
+            self._tasks.add(t)
+            t.add_done_callback(self._tasks.discard)
+        elif self.policy == "defer" and len(self._deferred) < self.defer_max:
+            self._deferred.append(entry)
+        else:
+            self.dropped += 1
+            metrics.inc("ingress_dropped_total", lane=LANE_NAMES[lane])
+
+    def _next(self):
+        for lane, q in enumerate(self._lanes):
+            if q:
+                return LANE_NAMES[lane], q.popleft()
+        if self._deferred:  # only when every live lane is empty
+            return "deferred", self._deferred.popleft()
+        return None, None
+
+    async def _worker(self):
+        while True:
+            lane, entry = self._next()
+            if entry is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._publish()
+            await self._run(self.handler, entry, lane)
+
+    async def _run_cheap(self, entry):
+        try:
+            async with self._cheap_slots:  # the cheap path still runs a model; keep it off the live workers' CPU
+                await self._run(self.cheap_handler, entry, "cheap")
+        finally:
+            self._cheap_pending -= 1
+
+    async def _run(self, handler: Handler, entry, lane: str):
+        enqueued_at, item = entry
+        metrics.observe("ingress_wait_seconds", time.monotonic() - enqueued_at, lane=lane)
+        try:
+            await handler(item)
+        except Exception as e:  # a bad message must not kill the worker
+            print(f"[INGRESS] handler failed ({lane}): {e!r}")
+
+    def _publish(self):
+        if not metrics.ENABLED:
+            return
+        for name, q in zip(LANE_NAMES, self._lanes):
+            metrics.set_gauge("ingress_queue_depth", len(q), lane=name)
+        metrics.set_gauge("ingress_deferred", len(self._deferred))
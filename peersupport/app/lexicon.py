@@ -0,0 +1,118 @@
+from __future__ import annotations
+import os, unicodedata
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Multi-phrase matcher (Aho-Corasick) for the crisis lexicon.
+#
+# One pass over the message finds every listed phrase at once, so scan time
+# depends on the message length, not on how many phrases the lexicon holds.
+# Phrases match on whole-word boundaries, like the \b...\b regexes they
+# replace. Text and phrases are normalised the same way: casefolded,
+# apostrophes dropped ("can't" == "cant"), whitespace runs collapsed.
+
+LEXICON_PATH = os.getenv("CRISIS_LEXICON_PATH", os.path.join(os.path.dirname(__file__), "crisis_lexicon.txt"))
+
+_APOSTROPHES = dict.fromkeys(map(ord, "'’‘`´"), None)
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().translate(_APOSTROPHES).split())
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch == "_" or unicodedata.category(ch)[0] in "LMN"
+
+
+class Lexicon:
+    def __init__(self, phrases: Iterable[str] = ()):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[List[int]] = [[]]  # node -> phrase ending exactly here
+        self._out: List[List[int]] = [[]]  # node -> own + everything reachable via fail links
+        self.phrases: List[str] = []
+        self._lens: List[int] = []
+        for p in phrases:
+            self.add(p)
+        self.build()
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def add(self, phrase: str):
+        phrase = normalize(phrase)
+        if not phrase:
+            return
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._own.append([]); self._out.append([])
+            node = nxt
+        if self._own[node]:  # duplicate phrase
+            return
+        self._own[node].append(len(self.phrases))
+        self.phrases.append(phrase)
+        self._lens.append(len(phrase))
+
+    def build(self):
+        """Compute failure links (BFS); call again after add()."""
+        queue = list(self._goto[0].values())
+        for n in queue:
+            self._fail[n] = 0
+            self._out[n] = self._own[n]
+        i = 0
+        while i < len(queue):
+            node = queue[i]; i += 1
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._own[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str):
+        goto, fail, out, lens = self._goto, self._fail, self._out, self._lens
+        node = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                start = i - lens[idx] + 1
+                if (start == 0 or not _is_word_char(text[start - 1])) and \
+                   (i + 1 == n or not _is_word_char(text[i + 1])):
+                    yield start, idx
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        t = normalize(text or "")
+        return [(start, self.phrases[idx]) for start, idx in self._scan(t)]
+
+    def search(self, text: str) -> Optional[str]:
+        """First whole-word phrase found in text, or None."""
+        for _, idx in self._scan(normalize(text or "")):
+            return self.phrases[idx]
+        return None
+
+
+def load_lexicon(path: str = LEXICON_PATH) -> Lexicon:
+    """One phrase per line; blank lines and '#' comments are ignored."""
+    with open(path, "r", encoding="utf-8") as f:
+        return Lexicon(line.split("#", 1)[0].strip() for line in f)
+
+
+@lru_cache(maxsize=1)
+def crisis_lexicon() -> Lexicon:
+    return load_lexicon()
+
+
+def crisis_match(text: str) -> Optional[str]:
+    return crisis_lexicon().search(text)
+
+
+def is_crisis(text: str) -> bool:
+    return crisis_match(text) is not None
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import asyncio, bisect, functools, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+# Tiny Prometheus-style instrumentation (histograms, counters, gauges).
+#
+# Off unless METRICS_PORT is set: every helper then returns right after one
+# bool check, and timer() hands back a shared no-op context manager.
+# With it on, start_server() serves the text format on 127.0.0.1:/metrics.
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+ENABLED = METRICS_PORT > 0
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+_lock = threading.Lock()
+_counters: Dict[Key, float] = {}
+_gauges: Dict[Key, float] = {}
+_histograms: Dict[Key, _Histogram] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _gauges[k] = float(value)
+
+
+def add_gauge(name: str, delta: float, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _gauges[k] = _gauges.get(k, 0.0) + delta
+
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = _Histogram(buckets)
+        h.observe(value)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name, labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name: str, **labels):
+    """`with timer("x_seconds"):` observes the block's duration into a histogram."""
+    return _Timer(name, labels) if ENABLED else _NOOP
+
+
+def timed(name: str, **labels):
+    """Decorator form of timer(); works for plain and async functions."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*a, **k):
+                with _Timer(name, labels):
+                    return await fn(*a, **k)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*a, **k):
+            with _Timer(name, labels):
+                return fn(*a, **k)
+        return wrapper
+    return deco
+
+
+def _fmt_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    """Current values in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        typed = set()
+        for (name, labels), v in sorted(_counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter"); typed.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), v in sorted(_gauges.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge"); typed.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), h in sorted(_histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram"); typed.add(name)
+            cum = 0
+            for le, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                cum += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cum}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404); return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # keep scrapes out of the bot log
+        pass
+
+
+def start_server(port: int = METRICS_PORT, host: str = "127.0.0.1"):
+    """Serve /metrics from a daemon thread; no-op when metrics are disabled."""
+    if not ENABLED or port <= 0:
+        return None
+    srv = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[METRICS] Serving http://{host}:{port}/metrics")
+    return srv
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import os, threading, time
+from functools import lru_cache
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+# Lazily-built, process-wide model singletons.
+# Importing this module (or graph_pipeline) never touches torch; the first
+# caller of .get() pays the load and every other thread waits on the lock.
+# Weights come from mmap'd snapshots (see app.weights), so bot workers on one
+# host share pages. With INFERENCE_SOCKET set, score() goes to the shared
+# inference service instead (app.inference_service) and this process never
+# loads weights at all.
+
+T = TypeVar("T")
+
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+# SARCASM_LAZY=1: run toxicity first and the sarcasm model only when its score can still
+# change node_triage's action (policy.sarcasm_can_matter); skipped messages get sarcasm=0.0
+SARCASM_LAZY = os.getenv("SARCASM_LAZY", "1") == "1"
+
+
+class LazyModel(Generic[T]):
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._obj: Optional[T] = None
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    def get(self) -> T:
+        obj = self._obj
+        if obj is None:
+            with self._lock:
+                obj = self._obj
+                if obj is None:
+                    t0 = time.perf_counter()
+                    obj = self._factory()
+                    self.load_seconds = time.perf_counter() - t0
+                    self._obj = obj
+        return obj
+
+
+def _load_sarcasm():
+    from quickstart import SarcasmModel, PATH_SARCASM
+    assert PATH_SARCASM, "SARCASM_MODEL_PATH is empty in .env"
+    return SarcasmModel(PATH_SARCASM)
+
+
+def _load_tox():
+    from quickstart import ToxicityModel6, PATH_TOX_BASE, PATH_TOX_LORA
+    return ToxicityModel6(PATH_TOX_BASE, PATH_TOX_LORA or None)
+
+
+sarcasm = LazyModel("sarcasm", _load_sarcasm)
+toxicity = LazyModel("toxicity", _load_tox)
+
+
+def get_sarcasm_model():
+    return sarcasm.get()
+
+
+def get_tox_model():
+    return toxicity.get()
+
+
+@lru_cache(maxsize=1)
+def remote():
+    """Client for the shared inference service, or None when this process scores locally."""
+    if not INFERENCE_SOCKET:
+        return None
+    from .inference_service import InferenceClient
+    return InferenceClient(INFERENCE_SOCKET)
+
+
+_sarcasm_counts = {"run": 0, "skipped": 0}
+_sarcasm_lock = threading.Lock()
+
+
+def score_local(texts: List[str]) -> List[Tuple[float, Dict[str, float]]]:
+    """Score in this process: toxicity for all texts, sarcasm for all or (SARCASM_LAZY) only where it matters."""
+    from . import metrics
+    tox = get_tox_model().scores_batch(texts)
+    if SARCASM_LAZY:
+        from .policy import sarcasm_can_matter
+        need = [i for i, t in enumerate(tox) if sarcasm_can_matter(max(t.values()) if t else 0.0)]
+    else:
+        need = list(range(len(texts)))
+    sarcasm = [0.0] * len(texts)
+    if need:
+        for i, s in zip(need, get_sarcasm_model().score_batch([texts[i] for i in need])):
+            sarcasm[i] = s
+    with _sarcasm_lock:
+        _sarcasm_counts["run"] += len(need)
+        _sarcasm_counts["skipped"] += len(texts) - len(need)
+    metrics.inc("sarcasm_passes_total", len(need), outcome="run")
+    metrics.inc("sarcasm_passes_total", len(texts) - len(need), outcome="skipped")
+    return list(zip(sarcasm, tox))
+
+
+def sarcasm_stats() -> Dict[str, float]:
+    """Sarcasm model passes run / skipped in this process (the inference service reports its own)."""
+    run, skipped = _sarcasm_counts["run"], _sarcasm_counts["skipped"]
+    return {"run": run, "skipped": skipped, "skipped_fraction": skipped / (run + skipped) if run + skipped else 0.0}
+
+
+def score(text: str) -> Tuple[float, Dict[str, float]]:
+    """(sarcasm prob, toxicity label probs) for one message, local or via the service."""
+    client = remote()
+    if client is not None:
+        return client.score(text)
+    return score_local([text])[0]
+
+
+def score_batch(texts: List[str]) -> List[Tuple[float, Dict[str, float]]]:
+    """score() for many messages in one forward pass per model (backfill, batched paths)."""
+    client = remote()
+    if client is not None:
+        return client.score_batch(texts)
+    return score_local(texts)
+
+
+def score_toxicity(texts: List[str]) -> List[Dict[str, float]]:
+    """Toxicity label probs only (ingress cheap path); through the service this is a full score_batch()."""
+    client = remote()
+    if client is not None:
+        return [tox for _, tox in client.score_batch(texts)]
+    return get_tox_model().scores_batch(texts)
+
+
+def load_all(local: bool = False):
+    """Load both models in parallel (one thread each); returns load seconds per model.
+
+    Shards (INFERENCE_SOCKET set) only wait for the service to answer, unless local=True.
+    """
+    if remote() is not None and not local:
+        return {"inference_service_wait": remote().wait_ready()}
+    threads = [threading.Thread(target=m.get, name=f"load-{m.name}") for m in (sarcasm, toxicity)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    for m in (sarcasm, toxicity):
+        m.get()  # re-raises in the caller if a loader thread failed
+    return {m.name: m.load_seconds for m in (sarcasm, toxicity)}
+
+
+# Representative (batch, tokens) shapes: single live messages plus the small
+# batches the batched paths use. Running them once pays the lazy kernel /
+# allocator / tokenizer setup before the first real message does.
+WARMUP_SHAPES = ((1, 16), (1, 64), (8, 32), (8, 128))
+
+
+def warm_up(shapes=WARMUP_SHAPES, local: bool = False) -> float:
+    """Run dummy batches through both models; returns seconds spent."""
+    if remote() is not None and not local:
+        return 0.0  # the service warms itself up
+    t0 = time.perf_counter()
+    sar, tox = get_sarcasm_model(), get_tox_model()
+    for batch, tokens in shapes:
+        texts = [" ".join(["warm"] * tokens)] * batch
+        sar.score_batch(texts)
+        tox.scores_batch(texts)
+    return time.perf_counter() - t0
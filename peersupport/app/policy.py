@@ -1,7 +1,7 @@
 from __future__ import annotations
-import os, datetime as dt, hashlib, re
-from sqlalchemy import select
-from .db import SessionLocal, UserStats
+import os, datetime as dt, hashlib
+from . import user_state
+from .lexicon import is_crisis, crisis_match  # noqa: F401  (re-exported for callers)
 
 THRESHOLDS = {
     "tox_high": float(os.getenv("TOX_HIGH", 0.65)),
@@ -11,12 +11,26 @@ THRESHOLDS = {
 
 
 
-CRISIS_PATTERNS = [
-    r"\bi (?:want|going|plan) to (?:kill|hurt) (?:myself|me|him|her|them)\b",
-    r"\b(?:suicide|kill myself|end my life)\b",
-    r"\b(?:i(?:'m| am) (?:done|hopeless)|i can't go on)\b",
-]
-CRISIS_RE = re.compile("|".join(CRISIS_PATTERNS), re.IGNORECASE)
+# Crisis phrases live in app/crisis_lexicon.txt (see app/lexicon.py).
+
+# node_triage: act on serious toxicity only, never sarcasm-only (replay with app/replay.py)
+TRIAGE = {
+    "seriousness_min": float(os.getenv("TRIAGE_SERIOUSNESS_MIN", 0.60)),
+    "tox_min": float(os.getenv("TRIAGE_TOX_MIN", 0.85)),
+    "sarcasm_max": float(os.getenv("TRIAGE_SARCASM_MAX", 0.40)),
+}
+
+
+def triage_action(seriousness: float, tox_max: float, sarcasm: float, t: dict = TRIAGE) -> str:
+    serious = seriousness >= t["seriousness_min"] and tox_max >= t["tox_min"] and sarcasm <= t["sarcasm_max"]
+    return "serious" if serious else "none"
+
+
+def sarcasm_can_matter(tox_max: float, t: dict = TRIAGE) -> bool:
+    # seriousness never rises with sarcasm and triage wants sarcasm <= sarcasm_max, so when
+    # sarcasm=0 and sarcasm=1 give the same action every value does (models skips the model)
+    return (triage_action(seriousness_score(tox_max, 0.0), tox_max, 0.0, t)
+            != triage_action(seriousness_score(tox_max, 1.0), tox_max, 1.0, t))
 
 
 def seriousness_score(tox_max: float,sarcasm: float) -> float:
@@ -34,28 +48,26 @@ def anon_user_id(user_id: str, salt: str = "peer_salt") -> str:
 
 
 
+# Violation / warned / DM-cooldown state lives in app.user_state's cache (write-behind to
+# UserStats and Cooldown), so these are dict lookups on the message path.
+
 def record_violation(user_id_hash: str) -> int:
-    with SessionLocal() as s:
-        st = s.execute(select(UserStats).where(UserStats.user_id_hash == user_id_hash)).scalar_one_or_none()
-        if not st:
-            st = UserStats(user_id_hash=user_id_hash, violations=1)
-            s.add(st); s.commit(); return st.violations
-        st.violations += 1
-        s.commit(); return st.violations
+    return user_state.cache.record_violation(user_id_hash)
+
+
+def repeat_offenders() -> set:
+    """Hashes of users with at least one recorded violation (ingress priority lane)."""
+    return user_state.cache.offenders()
 
 
 def mark_warned(user_id_hash: str):
-    with SessionLocal() as s:
-        st = s.execute(select(UserStats).where(UserStats.user_id_hash == user_id_hash)).scalar_one_or_none()
-        if st and not st.warned:
-            st.warned = True; s.commit()
+    user_state.cache.mark_warned(user_id_hash)
 
 
 def has_been_warned(user_id_hash: str) -> bool:
-    with SessionLocal() as s:
-        st = s.execute(select(UserStats).where(UserStats.user_id_hash == user_id_hash)).scalar_one_or_none()
-        return bool(st and st.warned)
+    return user_state.cache.has_been_warned(user_id_hash)
 
 
-def is_crisis(text: str) -> bool:
-    return bool(CRISIS_RE.search(text or ""))
\ No newline at end of file
+def can_dm(user_id_hash: str, severity: str = "serious") -> bool:
+    """Severity-based DM cooldown (user_state.COOLDOWN_S; crisis DMs always pass); a True answer starts it."""
+    return user_state.cache.can_dm(user_id_hash, severity)
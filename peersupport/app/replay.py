@@ -0,0 +1,65 @@
+from __future__ import annotations
+import argparse, datetime as dt, itertools, json
+from typing import Dict, List, Optional
+from sqlalchemy import select, func, case, and_
+from .db import SessionLocal, Incident
+from .policy import TRIAGE
+
+# Replay node_triage (policy.TRIAGE) over stored incidents, no model inference.
+# Every grid point becomes one SUM(CASE ...) column, so the whole sweep is a
+# single pass over the incidents table.
+# Only flagged messages are stored as incidents, so this shows which recorded
+# "serious" incidents a stricter candidate would drop; looser candidates need
+# the full-corpus replay in moderation-agent/agent/replay.py. Crisis incidents
+# come from the lexicon and are not affected by TRIAGE.
+#   python -m app.replay --grid seriousness_min=0.5,0.6,0.7 --grid tox_min=0.8,0.85,0.9
+
+
+def _kept(t: Dict[str, float]):
+    return and_(Incident.seriousness >= t["seriousness_min"], Incident.tox_max >= t["tox_min"],
+                Incident.sarcasm <= t["sarcasm_max"])
+
+
+def replay_triage(grid: Dict[str, List[float]], since: Optional[dt.datetime] = None,
+                  channel_id: Optional[str] = None) -> dict:
+    keys = list(grid)
+    points = [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))] if keys else [{}]
+    for p in points:
+        unknown = set(p) - set(TRIAGE)
+        if unknown:
+            raise ValueError(f"unknown TRIAGE key(s): {sorted(unknown)}")
+    cols = [func.sum(case((_kept({**TRIAGE, **p}), 1), else_=0)) for p in points]
+    q = select(func.count(), func.sum(case((_kept(TRIAGE), 1), else_=0)), *cols).where(Incident.action == "serious")
+    if since is not None:
+        q = q.where(Incident.created_at >= since)
+    if channel_id:
+        q = q.where(Incident.channel_id == channel_id)
+    with SessionLocal() as s:
+        total, current, *kept = s.execute(q).one()
+    return {
+        "serious_incidents": total,
+        "kept_by_current": current or 0,
+        "candidates": [{"triage": p, "kept": k or 0, "dropped": total - (k or 0)} for p, k in zip(points, kept)],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m app.replay")
+    ap.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2,...",
+                    help=f"sweep a TRIAGE key ({', '.join(TRIAGE)})")
+    ap.add_argument("--since", type=dt.datetime.fromisoformat, help="ISO date/time (UTC)")
+    ap.add_argument("--channel")
+    args = ap.parse_args(argv)
+    grid = {}
+    for g in args.grid:
+        key, _, vals = g.partition("=")
+        grid[key.strip()] = [float(v) for v in vals.split(",")]
+    out = replay_triage(grid, args.since, args.channel)
+    print(f"[REPLAY] {out['serious_incidents']} serious incidents | current TRIAGE {TRIAGE} keeps {out['kept_by_current']}")
+    for c in out["candidates"]:
+        print(f"  {json.dumps(c['triage'])}: kept {c['kept']}, dropped {c['dropped']}")
+    return out
+
+
+if __name__ == "__main__":
+    main()
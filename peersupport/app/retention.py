@@ -0,0 +1,213 @@
+from __future__ import annotations
+import argparse, datetime as dt, gzip, json, os, time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from .db import SessionLocal, engine, IS_SQLITE, Incident, IncidentRollup, UserRollup
+from . import metrics
+
+# Incident retention: rows older than RETENTION_DAYS leave the live table.
+#
+# Per batch of RETENTION_BATCH oldest rows:
+#   1. append them to ARCHIVE_DIR/incidents-YYYY-MM.ndjson.zst (or .gz) and fsync
+#   2. in one transaction, fold them into hourly per-channel IncidentRollup and
+#      monthly per-user UserRollup rows and delete them
+# Batches are small and paced so the live table is never locked for long. A
+# crash between 1 and 2 re-archives that batch on the next run, so archive
+# readers should dedupe on ARCHIVE_KEY, not "id" alone: tables created before
+# incidents used AUTOINCREMENT reuse ids once a purge empties them.
+# app.archivist's reports add the rollups to the live rows, so archived
+# incidents still count (without excerpts).
+# Afterwards, free pages are returned to the filesystem (SQLite incremental
+# vacuum, or a one-off full VACUUM on files created before auto_vacuum was on).
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 90))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", 2000))
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE", 0.05))  # seconds between batches
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.getcwd(), "archive"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "auto")  # auto | zst | gz
+VACUUM_FREE_RATIO = float(os.getenv("VACUUM_FREE_RATIO", 0.25))
+
+COLUMNS = [c.name for c in Incident.__table__.columns]
+ARCHIVE_KEY = ("id", "message_id", "created_at")
+
+
+def _compression() -> str:
+    if ARCHIVE_COMPRESSION != "auto":
+        return ARCHIVE_COMPRESSION
+    try:
+        import zstandard  # noqa: F401
+        return "zst"
+    except ImportError:
+        return "gz"
+
+
+def archive_path(month: str, comp: Optional[str] = None) -> str:
+    return os.path.join(ARCHIVE_DIR, f"incidents-{month}.ndjson.{comp or _compression()}")
+
+
+def _append(path: str, rows: List[dict], comp: str):
+    # each run appends one gzip member / zstd frame; both formats allow concatenation
+    data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode()
+    if comp == "zst":
+        import zstandard
+        data = zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_archive(path: str) -> Iterator[dict]:
+    """Incidents from one archive file (all appended frames/members)."""
+    if path.endswith(".zst"):
+        import io, zstandard
+        with open(path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as r:
+            for line in io.TextIOWrapper(r, encoding="utf-8"):
+                yield json.loads(line)
+    else:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def _row(i: Incident) -> dict:
+    r = {c: getattr(i, c) for c in COLUMNS}
+    r["created_at"] = i.created_at.isoformat()
+    return r
+
+
+def _rollup(s, incidents: List[Incident]):
+    agg: Dict[Tuple[dt.datetime, str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    per_user: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    for i in incidents:
+        a = agg[(i.created_at.replace(minute=0, second=0, microsecond=0), i.channel_id, i.action)]
+        a[0] += 1; a[1] += i.seriousness; a[2] = max(a[2], i.seriousness); a[3] += i.tox_max
+        u = per_user[(i.created_at.strftime("%Y-%m"), i.user_id_hash, i.action)]
+        u[0] += 1; u[1] = max(u[1], i.seriousness)
+    for (hour, ch, action), (n, ser_sum, ser_max, tox_sum) in agg.items():
+        r = s.execute(select(IncidentRollup).where(
+            IncidentRollup.hour == hour, IncidentRollup.channel_id == ch, IncidentRollup.action == action)
+        ).scalar_one_or_none()
+        if r is None:
+            s.add(IncidentRollup(hour=hour, channel_id=ch, action=action, incidents=n,
+                                 seriousness_sum=ser_sum, seriousness_max=ser_max, tox_max_sum=tox_sum))
+        else:
+            r.incidents += n; r.seriousness_sum += ser_sum; r.tox_max_sum += tox_sum
+            r.seriousness_max = max(r.seriousness_max, ser_max)
+    for (month, user, action), (n, ser_max) in per_user.items():
+        r = s.execute(select(UserRollup).where(
+            UserRollup.month == month, UserRollup.user_id_hash == user, UserRollup.action == action)
+        ).scalar_one_or_none()
+        if r is None:
+            s.add(UserRollup(month=month, user_id_hash=user, action=action, incidents=n, seriousness_max=ser_max))
+        else:
+            r.incidents += n; r.seriousness_max = max(r.seriousness_max, ser_max)
+
+
+def archive_old(days: int = RETENTION_DAYS, batch: int = RETENTION_BATCH, dry_run: bool = False) -> dict:
+    """Archive + roll up + delete incidents older than `days`, oldest first."""
+    cutoff = dt.datetime.utcnow() - dt.timedelta(days=days)
+    comp = _compression()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    moved, files = 0, set()
+    while True:
+        with SessionLocal() as s:
+            rows = s.execute(select(Incident).where(Incident.created_at < cutoff)
+                             .order_by(Incident.created_at, Incident.id).limit(batch)).scalars().all()
+            if not rows:
+                break
+            if dry_run:
+                moved = s.execute(select(func.count()).where(Incident.created_at < cutoff)).scalar_one()
+                break
+            by_month: Dict[str, List[dict]] = defaultdict(list)
+            for i in rows:
+                by_month[i.created_at.strftime("%Y-%m")].append(_row(i))
+            for month, recs in by_month.items():
+                path = archive_path(month, comp)
+                _append(path, recs, comp)
+                files.add(path)
+            with metrics.timer("db_seconds", op="retention_batch"):
+                _rollup(s, rows)
+                s.execute(delete(Incident).where(Incident.id.in_([i.id for i in rows])))
+                s.commit()
+            moved += len(rows)
+            metrics.inc("retention_archived_total", len(rows))
+        time.sleep(RETENTION_PAUSE)  # let hot-path writers in between batches
+    return {"cutoff": cutoff.isoformat(), "archived": moved, "files": sorted(files), "dry_run": dry_run}
+
+
+def rebuild_user_rollups() -> int:
+    """Recount UserRollup from the archive files (for incidents archived before it existed)."""
+    import glob
+    seen, per_user = set(), defaultdict(lambda: [0, 0.0])
+    for path in sorted(glob.glob(os.path.join(ARCHIVE_DIR, "incidents-*.ndjson.*"))):
+        for r in read_archive(path):
+            key = tuple(r[k] for k in ARCHIVE_KEY)
+            if key in seen:  # re-archived after a crash, see above
+                continue
+            seen.add(key)
+            u = per_user[(r["created_at"][:7], r["user_id_hash"], r["action"])]
+            u[0] += 1; u[1] = max(u[1], r["seriousness"])
+    with SessionLocal() as s:
+        s.execute(delete(UserRollup))
+        s.add_all(UserRollup(month=m, user_id_hash=u, action=a, incidents=n, seriousness_max=ser)
+                  for (m, u, a), (n, ser) in per_user.items())
+        s.commit()
+    return len(seen)
+
+
+def vacuum(force: bool = False) -> dict:
+    """Give freed pages back: incremental vacuum, or a full VACUUM if the file predates auto_vacuum."""
+    if not IS_SQLITE:
+        return {}
+    with engine.connect() as c:
+        mode = c.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        free = c.exec_driver_sql("PRAGMA freelist_count").scalar()
+        pages = c.exec_driver_sql("PRAGMA page_count").scalar() or 1
+        out = {"auto_vacuum": mode, "free_pages": free, "pages": pages}
+        t0 = time.perf_counter()
+        if mode == 2:  # INCREMENTAL
+            c.exec_driver_sql("PRAGMA incremental_vacuum")
+            out["vacuum"] = "incremental"
+        elif force or free / pages >= VACUUM_FREE_RATIO:
+            # full rewrite; auto_vacuum=INCREMENTAL (set on connect in app.db) takes effect here, so this is one-off
+            c.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            c.exec_driver_sql("VACUUM")
+            out["vacuum"] = "full"
+        c.exec_driver_sql("PRAGMA optimize")
+        c.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        out["vacuum_seconds"] = time.perf_counter() - t0
+        out["free_pages_after"] = c.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return out
+
+
+@metrics.timed("archivist_seconds", op="retention")
+def run_retention(days: int = RETENTION_DAYS) -> dict:
+    out = archive_old(days)
+    out["vacuum"] = vacuum()
+    print(f"[RETENTION] Archived {out['archived']} incident(s) older than {days}d | vacuum {out['vacuum'].get('vacuum', 'skipped')}")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m app.retention")
+    ap.add_argument("--days", type=int, default=RETENTION_DAYS)
+    ap.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    ap.add_argument("--vacuum", action="store_true", help="force a full VACUUM afterwards")
+    ap.add_argument("--rebuild-user-rollups", action="store_true", help="recount per-user rollups from the archives")
+    args = ap.parse_args()
+    from .db import init_db
+    init_db()
+    if args.rebuild_user_rollups:
+        print(f"[RETENTION] Rebuilt user rollups from {rebuild_user_rollups()} archived incident(s)")
+    out = archive_old(args.days, dry_run=args.dry_run)
+    if not args.dry_run:
+        out["vacuum"] = vacuum(force=args.vacuum)
+    print(json.dumps(out, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
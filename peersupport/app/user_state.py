@@ -0,0 +1,244 @@
+from __future__ import annotations
+import atexit, datetime as dt, json, os, threading, time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+from sqlalchemy import select
+from .db import SessionLocal, UserStats, Cooldown, StateJournalMark
+from . import metrics
+
+# In-process cache of per-user moderation state (UserStats + Cooldown rows).
+#
+# Lookups and updates are dict operations under one lock; the database is
+# only read once (load) and written by flush(), every STATE_FLUSH_S seconds
+# on a background thread and at shutdown.
+# Crash safety: every update is first appended to the journal file (one JSON
+# line with a sequence number). flush() rotates the journal, writes the
+# batched changes plus the highest flushed sequence number (StateJournalMark)
+# in one transaction, and only then deletes the rotated file. On load, entries
+# at or below the mark are skipped, so a crash at any point neither loses nor
+# double-counts an update. Journal lines reach the OS on every write and disk
+# on every flush: a process crash loses nothing, a power cut at most
+# STATE_FLUSH_S seconds.
+# Violations are written as increments, so processes sharing the database do
+# not overwrite each other; warned and last DM time only ever move forward. Sharded bot
+# processes each keep their own cache and journal (a user's guilds are usually
+# on one shard).
+
+STATE_FLUSH_S = float(os.getenv("STATE_FLUSH_S", 5))
+_SHARDS = "-".join(x.strip() for x in os.getenv("SHARD_IDS", "").split(",") if x.strip())
+STATE_JOURNAL = os.getenv("STATE_JOURNAL", os.path.join(  # one journal per bot process
+    os.getcwd(), f"user_state.{_SHARDS}.journal" if _SHARDS else "user_state.journal"))
+COOLDOWN_S = {  # minimum gap between DMs to one user, by severity; crisis resources are never held back
+    "serious": float(os.getenv("COOLDOWN_SERIOUS_S", 300)),
+}
+
+
+@dataclass
+class UserState:
+    violations: int = 0
+    warned: bool = False
+    last_dm_at: float = 0.0  # epoch seconds
+
+
+class UserStateCache:
+    def __init__(self, journal_path: str = STATE_JOURNAL, flush_s: float = STATE_FLUSH_S,
+                 clock=time.time):
+        self.journal_path, self.flush_s, self.clock = journal_path, flush_s, clock
+        self.name = os.path.basename(journal_path)  # StateJournalMark key
+        self._users: Dict[str, UserState] = {}
+        self._pending: Dict[str, list] = {}  # user -> [violations delta, warned, last_dm_at]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._loaded = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- load / journal
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            t0 = time.perf_counter()
+            with SessionLocal() as s:
+                for h, v, w in s.execute(select(UserStats.user_id_hash, UserStats.violations, UserStats.warned)):
+                    self._users[h] = UserState(v or 0, bool(w))
+                for h, at in s.execute(select(Cooldown.user_id_hash, Cooldown.last_dm_at)):
+                    self._users.setdefault(h, UserState()).last_dm_at = at.replace(tzinfo=dt.timezone.utc).timestamp()
+                mark = s.get(StateJournalMark, self.name)
+                self._seq = mark.last_seq if mark else 0
+            replayed = 0
+            for path in (self.journal_path + ".flushing", self.journal_path):  # older first
+                for e in _read_journal(path):
+                    if e["seq"] > self._seq:
+                        self._seq = e["seq"]
+                        self._apply(e["op"], e["u"], e.get("t", 0.0), e.get("n", 1), journal=False)
+                        replayed += 1
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._loaded = True
+        print(f"[STATE] Loaded {len(self._users)} user(s), replayed {replayed} journal entr{'y' if replayed == 1 else 'ies'} "
+              f"in {time.perf_counter() - t0:.2f}s")
+
+    def _apply(self, op: str, user: str, t: float, n: int = 1, journal: bool = True):
+        # caller holds self._lock
+        st = self._users.setdefault(user, UserState())
+        p = self._pending.setdefault(user, [0, False, 0.0])
+        if op == "violation":
+            st.violations += n
+            p[0] += n
+        elif op == "warned":
+            st.warned = p[1] = True
+        elif op == "dm":
+            st.last_dm_at = p[2] = max(st.last_dm_at, t)
+        if journal:
+            self._seq += 1
+            self._journal.write(json.dumps({"seq": self._seq, "op": op, "u": user, "t": t, "n": n}) + "\n")
+            self._journal.flush()  # in the OS page cache: survives a process crash
+
+    def _get(self) -> Dict[str, UserState]:
+        if not self._loaded:
+            self.load()
+        return self._users
+
+    # ---- the message-path API (no DB round trips)
+    def record_violation(self, user: str, n: int = 1) -> int:
+        self._get()
+        with self._lock:
+            self._apply("violation", user, 0.0, n)
+            return self._users[user].violations
+
+    def has_been_warned(self, user: str) -> bool:
+        st = self._get().get(user)
+        return bool(st and st.warned)
+
+    def mark_warned(self, user: str):
+        self._get()
+        with self._lock:
+            st = self._users.get(user)
+            if not (st and st.warned):
+                self._apply("warned", user, 0.0)
+
+    def can_dm(self, user: str, severity: str = "serious") -> bool:
+        """True (and the cooldown starts now) if the user has not been DMed within COOLDOWN_S[severity].
+
+        Severities without a cooldown (crisis) are always allowed and do not start one.
+        """
+        cooldown = COOLDOWN_S.get(severity, 0.0)
+        if cooldown <= 0:
+            return True
+        self._get()
+        now = self.clock()
+        with self._lock:
+            st = self._users.get(user)
+            if st is not None and now - st.last_dm_at < cooldown:
+                metrics.inc("dm_cooldown_suppressed_total", severity=severity)
+                return False
+            self._apply("dm", user, now)
+            return True
+
+    def offenders(self) -> Set[str]:
+        users = self._get()
+        with self._lock:
+            return {h for h, st in users.items() if st.violations > 0}
+
+    # ---- write-behind
+    def flush(self) -> int:
+        """Write pending changes in one transaction; returns users written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._loaded or not self._pending:
+                    return 0
+                pending, self._pending = self._pending, {}
+                seq = self._seq
+                # new updates go to a fresh journal while this batch is written
+                self._journal.close()
+                _rotate(self.journal_path)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            try:
+                self._write(pending, seq)
+            except Exception:
+                with self._lock:  # keep the batch (and the rotated journal) for the next flush
+                    for h, (dv, warned, dm_at) in pending.items():
+                        p = self._pending.setdefault(h, [0, False, 0.0])
+                        p[0] += dv; p[1] = p[1] or warned; p[2] = max(p[2], dm_at)
+                raise
+            os.remove(self.journal_path + ".flushing")
+            metrics.inc("state_flushed_users_total", len(pending))
+            return len(pending)
+
+    def _write(self, pending: Dict[str, list], seq: int):
+        with metrics.timer("db_seconds", op="state_flush"), SessionLocal() as s:
+            users = list(pending)
+            stats = {u.user_id_hash: u for u in s.execute(
+                select(UserStats).where(UserStats.user_id_hash.in_(users))).scalars()}
+            cds = {c.user_id_hash: c for c in s.execute(
+                select(Cooldown).where(Cooldown.user_id_hash.in_(users))).scalars()}
+            for h, (dv, warned, dm_at) in pending.items():
+                if dv or warned:
+                    st = stats.get(h)
+                    if st is None:
+                        st = UserStats(user_id_hash=h, violations=0, warned=False)
+                        s.add(st)
+                    st.violations = (st.violations or 0) + dv
+                    st.warned = bool(st.warned or warned)
+                if dm_at:
+                    at = dt.datetime.fromtimestamp(dm_at, dt.timezone.utc).replace(tzinfo=None)
+                    cd = cds.get(h)
+                    if cd is None:
+                        s.add(Cooldown(user_id_hash=h, last_dm_at=at))
+                    elif cd.last_dm_at < at:
+                        cd.last_dm_at = at
+            mark = s.get(StateJournalMark, self.name)
+            if mark is None:
+                s.add(StateJournalMark(journal=self.name, last_seq=seq))
+            else:
+                mark.last_seq = seq
+            s.commit()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_s):
+            try:
+                self.flush()
+            except Exception as e:  # keep the journal; the next flush retries
+                print(f"[STATE] flush failed: {e!r}")
+
+    def start(self):
+        self.load()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="user-state-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+def _read_journal(path: str):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:  # torn last line from a crash mid-write
+                break
+
+
+def _rotate(path: str):
+    # journal -> journal.flushing; appended if an earlier failed flush left one behind
+    flushing = path + ".flushing"
+    if not os.path.exists(flushing):
+        with open(path, "a") as f:
+            os.fsync(f.fileno())
+        os.replace(path, flushing)
+        return
+    with open(path, encoding="utf-8") as src, open(flushing, "a", encoding="utf-8") as dst:
+        dst.write(src.read())
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.remove(path)
+
+
+cache = UserStateCache()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import contextlib, hashlib, json, mmap, os, shutil, struct, tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable
+
+# Memory-mapped weight snapshots.
+#
+# The first process to load a model builds it the slow way (from_pretrained,
+# PEFT adapter, extra heads ...), folds everything into one plain module and
+# writes it to WEIGHTS_CACHE as config.json + model.safetensors. Every later
+# load maps that file copy-on-write and assigns the parameters straight onto
+# the mapped pages, so N workers on one host share one copy through the page
+# cache instead of N private heap copies.
+#
+# moderation-agent/agent/weights.py is a copy (only the WEIGHTS_CACHE default
+# differs): the two projects ship and run standalone, so neither imports the
+# other. Change both; tests/test_weights.py checks they stay in sync.
+
+MMAP_WEIGHTS = os.getenv("MMAP_WEIGHTS", "1") not in {"0", "false", "no"}
+WEIGHTS_CACHE = Path(os.getenv("WEIGHTS_CACHE", os.path.join(os.getcwd(), "weights_cache")))
+
+_ST_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def _hub_revision(repo_id: str) -> str:
+    """Commit a hub id resolves to: the local HF cache's ref, else asked from the hub ("" if neither).
+
+    The cache is read first so the load path stays offline once from_pretrained has fetched the model.
+    """
+    try:
+        from huggingface_hub.constants import HF_HUB_CACHE
+        return (Path(HF_HUB_CACHE) / f"models--{repo_id.replace('/', '--')}" / "refs" / "main").read_text().strip()
+    except Exception:
+        pass
+    try:
+        from huggingface_hub import HfApi, constants
+        if not constants.HF_HUB_OFFLINE:
+            return HfApi().model_info(repo_id, timeout=10).sha or ""
+    except Exception:
+        pass
+    return ""
+
+
+def _fingerprint(sources: Iterable[str]) -> str:
+    """Stable key for a set of model sources (local dirs by file mtimes, hub ids by resolved commit)."""
+    h = hashlib.sha1()
+    for src in sources:
+        h.update(str(src).encode())
+        p = Path(str(src))
+        if p.is_dir():
+            for f in sorted(p.iterdir()):
+                if f.is_file():
+                    h.update(f"{f.name}:{f.stat().st_size}:{f.stat().st_mtime_ns}".encode())
+        else:  # a new upload under the same id must not reuse the old snapshot
+            h.update(_hub_revision(str(src)).encode())
+    return h.hexdigest()[:16]
+
+
+def mmap_safetensors(path: Path) -> Dict[str, "torch.Tensor"]:
+    """Tensors backed by a MAP_PRIVATE mapping of a .safetensors file (no copy)."""
+    import torch
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (n,) = struct.unpack("<Q", mm[:8])
+    header = json.loads(mm[8:8 + n])
+    header.pop("__metadata__", None)
+    base = 8 + n
+    out = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _ST_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            t = torch.empty(0, dtype=dtype)
+        else:
+            t = torch.frombuffer(mm, dtype=dtype, count=count, offset=base + start)
+        out[name] = t.view(info["shape"])
+    return out
+
+
+def _no_init():
+    try:
+        from transformers.modeling_utils import no_init_weights
+        return no_init_weights()
+    except ImportError:  # older/newer transformers: pay the random init
+        return contextlib.nullcontext()
+
+
+def write_snapshot(model, snap: Path):
+    """Fold adapters into the base weights and write config + safetensors atomically."""
+    from safetensors.torch import save_file
+    if hasattr(model, "merge_and_unload"):  # PEFT: bake LoRA into the base linear layers
+        model = model.merge_and_unload()
+    snap.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=snap.parent, prefix=snap.name + ".tmp"))
+    try:
+        model.config.save_pretrained(str(tmp))
+        # clone: safetensors refuses tensors that share storage
+        sd = {k: v.detach().cpu().clone().contiguous() for k, v in model.state_dict().items()}
+        save_file(sd, str(tmp / "model.safetensors"))
+        os.replace(tmp, snap)
+    except OSError:
+        # another worker won the race; its snapshot is equivalent
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not (snap / "model.safetensors").exists():
+            raise
+
+
+def load_snapshot(snap: Path):
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+    cfg = AutoConfig.from_pretrained(str(snap))
+    with _no_init():
+        model = AutoModelForSequenceClassification.from_config(cfg)
+    sd = mmap_safetensors(snap / "model.safetensors")
+    # strict: with no_init_weights any key left unloaded would be garbage memory
+    model.load_state_dict(sd, strict=True, assign=True)
+    return model.eval()
+
+
+def load_model(name: str, sources: Iterable[str], build: Callable[[], object]):
+    """Return an eval-mode model, mmap-backed when MMAP_WEIGHTS is on.
+
+    `build` is the regular (slow) loader; it only runs when no snapshot for
+    these exact sources exists yet.
+    """
+    if not MMAP_WEIGHTS:
+        return build().eval()
+    snap = WEIGHTS_CACHE / f"{name}-{_fingerprint(sources)}"
+    if not (snap / "model.safetensors").exists():
+        write_snapshot(build(), snap)
+    return load_snapshot(snap)
+
+
+def process_memory() -> Dict[str, float]:
+    """RSS plus (Linux) shared/private split in MB, to see page-cache sharing."""
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                k, v = line.split(":", 1)
+                if k in {"Rss", "Pss", "Shared_Clean", "Private_Dirty"}:
+                    out[k.lower() + "_mb"] = int(v.split()[0]) / 1024
+    except OSError:
+        import resource, sys
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        out["rss_mb"] = r / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return out
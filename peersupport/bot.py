@@ -1,4 +1,4 @@
-import os, asyncio, traceback
+import os, asyncio, datetime, time, traceback
 import discord
 from discord import app_commands
 from dotenv import load_dotenv
@@ -13,25 +13,49 @@ from app.archivist import (
 )
 from app.policy import (
     anon_user_id,
-
+    crisis_match,
     record_violation,
     has_been_warned,
     mark_warned,
+    repeat_offenders,
+    can_dm,
 )
 from app.utils_time import now_local
-from app.graph_pipeline import app_graph  # Sentinel→Triage→Responder
+from app.graph_pipeline import run_pipeline, run_cheap  # Sentinel→Triage→Responder (fast path or LangGraph)
+from app import models, metrics, retention, backfill, user_state
+from app.weights import process_memory
+from app.dispatcher import ActionDispatcher, DiscordTransport, PRIORITY_CRISIS, PRIORITY_DM
+from app.ingress import IngressQueue, LANE_CRISIS, LANE_REPEAT, LANE_DEFAULT
+from app.dedup import SpamWaves, DEDUP
+from quickstart import check_env
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
 TZ = os.getenv("TZ", "Asia/Kolkata")
+# Sharding: SHARD_COUNT total gateway shards, SHARD_IDS the ones this process runs
+# (comma-separated; all of them if empty). Run several processes with disjoint
+# SHARD_IDS and one `python -m app.inference_service` (INFERENCE_SOCKET) so the
+# shards hold no model weights.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip()]
+# one process does the once-per-deployment chores (command sync, daily reports, retention)
+PRIMARY = not SHARD_IDS or 0 in SHARD_IDS
+RETENTION_HOUR = int(os.getenv("RETENTION_HOUR", 4))  # local time; quiet hours
 
 intents = discord.Intents.default()
 intents.message_content = True
-client = discord.Client(intents=intents)
+if SHARD_COUNT:
+    client = discord.AutoShardedClient(intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None)
+else:
+    client = discord.Client(intents=intents)
 tree = app_commands.CommandTree(client)
 
 init_db()
 scheduler = AsyncIOScheduler(timezone=TZ)
+# Redactions, DMs and channel notices go through a paced, prioritised queue
+dispatcher = ActionDispatcher(DiscordTransport())
+# Near-duplicate raid messages reuse their cluster representative's result (DEDUP=0 disables)
+waves = SpamWaves() if DEDUP else None
 
 async def run_daily_reports():
     # Build daily report per channel since last report
@@ -41,14 +65,33 @@ async def run_daily_reports():
         path = generate_report_for_channel(ch)
         if path:
             print(f"[REPORT] Daily report generated for {ch}: {path}")
+    print(f"[MODELS] Sarcasm passes {models.sarcasm_stats()}")
+
+async def run_retention():
+    # archive + prune old incidents in small batches, off the event loop
+    try:
+        await asyncio.to_thread(retention.run_retention)
+    except Exception:
+        traceback.print_exc()
 
 @client.event
 async def on_ready():
     print(f"Logged in as {client.user} | Local time: {now_local()}")
-    await tree.sync()
-    # Daily at 23:59 IST
-    scheduler.add_job(run_daily_reports, CronTrigger(hour=23, minute=59))
-    scheduler.start()
+    # Imports are cheap now; pay the model load off the event loop, once.
+    load_secs = await asyncio.to_thread(models.load_all)
+    warm_secs = await asyncio.to_thread(models.warm_up)
+    print(f"[MODELS] Loaded {load_secs} | warm-up {warm_secs:.2f}s | mem {process_memory()}")
+    await asyncio.to_thread(user_state.cache.start)  # violation/cooldown state in memory, flushed every STATE_FLUSH_S
+    offenders.update(await asyncio.to_thread(repeat_offenders))
+    if SHARD_COUNT:
+        print(f"[SHARDS] Running {sorted(client.shards)} of {SHARD_COUNT} | primary={PRIMARY}")
+    if PRIMARY:
+        await tree.sync()
+        # Daily at 23:59 IST
+        scheduler.add_job(run_daily_reports, CronTrigger(hour=23, minute=59))
+        scheduler.add_job(run_retention, CronTrigger(hour=RETENTION_HOUR, minute=17))
+        scheduler.start()
+    print("[READY] Moderation pipeline is warm.")
 
 # /report: on-demand channel report
 @tree.command(name="report", description="Generate a report since the last one for this channel")
@@ -61,36 +104,68 @@ async def report_cmd(interaction: discord.Interaction):
     else:
         await interaction.followup.send("No new incidents since last report.", ephemeral=True)
 
-async def redact_message(message: discord.Message) -> bool:
-    """Delete the offending message; fallback to edit if delete not permitted."""
-    try:
-        await message.delete()
-        print(f"[REDACT] Deleted message {message.id}")
-        return True
-    except discord.Forbidden:
+backfills = {}  # channel id -> running backfill task
+
+# /backfill: moderators scan this channel's older messages (batched, resumable, yields to live traffic)
+@tree.command(name="backfill", description="Scan this channel's past messages for missed incidents")
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.checks.has_permissions(manage_messages=True)
+@app_commands.describe(days="How many days back to scan", redact="Also delete flagged messages")
+async def backfill_cmd(interaction: discord.Interaction, days: app_commands.Range[int, 1, 90] = 7, redact: bool = False):
+    ch = str(interaction.channel_id)
+    if ch in backfills:
+        await interaction.response.send_message("A backfill is already running in this channel.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Scanning the last {days} day(s) in the background.", ephemeral=True)
+    until = datetime.datetime.utcnow()  # newer messages are handled live
+
+    def flagged(msgs):
+        offenders.update(anon_user_id(m.author_id) for m in msgs)  # counted in user_state already
+        if redact:
+            for m in msgs:
+                dispatcher.redact(m.raw)
+
+    async def job():
         try:
-            await message.edit(content="[message redacted by moderator bot]")
-            print(f"[REDACT] Edited content for message {message.id}")
-            return True
-        except Exception as e:
-            print(f"[REDACT] Failed to redact message {message.id}: {e}")
-            return False
-    except Exception as e:
-        print(f"[REDACT] Unexpected error: {e}")
-        return False
+            out = await backfill.backfill_channel(
+                backfill.DiscordHistory(interaction.channel), ch, since=until - datetime.timedelta(days=days),
+                until=until, busy=lambda: ingress.depth > 0,
+                on_flagged=flagged)
+            await interaction.followup.send(
+                f"Backfill done: {out['scanned']} message(s) scanned, {out['incidents']} new incident(s).", ephemeral=True)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            backfills.pop(ch, None)
+    backfills[ch] = asyncio.create_task(job())
+
+_first_message_pending = True
+offenders = set()  # user hashes with prior violations (UserStats); they get their own ingress lane
 
 @client.event
 async def on_message(message: discord.Message):
     # Ignore bot/self and empty content
     if message.author.bot or not message.content:
         return
+    # Only enqueue here; ingress workers run the pipeline by lane priority
+    if crisis_match(message.content):
+        lane = LANE_CRISIS
+    elif anon_user_id(str(message.author.id)) in offenders:
+        lane = LANE_REPEAT
+    else:
+        lane = LANE_DEFAULT
+    ingress.submit(message, lane)
 
+async def handle_message(message: discord.Message, cheap: bool = False):
+    global _first_message_pending
+    metrics.add_gauge("inflight_messages", 1)
     try:
         text = message.content
         channel_id = str(getattr(message.channel, "id", ""))
+        guild_id = str(getattr(message.guild, "id", "") or channel_id)  # DMs have no guild
         user_hash = anon_user_id(str(message.author.id))  # keep anon for DB; no owner DMs
 
-        # ---- RUN THE GRAPH (this was missing) ----
+        # ---- RUN THE GRAPH (cheap = no sarcasm model / LLM, for messages shed under load) ----
         state = {
             "text": text,
             "user_id": str(message.author.id),
@@ -101,7 +176,21 @@ async def on_message(message: discord.Message):
             "action": "none",
             "reply": "",
         }
-        result = app_graph.invoke(state)  # sync call
+        t0 = time.perf_counter()
+        # off the event loop so the gateway keeps reading (and the queue keeps shedding)
+        if cheap:
+            result = await asyncio.to_thread(
+                lambda: run_cheap(state, waves.verdict(guild_id, text) if waves is not None else None))
+        elif waves is not None:
+            result = await asyncio.to_thread(waves.run, guild_id, state, run_pipeline)
+        else:
+            result = await asyncio.to_thread(run_pipeline, state)
+        elapsed = time.perf_counter() - t0
+        metrics.observe("pipeline_seconds", elapsed,
+                        path="cheap" if cheap else "dup" if (result or {}).get("dup_of") else "full")
+        if _first_message_pending and not cheap:
+            _first_message_pending = False
+            print(f"[LATENCY] First message scored in {elapsed * 1000:.1f} ms | mem {process_memory()}")
         action_raw = (result or {}).get("action", "none")
         reply = (result or {}).get("reply", "")
 
@@ -116,23 +205,17 @@ async def on_message(message: discord.Message):
             action, severity = "serious", "serious"
         elif action_raw in {"crisis", "crisis_dm"}:
             action, severity = "crisis", "crisis"
+        metrics.inc("messages_total", action=action)
 
         # Only act on serious/crisis (no sarcasm-only)
         if action == "none":
             return
 
-        # # Severity-based cooldown (uses anon hash)
-        # if not can_dm(user_hash, severity=severity):
-        #     print(f"[COOLDOWN] Suppressing DM to user {user_hash} ({severity})")
-        #     return
-
-        # Redact the message now
-        redacted = await redact_message(message)
-        if not redacted:
-            print("[WARN] Redaction failed (check bot permissions: Manage Messages).")
+        # Redact the message (queued; bulk-deleted with other flagged messages in this channel)
+        dispatcher.redact(message)
 
         # Persist violation incident
-        with SessionLocal() as s:
+        with metrics.timer("db_seconds", op="insert_incident"), SessionLocal() as s:
             s.add(Incident(
                 platform="discord",
                 channel_id=channel_id,
@@ -147,27 +230,27 @@ async def on_message(message: discord.Message):
             ))
             s.commit()
 
-        # DM the sender (serious/crisis message)
-        if reply:
-            try:
-                await message.author.send(reply)
-            except discord.Forbidden:
-                print(f"[DM] DM blocked by user {user_hash}; skipping.")
+        # DM the sender (serious/crisis message); crisis DMs jump the queue.
+        # Severity-based cooldown (uses anon hash): only the DM is suppressed, the message is still
+        # redacted and counted.
+        if reply and not can_dm(user_hash, severity=severity):
+            print(f"[COOLDOWN] Suppressing DM to user {user_hash} ({severity})")
+        elif reply:
+            dispatcher.dm(message.author, reply, priority=PRIORITY_CRISIS if action == "crisis" else PRIORITY_DM)
 
         # Violation counting & special user report (saved to outputs only)
         vcount = record_violation(user_hash)
+        offenders.add(user_hash)
         if vcount > 5 and not has_been_warned(user_hash):
-            try:
-                await message.author.send(
-                    "This is a final warning. Continued violations may lead to removal from the group."
-                )
-                await message.channel.send(
-                    f"<@{message.author.id}> has reached 5 violations. This is their final warning. "
-                    "Continued violations may lead to removal."
-                )
-
-            except discord.Forbidden:
-                pass
+            dispatcher.dm(
+                message.author,
+                "This is a final warning. Continued violations may lead to removal from the group."
+            )
+            dispatcher.notice(
+                message.channel,
+                f"<@{message.author.id}> has reached 5 violations. This is their final warning. "
+                "Continued violations may lead to removal."
+            )
             path = generate_user_report(user_hash)  # just save; no DM to owner/mods
             if path:
                 print(f"[USER-REPORT] Saved special report for {user_hash}: {path}")
@@ -179,9 +262,17 @@ async def on_message(message: discord.Message):
             print(f"[REPORT] Rolling report generated for {channel_id}: {rpath}")
 
     except Exception:
+        metrics.inc("on_message_errors_total")
         traceback.print_exc()
+    finally:
+        metrics.add_gauge("inflight_messages", -1)
+
+# Bounded, prioritised ingress (INGRESS_MAX / INGRESS_SHED / INGRESS_WORKERS)
+ingress = IngressQueue(handle_message, cheap_handler=lambda m: handle_message(m, cheap=True))
 
 if __name__ == "__main__":
     if not TOKEN:
         raise RuntimeError("DISCORD_BOT_TOKEN is not set.")
+    check_env()
+    metrics.start_server()
     client.run(TOKEN)
\ No newline at end of file
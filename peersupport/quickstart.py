@@ -1,15 +1,16 @@
 from __future__ import annotations
-import os, re, json
+import os, json, threading
+from functools import lru_cache
 from typing import Tuple, Dict, List
 
 from dotenv import load_dotenv
 from loguru import logger
 
-import torch
-import torch.nn as nn
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from peft import PeftModel
-from openai import OpenAI
+from app import metrics
+from app.lexicon import is_crisis
+
+# torch / transformers / peft / openai are imported lazily (inside the model
+# classes and get_client) so importing this module stays cheap.
 
 # ========== ENV ==========
 load_dotenv()
@@ -23,29 +24,51 @@ PATH_SARCASM = os.getenv("SARCASM_MODEL_PATH", "")
 PATH_TOX_BASE = os.getenv("TOXICITY_BASE_MODEL", "distilbert-base-uncased")
 PATH_TOX_LORA = os.getenv("TOXICITY_ADAPTER_PATH", "")  # can be empty
 
-assert OPENAI_API_KEY, "OPENAI_API_KEY is empty in .env"
-assert PATH_SARCASM, "SARCASM_MODEL_PATH is empty in .env"
 
-DEVICE = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
-logger.info(f"Using device: {DEVICE}")
+def check_env():
+    """Fail fast on missing config (call from entry points, not at import)."""
+    assert OPENAI_API_KEY, "OPENAI_API_KEY is empty in .env"
+    # shards that score via the shared inference service need no model paths
+    assert PATH_SARCASM or os.getenv("INFERENCE_SOCKET"), "SARCASM_MODEL_PATH is empty in .env"
+
+
+@lru_cache(maxsize=1)
+def get_device():
+    import torch
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    logger.info(f"Using device: {device}")
+    return device
 
 # ========== Sarcasm (binary or 2-class) ==========
 class SarcasmModel:
     def __init__(self, path: str):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        from app.weights import load_model
         logger.info(f"Loading sarcasm model: {path}")
+        self.device = get_device()
         self.tok = AutoTokenizer.from_pretrained(path, use_fast=True)
-        self.model = AutoModelForSequenceClassification.from_pretrained(path)
-        self.model.to(DEVICE).eval()
+        self.model = load_model("sarcasm", [path], lambda: AutoModelForSequenceClassification.from_pretrained(path))
+        self.model.to(self.device).eval()
 
-    @torch.inference_mode()
     def score(self, text: str) -> float:
-        enc = self.tok(text, return_tensors="pt", truncation=True, max_length=128)
-        enc = {k: v.to(DEVICE) for k, v in enc.items()}
-        logits = self.model(**enc).logits
-        if logits.numel() == 1:  # single logit (sigmoid)
-            return float(torch.sigmoid(logits)[0].item())
-        # assume 2-class softmax with index 1 = sarcastic
-        return float(torch.softmax(logits, dim=-1)[0, 1].item())
+        return self.score_batch([text])[0]
+
+    def score_batch(self, texts: List[str], max_length: int = 128) -> List[float]:
+        import torch
+        if not texts:
+            return []
+        with torch.inference_mode():
+            with metrics.timer("tokenize_seconds", model="sarcasm"):
+                enc = self.tok(texts, return_tensors="pt", truncation=True, max_length=max_length, padding=True)
+                enc = {k: v.to(self.device) for k, v in enc.items()}
+            with metrics.timer("forward_seconds", model="sarcasm"):
+                logits = self.model(**enc).logits
+            if logits.shape[-1] == 1:  # single logit (sigmoid)
+                p = torch.sigmoid(logits[:, 0])
+            else:
+                # assume 2-class softmax with index 1 = sarcastic
+                p = torch.softmax(logits, dim=-1)[:, 1]
+        return [float(x) for x in p.tolist()]
 
 # ========== Toxicity (6-headed Jigsaw) ==========
 JIGSAW_LABELS: List[str] = [
@@ -55,8 +78,19 @@ NUM_LABELS = 6
 
 class ToxicityModel6:
     def __init__(self, base: str, adapter: str | None = None):
+        from transformers import AutoTokenizer
+        from app.weights import load_model
         logger.info(f"Loading toxicity base={base} adapter={adapter or '(none)'}")
+        self.device = get_device()
         self.tok = AutoTokenizer.from_pretrained(base)
+        sources = [base] + ([adapter] if adapter else [])
+        self.model = load_model("toxicity", sources, lambda: self._build(base, adapter))
+        self.model.to(self.device).eval()
+
+    @staticmethod
+    def _build(base: str, adapter: str | None):
+        import torch.nn as nn
+        from transformers import AutoModelForSequenceClassification
         base_model = AutoModelForSequenceClassification.from_pretrained(
             base, num_labels=NUM_LABELS, ignore_mismatched_sizes=True
         )
@@ -66,19 +100,25 @@ class ToxicityModel6:
             base_model.classifier = nn.Linear(hidden, NUM_LABELS)
 
         if adapter:
-            model = PeftModel.from_pretrained(base_model, adapter)
-        else:
-            model = base_model
-
-        self.model = model.to(DEVICE).eval()
+            from peft import PeftModel
+            return PeftModel.from_pretrained(base_model, adapter)
+        return base_model
 
-    @torch.inference_mode()
     def scores(self, text: str) -> Dict[str, float]:
-        enc = self.tok(text, return_tensors="pt", truncation=True, max_length=128)
-        enc = {k: v.to(DEVICE) for k, v in enc.items()}
-        logits = self.model(**enc).logits  # [1, 6]
-        probs = torch.sigmoid(logits)[0].tolist()  # multi-label
-        return {label: float(p) for label, p in zip(JIGSAW_LABELS, probs)}
+        return self.scores_batch([text])[0]
+
+    def scores_batch(self, texts: List[str], max_length: int = 128) -> List[Dict[str, float]]:
+        import torch
+        if not texts:
+            return []
+        with torch.inference_mode():
+            with metrics.timer("tokenize_seconds", model="toxicity"):
+                enc = self.tok(texts, return_tensors="pt", truncation=True, max_length=max_length, padding=True)
+                enc = {k: v.to(self.device) for k, v in enc.items()}
+            with metrics.timer("forward_seconds", model="toxicity"):
+                logits = self.model(**enc).logits  # [B, 6]
+            probs = torch.sigmoid(logits).tolist()  # multi-label
+        return [{label: float(p) for label, p in zip(JIGSAW_LABELS, row)} for row in probs]
 
 # ========== Policy ==========
 # seriousness ↑ when toxicity is high AND sarcasm is low
@@ -98,16 +138,8 @@ THRESHOLDS = {
     "seriousness_high": 0.60,
 }
 
-# Crisis detection (self-harm / severe distress)
-CRISIS_PATTERNS = [
-    r"\bi (?:want|going|plan) to (?:kill|harm|hurt) (?:myself|me)\b",
-    r"\b(?:suicide|kill myself|end my life)\b",
-    r"\b(?:i(?:'m| am) (?:done|hopeless)|i can't go on)\b",
-]
-CRISIS_RE = re.compile("|".join(CRISIS_PATTERNS), re.IGNORECASE)
-
-def is_crisis(text: str) -> bool:
-    return bool(CRISIS_RE.search(text or ""))
+# Crisis detection (self-harm / severe distress): is_crisis comes from the
+# shared lexicon matcher (app/lexicon.py, phrases in app/crisis_lexicon.txt).
 
 def decide_action(sarcasm: float, tox_scores: Dict[str, float], text: str = "") -> Tuple[str, Dict[str, float]]:
     """
@@ -129,27 +161,44 @@ def decide_action(sarcasm: float, tox_scores: Dict[str, float], text: str = "")
 
     return "none", {"tox_max": tox_max, "seriousness": serious}
 
+def sarcasm_needed(tox_scores: Dict[str, float], text: str = "") -> bool:
+    """False when decide_action gives the same action for every sarcasm value (seriousness falls as sarcasm rises)."""
+    return decide_action(0.0, tox_scores, text)[0] != decide_action(1.0, tox_scores, text)[0]
+
 # ========== OpenAI responders (serious + crisis) ==========
-client = OpenAI(api_key=OPENAI_API_KEY)
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide OpenAI client, built on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=OPENAI_API_KEY)
+    return _client
 
 # Simple local Resource RAG
 RES_PATH = os.path.join(os.getcwd(), "app", "resources.json")
 DEFAULT_IITG = "https://online.iitg.ac.in/chw/vdstudentspecial.jsp"
 
-try:
-    with open(RES_PATH, "r", encoding="utf-8") as f:
-        RESOURCES = json.load(f)
-except Exception:
-    RESOURCES = {
-        "self_harm": [
-            {"name": "IITG Psychiatrist Appointments", "url": DEFAULT_IITG},
-            {"name": "Kiran Mental Health Helpline (24x7)", "url": "1800-599-0019"},
-            {"name": "AASRA 24x7 Helpline", "url": "9152987821"},
-        ]
-    }
+@lru_cache(maxsize=1)
+def get_resources() -> Dict:
+    try:
+        with open(RES_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {
+            "self_harm": [
+                {"name": "IITG Psychiatrist Appointments", "url": DEFAULT_IITG},
+                {"name": "Kiran Mental Health Helpline (24x7)", "url": "1800-599-0019"},
+                {"name": "AASRA 24x7 Helpline", "url": "9152987821"},
+            ]
+        }
 
 def _resource_block(kind: str = "self_harm") -> str:
-    items = RESOURCES.get(kind, [])[:3]
+    items = get_resources().get(kind, [])[:3]
     if not items:
         return f"Campus support: {DEFAULT_IITG}"
     return "\n".join([f"- {it['name']}: {it['url']}" for it in items])
@@ -166,11 +215,12 @@ SYS_CRISIS = (
     "Do not diagnose or provide therapy. Encourage reaching out now."
 )
 
+@metrics.timed("llm_reply_seconds", kind="serious")
 def craft_serious_reply(context: str, sarcasm: float, tox_max: float, seriousness: float) -> str:
     # templated fallback on error
     fallback = "Please stop — this violates our community guidelines. Take a short break and return respectfully."
     try:
-        out = client.chat.completions.create(
+        out = get_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": SYS_SERIOUS},
@@ -185,15 +235,17 @@ def craft_serious_reply(context: str, sarcasm: float, tox_max: float, seriousnes
         )
         return out.choices[0].message.content.strip()
     except Exception:
+        metrics.inc("llm_fallback_total")
         return fallback
 
+@metrics.timed("llm_reply_seconds", kind="crisis")
 def craft_crisis_reply(context: str) -> str:
     resources = _resource_block("self_harm")
     fallback = (
         "You matter, and help is available right now. Consider reaching out:\n" + resources
     )
     try:
-        out = client.chat.completions.create(
+        out = get_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": SYS_CRISIS},
@@ -207,10 +259,12 @@ def craft_crisis_reply(context: str) -> str:
         )
         return out.choices[0].message.content.strip()
     except Exception:
+        metrics.inc("llm_fallback_total")
         return fallback
 
 # ========== Main loop ==========
 if __name__ == "__main__":
+    check_env()
     # Load models
     sarcasm_model = SarcasmModel(PATH_SARCASM)
     tox_model = ToxicityModel6(PATH_TOX_BASE, PATH_TOX_LORA or None)
@@ -226,9 +280,9 @@ if __name__ == "__main__":
         if not text or text.lower() == "exit":
             break
 
-        # Scores
-        s = sarcasm_model.score(text)          # 0..1
+        # Scores (sarcasm only when it can change the action)
         tox = tox_model.scores(text)           # dict of 6 labels
+        s = sarcasm_model.score(text) if sarcasm_needed(tox, text) else 0.0  # 0..1
 
         action, meta = decide_action(s, tox, text=text)
         tox_max = meta["tox_max"]
@@ -0,0 +1,14 @@
+import os, sys, tempfile
+
+# tests run from peersupport/ like the bot (python -m pytest); make `app` importable from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# throwaway database; app.db binds its engine at import time
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="peersupport-tests-"), "test.db")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def db():
+    from app.db import init_db
+    init_db()
@@ -0,0 +1,49 @@
+import asyncio, datetime as dt
+
+from sqlalchemy import select
+
+from app import backfill, user_state
+from app.db import SessionLocal, Incident, UserStats
+from app.policy import anon_user_id
+
+
+def test_backfill_violations_go_through_user_state(tmp_path, monkeypatch):
+    cache = user_state.UserStateCache(str(tmp_path / "user_state.journal"))
+    monkeypatch.setattr(user_state, "cache", cache)
+    start = dt.datetime.utcnow() - dt.timedelta(hours=1)
+    rows = [{"timestamp": (start + dt.timedelta(seconds=i)).isoformat() + "Z", "user_id": "bf-user", "channel": "bf-chan",
+             "text": "toxic" if i % 2 else "hello"} for i in range(10)]
+    score = lambda texts: [(0.0, {"toxic": 0.99 if t == "toxic" else 0.01}) for t in texts]
+
+    out = asyncio.run(backfill.backfill_channel(backfill.FakeHistory(rows), "bf-chan", score_fn=score,
+                                                page=3, pause=0))
+
+    user = anon_user_id("bf-user")
+    assert out["incidents"] == 5
+    assert cache.record_violation(user, 0) == 5  # visible to the live bot without a restart
+    assert user in cache.offenders()
+    with SessionLocal() as s:  # and already flushed
+        assert s.execute(select(UserStats.violations).where(UserStats.user_id_hash == user)).scalar_one() == 5
+
+
+def test_backfill_only_hands_on_messages_it_inserted(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_state, "cache", user_state.UserStateCache(str(tmp_path / "user_state.journal")))
+    start = dt.datetime.utcnow() - dt.timedelta(hours=1)
+    rows = [{"timestamp": (start + dt.timedelta(seconds=i)).isoformat() + "Z", "user_id": "bf-dup-user",
+             "channel": "bf-dup", "text": "toxic" if i % 2 else "hello"} for i in range(10)]
+    source = backfill.FakeHistory(rows)
+    score = lambda texts: [(0.0, {"toxic": 0.99 if t == "toxic" else 0.01}) for t in texts]
+    live = next(m for m in source._by_channel["bf-dup"] if m.text == "toxic")
+    with SessionLocal() as s:  # handled (and redacted) live before the backfill got to it
+        s.add(Incident(platform="discord", channel_id="bf-dup", user_id_hash=anon_user_id("bf-dup-user"),
+                       message_id=str(live.id), text_excerpt="toxic", sarcasm=0.0, tox_max=0.99, seriousness=0.99,
+                       action="serious", reply=""))
+        s.commit()
+    handed = []
+
+    out = asyncio.run(backfill.backfill_channel(source, "bf-dup", score_fn=score, page=3, pause=0,
+                                                on_flagged=handed.extend))
+
+    assert out["incidents"] == 4 and out["already_handled"] == 1
+    assert out["actions"] == {"none": 5, "serious": 4}
+    assert len(handed) == 4 and live not in handed
@@ -0,0 +1,57 @@
+import asyncio
+
+from app import graph_pipeline, models
+from app.dedup import SpamWaves
+from app.ingress import IngressQueue, LANE_DEFAULT
+
+
+def _state(text):
+    return {"text": text, "user_id": "1", "channel_id": "c", "sarcasm": 0.0, "tox_max": 0.0,
+            "seriousness": 0.0, "action": "none", "reply": ""}
+
+
+def test_cheap_path_acts_on_toxicity_alone(monkeypatch):
+    monkeypatch.setattr(models, "score_toxicity", lambda texts: [{"toxic": 0.95}, {"toxic": 0.1}][:len(texts)])
+    out = graph_pipeline.run_cheap(_state("you are all worthless idiots"))
+    assert out["action"] == "serious" and out["reply"] == graph_pipeline.SERIOUS_REPLY_FALLBACK
+    monkeypatch.setattr(models, "score_toxicity", lambda texts: [{"toxic": 0.1}])
+    assert graph_pipeline.run_cheap(_state("see you at the lab tomorrow"))["action"] == "none"
+
+
+def test_cheap_path_reuses_spam_wave_verdict(monkeypatch):
+    monkeypatch.setattr(models, "score_toxicity", lambda texts: 1 / 0)  # must not be called
+    waves = SpamWaves(audit_rate=0.0)
+    rep = {"sarcasm": 0.0, "tox_max": 0.97, "seriousness": 0.97, "action": "serious", "reply": "stop"}
+    waves.run("g", _state("everyone in this server is trash lol"), lambda st: {**st, **rep})
+    verdict = waves.verdict("g", "everyone in this server is trash lol 💀💀")
+    out = graph_pipeline.run_cheap(_state("everyone in this server is trash lol 💀💀"), verdict)
+    assert out["action"] == "serious" and out["reply"] == "stop"
+    assert waves.verdict("other-guild", "everyone in this server is trash lol 💀💀") is None
+
+
+def test_shed_messages_get_bounded_cheap_handling():
+    async def main():
+        running, peak, done = [0], [0], []
+        release = asyncio.Event()
+
+        async def full(item):
+            await release.wait()
+
+        async def cheap(item):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            done.append(item)
+
+        q = IngressQueue(full, cheap_handler=cheap, maxsize=1, policy="cheap", workers=1,
+                         cheap_workers=2, cheap_max=5)
+        for i in range(10):
+            q.submit(i, LANE_DEFAULT)
+        await asyncio.sleep(0.2)
+        release.set()
+        return q, peak[0], done
+
+    q, peak, done = asyncio.run(main())
+    assert peak == 2
+    assert len(done) == 5 and q.dropped == 4  # 10 = 1 queued + 5 cheap + 4 dropped
@@ -0,0 +1,127 @@
+import asyncio, datetime as dt
+from types import SimpleNamespace
+
+import discord
+
+from app.dispatcher import DiscordTransport
+
+
+class FakeMessage:
+    def __init__(self, id, age_days, channel=None):
+        self.id, self.channel = id, channel
+        self.created_at = discord.utils.utcnow() - dt.timedelta(days=age_days)
+        self.deleted = False
+
+    async def delete(self):
+        self.deleted = True
+
+
+class FakeChannel:
+    id = 42
+
+    def __init__(self):
+        self.bulk_calls = []
+
+    async def delete_messages(self, messages):
+        self.bulk_calls.append([m.id for m in messages])
+        for m in messages:
+            m.deleted = True
+
+
+def test_redact_bulk_deletes_only_recent_messages():
+    ch = FakeChannel()
+    msgs = [FakeMessage(1, 1, ch), FakeMessage(2, 20, ch), FakeMessage(3, 13, ch), FakeMessage(4, 60, ch)]
+    asyncio.run(DiscordTransport().redact(ch, msgs))
+    assert ch.bulk_calls == [[1, 3]]
+    assert all(m.deleted for m in msgs)
+
+
+def test_redact_single_recent_message_is_not_bulk_deleted():
+    ch = FakeChannel()
+    msgs = [FakeMessage(1, 1, ch), FakeMessage(2, 30, ch)]
+    asyncio.run(DiscordTransport().redact(ch, msgs))
+    assert ch.bulk_calls == []
+    assert all(m.deleted for m in msgs)
+
+
+def test_redact_in_dm_channel_deletes_one_by_one():
+    ch = SimpleNamespace(id=7)  # DMChannel: no delete_messages
+    msgs = [FakeMessage(1, 0, ch), FakeMessage(2, 0, ch)]
+    asyncio.run(DiscordTransport().redact(ch, msgs))
+    assert all(m.deleted for m in msgs)
+
+
+def _http(cls, status, headers=None, code=0):
+    return cls(SimpleNamespace(status=status, reason="x", headers=headers or {}), {"code": code, "message": "x"})
+
+
+def test_translate_maps_discord_errors():
+    from app.dispatcher import PermanentError, TransientError
+    t = DiscordTransport._translate
+    assert isinstance(t(_http(discord.Forbidden, 403)), PermanentError)
+    assert isinstance(t(_http(discord.NotFound, 404)), PermanentError)
+    assert isinstance(t(_http(discord.HTTPException, 400, code=50034)), PermanentError)  # message too old
+    err = t(_http(discord.HTTPException, 429, {"Retry-After": "2.5"}))
+    assert isinstance(err, TransientError) and err.retry_after == 2.5
+    err = t(discord.RateLimited(7.0))
+    assert isinstance(err, TransientError) and err.retry_after == 7.0
+    err = t(_http(discord.DiscordServerError, 503))
+    assert isinstance(err, TransientError) and err.retry_after is None
+    assert isinstance(t(asyncio.TimeoutError()), TransientError)
+
+
+def test_redact_falls_back_to_edit_without_manage_messages():
+    class NoPerms(FakeChannel):
+        async def delete_messages(self, messages):
+            raise _http(discord.Forbidden, 403)
+
+    class Editable(FakeMessage):
+        async def edit(self, content):
+            self.content = content
+
+    ch = NoPerms()
+    msgs = [Editable(1, 0, ch), Editable(2, 0, ch)]
+    asyncio.run(DiscordTransport().redact(ch, msgs))
+    assert [m.content for m in msgs] == [DiscordTransport.REDACTED] * 2
+
+
+def test_dispatcher_retries_dm_after_429_with_server_hint():
+    from app.dispatcher import ActionDispatcher
+
+    class User:
+        id = 5
+
+        def __init__(self):
+            self.calls, self.sent = 0, []
+
+        async def send(self, content):
+            self.calls += 1
+            if self.calls == 1:
+                raise _http(discord.HTTPException, 429, {"Retry-After": "0.05"})
+            self.sent.append(content)
+
+    async def main():
+        user = User()
+        d = ActionDispatcher(DiscordTransport(), backoff_base=10.0)  # a retry that ignored the hint would take 10s+
+        ok = await asyncio.wait_for(d.dm(user, "please stop"), 2)
+        return ok, user
+
+    ok, user = asyncio.run(main())
+    assert ok and user.calls == 2 and user.sent == ["please stop"]
+
+
+def test_dispatcher_gives_up_on_permanent_dm_error():
+    from app.dispatcher import ActionDispatcher
+
+    class ClosedDMs:
+        id = 6
+        calls = 0
+
+        async def send(self, content):
+            ClosedDMs.calls += 1
+            raise _http(discord.Forbidden, 403, code=50007)  # cannot send messages to this user
+
+    async def main():
+        return await ActionDispatcher(DiscordTransport()).dm(ClosedDMs(), "hi")
+
+    assert asyncio.run(main()) is False and ClosedDMs.calls == 1
@@ -0,0 +1,94 @@
+import asyncio, gc, threading, time
+
+import pytest
+
+from app.inference_service import InferenceClient, InferenceError, InferenceServer
+
+
+def _serve(path, score_fn):
+    """InferenceServer on its own loop in a thread; stop() cancels everything, closing client sockets like a restart."""
+    loop = asyncio.new_event_loop()
+    errors = []
+    loop.set_exception_handler(lambda loop, ctx: errors.append(ctx))
+    task = loop.create_task(InferenceServer(path, score_fn=score_fn, max_wait_ms=1).serve())
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        rest = asyncio.all_tasks(loop)
+        for t in rest:
+            t.cancel()
+        loop.run_until_complete(asyncio.gather(*rest, return_exceptions=True))
+        loop.close()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            InferenceClient(path, timeout=1).ping()
+            break
+        except InferenceError:
+            time.sleep(0.02)
+
+    def stop():
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(5)
+    return errors, stop
+
+
+def test_timeout_is_not_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.models.sarcasm_stats", lambda: {})
+    calls = []
+
+    def slow(texts):
+        calls.append(texts)
+        time.sleep(0.5)
+        return [(0.0, {"toxic": 0.1}) for _ in texts]
+
+    path = str(tmp_path / "infer.sock")
+    _, stop = _serve(path, slow)
+    try:
+        client = InferenceClient(path, timeout=0.2)
+        with pytest.raises(InferenceError, match="did not answer"):
+            client.score("hello")
+        time.sleep(0.5)
+        assert calls == [["hello"]]  # scored once, not resent on the timeout
+        client.timeout = 2
+        assert client.score("again") == (0.0, {"toxic": 0.1})  # fresh socket, no stale reply
+    finally:
+        stop()
+
+
+def test_failed_batch_reports_error_and_retrieves_every_exception(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.models.sarcasm_stats", lambda: {})
+
+    def broken(texts):
+        raise RuntimeError("model blew up")
+
+    path = str(tmp_path / "infer.sock")
+    errors, stop = _serve(path, broken)
+    try:
+        with pytest.raises(InferenceError, match="model blew up"):
+            InferenceClient(path, timeout=2).score_batch(["a", "b", "c"])
+    finally:
+        stop()
+    gc.collect()  # an unretrieved future exception is reported when the future is collected
+    assert not [e for e in errors if "never retrieved" in e.get("message", "")]
+
+
+def test_reconnects_after_service_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.models.sarcasm_stats", lambda: {})
+    ok = lambda texts: [(0.2, {"toxic": 0.3}) for _ in texts]
+    path = str(tmp_path / "infer.sock")
+    _, stop = _serve(path, ok)
+    client = InferenceClient(path, timeout=2)
+    assert client.score("x")[0] == 0.2
+    stop()
+    _, stop = _serve(path, ok)
+    try:
+        assert client.score("y")[0] == 0.2
+    finally:
+        stop()
@@ -0,0 +1,53 @@
+import datetime as dt
+
+from app import archivist, retention
+from app.db import SessionLocal, Incident, engine
+
+
+def _incident(channel, user, action, created_at):
+    return Incident(platform="discord", channel_id=channel, user_id_hash=user, message_id="1", text_excerpt="x",
+                    sarcasm=0.0, tox_max=0.9, seriousness=0.8, action=action, reply="", created_at=created_at)
+
+
+def test_reports_count_archived_incidents(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention, "RETENTION_PAUSE", 0.0)
+    monkeypatch.setattr(archivist, "OUT_DIR", str(tmp_path))
+    now = dt.datetime.utcnow()
+    with SessionLocal() as s:
+        s.add_all([_incident("c-ret", "u-ret", "serious", now - dt.timedelta(days=200, hours=h)) for h in range(3)])
+        s.add(_incident("c-ret", "u-ret", "crisis", now - dt.timedelta(days=150)))
+        s.add(_incident("c-ret", "u-ret", "serious", now - dt.timedelta(hours=1)))
+        s.commit()
+
+    assert retention.archive_old(days=90)["archived"] == 4
+
+    report = open(archivist.generate_report_for_channel("c-ret"), encoding="utf-8").read()
+    assert "**Incidents:** 5  |  **Serious DMs:** 4  |  **Crisis DMs:** 1" in report
+    assert "**Archived (counted, no excerpts):** 4" in report
+
+    user_report = open(archivist.generate_user_report("u-ret"), encoding="utf-8").read()
+    assert "action=serious — 3 incident(s)" in user_report
+    assert "action=crisis — 1 incident(s)" in user_report
+
+    assert retention.rebuild_user_rollups() == 4
+    assert open(archivist.generate_user_report("u-ret"), encoding="utf-8").read().count("incident(s)") == 2
+
+
+def test_fresh_database_uses_incremental_vacuum():
+    assert retention.vacuum()["vacuum"] == "incremental"
+
+
+def test_rebuild_keeps_distinct_incidents_with_reused_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+    row = lambda id, msg, month: {"id": id, "message_id": msg, "created_at": f"{month}-03T00:00:00",
+                                  "user_id_hash": "u-reuse", "action": "serious", "seriousness": 0.8}
+    retention._append(retention.archive_path("2025-01", "gz"), [row(1, "m1", "2025-01")] * 2, "gz")  # crash re-archive
+    retention._append(retention.archive_path("2025-02", "gz"), [row(1, "m2", "2025-02")], "gz")  # id reused after a purge
+    assert retention.rebuild_user_rollups() == 2
+
+
+def test_incident_ids_are_never_reused():
+    with engine.connect() as c:
+        ddl = c.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'incidents'").scalar()
+    assert "AUTOINCREMENT" in ddl
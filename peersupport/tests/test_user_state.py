@@ -0,0 +1,28 @@
+from app.user_state import UserStateCache
+
+
+def _cache(tmp_path, now):
+    c = UserStateCache(str(tmp_path / "user_state.journal"), clock=lambda: now[0])
+    c.load()
+    return c
+
+
+def test_crisis_dm_is_never_suppressed_by_serious_cooldown(tmp_path):
+    user = tmp_path.name  # fresh user per test: the database is shared
+    now = [1000.0]
+    c = _cache(tmp_path, now)
+    assert c.can_dm(user, "serious")
+    now[0] += 10
+    assert c.can_dm(user, "crisis")
+    assert c.can_dm(user, "crisis")
+    assert not c.can_dm(user, "serious")
+
+
+def test_serious_cooldown_expires(tmp_path):
+    user = tmp_path.name  # fresh user per test: the database is shared
+    now = [1000.0]
+    c = _cache(tmp_path, now)
+    assert c.can_dm(user, "serious")
+    assert not c.can_dm(user, "serious")
+    now[0] += 301
+    assert c.can_dm(user, "serious")
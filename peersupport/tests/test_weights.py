@@ -0,0 +1,35 @@
+import os, re
+
+import pytest
+
+from app import weights
+
+
+def test_hub_fingerprint_follows_resolved_revision(monkeypatch, tmp_path):
+    rev = {"distilroberta-base": "aaa"}
+    monkeypatch.setattr(weights, "_hub_revision", lambda repo_id: rev[repo_id])
+    before = weights._fingerprint(["distilroberta-base"])
+    assert weights._fingerprint(["distilroberta-base"]) == before
+    rev["distilroberta-base"] = "bbb"  # new commit pushed under the same id
+    assert weights._fingerprint(["distilroberta-base"]) != before
+    (tmp_path / "config.json").write_text("{}")
+    weights._fingerprint([str(tmp_path)])  # local dirs never ask the hub (KeyError above otherwise)
+
+
+def test_agent_copy_stays_in_sync():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    agent = os.path.join(root, "moderation-agent", "agent", "weights.py")
+    if not os.path.exists(agent):
+        pytest.skip("no moderation-agent checkout next to peersupport")
+    code = lambda path: re.findall(r"^(?:def |class |    ).*$", open(path).read(), re.M)
+    assert code(agent) == code(weights.__file__)  # only the header and WEIGHTS_CACHE default may differ
+
+
+def test_hub_revision_prefers_the_local_cache(monkeypatch, tmp_path):
+    hf = pytest.importorskip("huggingface_hub")
+    ref = tmp_path / "models--org--model" / "refs" / "main"
+    ref.parent.mkdir(parents=True)
+    ref.write_text("abc123\n")
+    monkeypatch.setattr(hf.constants, "HF_HUB_CACHE", str(tmp_path))
+    monkeypatch.setattr(hf.HfApi, "model_info", lambda *a, **k: pytest.fail("hub queried despite a cached ref"))
+    assert weights._hub_revision("org/model") == "abc123"